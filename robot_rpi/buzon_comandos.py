@@ -0,0 +1,148 @@
+#!/usr/bin/env python3
+"""
+Buzón de Comandos de Movimiento (el último gana)
+Robot ASTI Challenge
+
+La interfaz web envía ráfagas de F/S (mousedown, mouseup, mouseleave). En
+lugar de encolarlas todas, cada comando se deposita en una única casilla y
+sustituye al que aún no se haya ejecutado; un hilo de actuación toma siempre
+el más reciente. La latencia de actuación queda acotada por la de un solo
+comando, sin cola que crezca.
+
+Cada comando lleva un número de secuencia asignado por el emisor: los que
+llegan con una secuencia anterior a la del último aceptado (o a la de un
+comando de configuración ya aplicado, ver invalidar) se descartan por
+obsoletos.
+
+Uso:
+    buzon = BuzonComandos()
+    buzon.depositar('F', secuencia=7)          # Hilo de la tubería
+    orden = buzon.tomar()                      # Hilo de actuación
+    if buzon.vigente(orden):
+        ejecutar(orden.cmd)
+        buzon.registrar_actuacion(orden)
+"""
+
+import threading
+import time
+from collections import namedtuple
+
+from metricas import HistogramaLatencia
+
+
+Orden = namedtuple('Orden', 'secuencia cmd t_ns')
+
+
+class BuzonComandos:
+    """Casilla única con sustitución y descarte por secuencia"""
+
+    def __init__(self, reloj_ns=time.monotonic_ns):
+        """
+        Args:
+            reloj_ns (callable): Reloj para medir la latencia de actuación
+        """
+        self._reloj_ns = reloj_ns
+        self._cambio = threading.Condition()
+        self._orden = None          # Orden pendiente (None = casilla vacía)
+        self._ultima_secuencia = 0  # Mayor secuencia aceptada o invalidada
+        self._cerrado = False
+
+        self.recibidos = 0
+        self.ejecutados = 0
+        self.sustituidos = 0        # Pendientes reemplazados por uno más nuevo
+        self.obsoletos = 0          # Llegados con secuencia antigua
+        self.latencia = HistogramaLatencia()
+
+    def depositar(self, cmd, secuencia):
+        """
+        Deja un comando en la casilla (sustituye al pendiente)
+
+        Args:
+            cmd (str): Comando
+            secuencia (int): Número de secuencia del emisor (creciente)
+
+        Returns:
+            bool: False si se descartó por obsoleto
+        """
+        with self._cambio:
+            self.recibidos += 1
+            if secuencia <= self._ultima_secuencia:
+                self.obsoletos += 1
+                return False
+            if self._orden is not None:
+                self.sustituidos += 1
+            self._ultima_secuencia = secuencia
+            self._orden = Orden(secuencia, cmd, self._reloj_ns())
+            self._cambio.notify()
+            return True
+
+    def invalidar(self, secuencia):
+        """
+        Descarta lo pendiente anterior a un comando ya aplicado por otra vía
+
+        Args:
+            secuencia (int): Secuencia del comando aplicado (p. ej. un cambio
+                de modo); lo que llegue después con una menor es obsoleto
+        """
+        with self._cambio:
+            if self._orden is not None and self._orden.secuencia < secuencia:
+                self._orden = None
+                self.obsoletos += 1
+            self._ultima_secuencia = max(self._ultima_secuencia, secuencia)
+
+    def tomar(self, timeout=None):
+        """
+        Espera y retira el comando más reciente
+
+        Args:
+            timeout (float): Segundos máximos de espera (None = sin límite)
+
+        Returns:
+            Orden: (secuencia, cmd, t_ns), o None si se agotó el tiempo o el
+                buzón está cerrado
+        """
+        with self._cambio:
+            if not self._cambio.wait_for(lambda: self._orden is not None or self._cerrado,
+                                         timeout):
+                return None
+            orden, self._orden = self._orden, None
+            return orden
+
+    def vigente(self, orden):
+        """
+        Comprueba, justo antes de ejecutarla, que una orden retirada no ha
+        quedado superada (por otra más nueva o por invalidar)
+
+        Returns:
+            bool: True si sigue siendo la más reciente
+        """
+        with self._cambio:
+            if orden.secuencia < self._ultima_secuencia:
+                self.obsoletos += 1
+                return False
+            return True
+
+    def registrar_actuacion(self, orden):
+        """Cuenta un comando ejecutado y su latencia desde que se depositó"""
+        self.ejecutados += 1
+        self.latencia.registrar_ns(self._reloj_ns() - orden.t_ns)
+
+    def cerrar(self):
+        """Despierta al hilo de actuación para que termine"""
+        with self._cambio:
+            self._cerrado = True
+            self._orden = None
+            self._cambio.notify_all()
+
+    def estadisticas(self):
+        """
+        Returns:
+            dict: Contadores y latencia depósito -> actuación
+        """
+        return {
+            'recibidos': self.recibidos,
+            'ejecutados': self.ejecutados,
+            'sustituidos': self.sustituidos,
+            'obsoletos': self.obsoletos,
+            'latencia': self.latencia.a_dict()
+        }
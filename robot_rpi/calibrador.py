@@ -4,7 +4,7 @@ Sistema de Calibración Automática de Sensores
 Para robot ASTI Challenge
 """
 
-import RPi.GPIO as GPIO
+from hal_gpio import GPIO
 import time
 import json
 from pathlib import Path
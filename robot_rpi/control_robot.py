@@ -0,0 +1,1128 @@
+#!/usr/bin/env python3
+"""
+Proceso de Control en Tiempo Real - Robot ASTI Challenge
+Hardware (GPIO, motores, sensores), modos autónomos y telemetría
+
+Se ejecuta en un proceso propio, separado del servidor web
+(robot_rpi_mejorado.py): el tráfico de la interfaz, las descargas de logs y
+el bucle de eventlet no comparten GIL ni planificador con los lazos de
+control. El servidor le habla por una tubería de comandos/peticiones y lee
+el estado del robot de un bloque de memoria compartida (estado_compartido.py)
+que los lazos actualizan en cada ciclo.
+
+Los comandos de movimiento de la interfaz llegan sin respuesta a un buzón
+en el que el último gana (buzon_comandos.py): un hilo de actuación ejecuta
+siempre el más reciente y las ráfagas de F/S no forman cola.
+
+En sumo, una guardia por flancos (guardia_borde.py) anula los motores con
+una marcha atrás en cuanto un sensor ve el borde, aunque el lazo vaya con
+retraso.
+
+Si el sistema lo permite, el proceso se ejecuta en un núcleo reservado (el
+servidor web usa los demás) y los hilos de los lazos (modos y actuación)
+con prioridad SCHED_FIFO; el resto de hilos del proceso (telemetría,
+mantenimiento, disparo del ultrasonidos) siguen en SCHED_OTHER.
+"""
+
+from hal_gpio import GPIO, backend_actual, extraer_bits  # Backend: $ROBOT_GPIO_BACKEND (rpi/gpiomem/pigpio/simulado)
+import time
+import threading
+import multiprocessing
+import gc  # Garbage collector para optimización de memoria
+import os
+
+from planificador import PlanificadorPeriodico, POLITICA_RECUPERAR, POLITICA_SALTAR
+from metricas import RegistroMetricas
+from motores import Motor, TraccionDiferencial
+from ultrasonico import SensorUltrasonico
+from sensores_linea import SensoresLinea
+from buzon_comandos import BuzonComandos
+from supervisor_modos import SupervisorModos, token_actual
+from estrategia_sumo import MaquinaSumo, ATACAR
+from seguidor_oponente import SeguidorOponente
+from guardia_borde import GuardiaBorde
+from estado_compartido import BloqueEstado, NOMBRE_BLOQUE, BIT_BORDE_IZQ, BIT_BORDE_DER
+
+# Importar módulos personalizados
+try:
+    from telemetria import SistemaTelemetria, SoloCambios, TasaMaxima, PorCambioDe
+    from calibrador import CalibradorSensores
+    from sensor_color import SensorColor
+    from pinza import ControlPinza
+    from indicadores import SistemaIndicadores
+    MODULOS_DISPONIBLES = True
+except ImportError as e:
+    print(f"[Advertencia] No se pudieron cargar todos los módulos: {e}")
+    print("[Info] El robot funcionará en modo básico")
+    MODULOS_DISPONIBLES = False
+
+# ===== CONFIGURACIÓN DE PINES GPIO =====
+# Motor Izquierdo
+MOTOR_IZQ_A = 17
+MOTOR_IZQ_B = 27
+MOTOR_IZQ_PWM = 22
+
+# Motor Derecho
+MOTOR_DER_A = 23
+MOTOR_DER_B = 24
+MOTOR_DER_PWM = 25
+
+# Sensores IR para seguimiento de línea
+SENSOR_IZQ = 5
+SENSOR_CEN = 6
+SENSOR_DER = 13
+
+# Sensor Ultrasónico
+TRIGGER_PIN = 20
+ECHO_PIN = 21
+
+# Sensores de borde
+SENSOR_BORDE_IZQ = 16
+SENSOR_BORDE_DER = 19
+PINES_BORDE = (SENSOR_BORDE_IZQ, SENSOR_BORDE_DER)  # Leídos juntos con GPIO.leer_banco
+
+# LEDs RGB (opcional)
+LED_ROJO = 26
+LED_VERDE = 19
+LED_AZUL = 13
+
+# Servo Pinza (opcional)
+SERVO_PIN = 18
+
+# Sensor de Color TCS3200 (opcional)
+COLOR_S0 = 17
+COLOR_S1 = 27
+COLOR_S2 = 22
+COLOR_S3 = 23
+COLOR_OUT = 24
+
+# ===== CONFIGURACIÓN =====
+# Formato del log de telemetría: 'binario' (compacto) o 'jsonl' (legible)
+FORMATO_TELEMETRIA = 'binario'
+
+# Rotación de logs: segmentos de 1 MB comprimidos con gzip, máximo 50 MB / 30 días
+TAM_SEGMENTO_TELEMETRIA = 1024 * 1024
+RETENCION_LOGS_BYTES = 50 * 1024 * 1024
+RETENCION_LOGS_DIAS = 30
+
+# Diezmado de los tipos de alta frecuencia: los lazos de control corren a
+# 10-20 Hz pero los sensores cambian poco. Las fábricas crean políticas
+# nuevas (con contadores a cero) para cada sesión de telemetría. En SUMO solo
+# se limitan los ticks repetidos de ATACAR: los cambios de estado (escapes
+# del borde) se registran siempre.
+MUESTREO_TELEMETRIA = {
+    'SENSORES_IR': lambda: SoloCambios(refresco=1.0),
+    'MOVIMIENTO': lambda: SoloCambios(),
+    'SUMO': lambda: PorCambioDe('estado', TasaMaxima(5)),
+}
+
+# Frecuencia de los lazos de control (Hz), con instantes límite absolutos
+FRECUENCIA_LINEA_PID = 20
+FRECUENCIA_LINEA = 10
+FRECUENCIA_SUMO = 20
+FRECUENCIA_SUMO_BASICO = 10
+
+# Tiempo máximo de un cambio de modo (s): cancelar el modo saliente, parar
+# motores y arrancar el siguiente
+LIMITE_CAMBIO_MODO = 0.020
+
+# Latencia máxima (s) entre el flanco de un sensor de borde y la marcha atrás
+# de la guardia (callback GPIO, sin pasar por el lazo del modo)
+PRESUPUESTO_BORDE = 0.005
+
+# Disparos por segundo del sensor ultrasónico (su hilo, independiente de los lazos)
+FRECUENCIA_ULTRASONICO = 16
+
+# Paso de cuantización del duty de los motores (%): evita reescribir el PWM
+# por variaciones mínimas de la corrección del PID
+CUANTIZACION_DUTY = 1
+
+# Histogramas de tiempo de los lazos (duración, jitter, latencia), en /api/metrics
+metricas_lazos = RegistroMetricas()
+
+# Variables globales
+modo_actual = "manual"
+velocidad_base = 80  # Porcentaje (0-100)
+robot_activo = False
+
+# Motores y sensores (se crean al inicializar el GPIO)
+traccion = None
+ultrasonico = None
+sensores_linea = None
+guardia_borde = None
+
+# Oponente en sumo: distancia y acercamiento fusionando las medidas del
+# ultrasonidos (Kalman), con predicción durante las pérdidas breves del eco
+seguidor_oponente = SeguidorOponente()
+
+# Sistemas opcionales
+telemetria = None
+calibrador = None
+sensor_color = None
+pinza = None
+leds = None
+
+# Prioridad de tiempo real de los hilos de los lazos (SCHED_FIFO 1-99, 0 = sin cambios)
+PRIORIDAD_CONTROL = 10
+
+# True si configurar_tiempo_real comprobó que SCHED_FIFO está disponible
+lazos_tiempo_real = False
+
+# Núcleo reservado al proceso de control (None = el último, si hay varios)
+NUCLEO_CONTROL = None
+
+# Bloque de estado compartido (seqlock) que escribe el proceso de control
+estado_compartido = None
+comandos_procesados = 0
+
+# Comandos de movimiento: pasan por el buzón (el último gana). El resto
+# (modos y velocidad) se aplican en orden y descartan los movimientos previos.
+MOVIMIENTOS = ('F', 'B', 'L', 'R', 'S')
+buzon_comandos = BuzonComandos()
+lock_actuacion = threading.Lock()  # Un solo comando tocando los motores a la vez
+hilo_actuacion = None
+
+# ===== CLASE CONTROLADOR PID =====
+class ControladorPID:
+    """Control PID para seguimiento de línea suave"""
+    
+    def __init__(self, kp=1.5, ki=0.1, kd=0.5):
+        self.kp = kp
+        self.ki = ki
+        self.kd = kd
+        self.error_anterior = 0
+        self.integral = 0
+        self.integral_max = 100  # Anti-windup
+    
+    def calcular(self, error):
+        """Calcula la salida PID"""
+        # Integral con anti-windup
+        self.integral += error
+        self.integral = max(-self.integral_max, min(self.integral_max, self.integral))
+        
+        # Derivada
+        derivada = error - self.error_anterior
+        
+        # Salida PID
+        salida = (self.kp * error) + (self.ki * self.integral) + (self.kd * derivada)
+        
+        self.error_anterior = error
+        return salida
+    
+    def reset(self):
+        """Resetea el controlador PID"""
+        self.error_anterior = 0
+        self.integral = 0
+
+# ===== INICIALIZACIÓN GPIO =====
+def inicializar_gpio():
+    """Inicializa todos los pines GPIO"""
+    GPIO.setmode(GPIO.BCM)
+    GPIO.setwarnings(False)
+    
+    # Motores con PWM para control de velocidad (500Hz para RPi 2 W); solo
+    # escriben en el GPIO cuando cambian la dirección o el duty
+    global traccion
+    traccion = TraccionDiferencial(
+        Motor(MOTOR_IZQ_A, MOTOR_IZQ_B, MOTOR_IZQ_PWM, 500, CUANTIZACION_DUTY),
+        Motor(MOTOR_DER_A, MOTOR_DER_B, MOTOR_DER_PWM, 500, CUANTIZACION_DUTY),
+        token_actual=token_actual  # Un modo rezagado ya no mueve los motores
+    )
+    
+    # Sensores IR de línea: estado actualizado por flancos
+    global sensores_linea
+    sensores_linea = SensoresLinea(SENSOR_IZQ, SENSOR_CEN, SENSOR_DER)
+    
+    # Sensores de borde: además del lazo de sumo, los vigila la guardia por
+    # flancos (anula los motores aunque el lazo vaya con retraso)
+    global guardia_borde
+    guardia_borde = GuardiaBorde(SENSOR_BORDE_IZQ, SENSOR_BORDE_DER, traccion,
+                                 presupuesto=PRESUPUESTO_BORDE,
+                                 al_activar=registrar_guardia_borde)
+    
+    # Ultrasonidos: disparo periódico en su propio hilo y eco por flancos
+    global ultrasonico
+    ultrasonico = SensorUltrasonico(TRIGGER_PIN, ECHO_PIN, FRECUENCIA_ULTRASONICO)
+    ultrasonico.iniciar()
+    
+    print("[GPIO] Inicializado correctamente")
+
+def inicializar_modulos():
+    """Inicializa módulos opcionales (telemetría, LEDs, etc.)"""
+    global telemetria, calibrador, sensor_color, pinza, leds
+    
+    if not MODULOS_DISPONIBLES:
+        return
+    
+    try:
+        # Telemetría (escritor en segundo plano: la E/S de la SD no bloquea los lazos)
+        telemetria = SistemaTelemetria(asincrono=True, formato=FORMATO_TELEMETRIA,
+                                       tam_max_segmento=TAM_SEGMENTO_TELEMETRIA,
+                                       retencion_bytes=RETENCION_LOGS_BYTES,
+                                       retencion_dias=RETENCION_LOGS_DIAS,
+                                       muestreo={tipo: crear() for tipo, crear in MUESTREO_TELEMETRIA.items()})
+        telemetria.registrar_evento('INICIO', {'version': '2.0_mejorado'})
+        print("[Telemetría] Iniciada")
+    except Exception as e:
+        print(f"[Telemetría] Error: {e}")
+    
+    try:
+        # Calibrador
+        calibrador = CalibradorSensores(SENSOR_IZQ, SENSOR_CEN, SENSOR_DER)
+        calibrador.cargar_calibracion()
+        print("[Calibrador] Iniciado")
+    except Exception as e:
+        print(f"[Calibrador] Error: {e}")
+    
+    try:
+        # LEDs
+        leds = SistemaIndicadores(LED_ROJO, LED_VERDE, LED_AZUL)
+        leds.secuencia_inicio()
+        print("[LEDs] Iniciados")
+    except Exception as e:
+        print(f"[LEDs] Error: {e}")
+    
+    # Sensor de color y pinza solo si están conectados
+    # (se inicializarán bajo demanda)
+
+# ===== FUNCIONES DE MOVIMIENTO =====
+def avanzar():
+    """Mueve el robot hacia adelante"""
+    if telemetria:
+        telemetria.registrar_evento('MOVIMIENTO', {'accion': 'avanzar', 'velocidad': velocidad_base})
+    
+    traccion.mover(velocidad_base, velocidad_base)
+
+def retroceder():
+    """Mueve el robot hacia atrás"""
+    if telemetria:
+        telemetria.registrar_evento('MOVIMIENTO', {'accion': 'retroceder', 'velocidad': velocidad_base})
+    
+    traccion.mover(-velocidad_base, -velocidad_base)
+
+def girar_izquierda():
+    """Gira el robot a la izquierda"""
+    if telemetria:
+        telemetria.registrar_evento('MOVIMIENTO', {'accion': 'girar_izquierda', 'velocidad': velocidad_base})
+    
+    traccion.mover(-velocidad_base * 0.7, velocidad_base * 0.7)
+
+def girar_derecha():
+    """Gira el robot a la derecha"""
+    if telemetria:
+        telemetria.registrar_evento('MOVIMIENTO', {'accion': 'girar_derecha', 'velocidad': velocidad_base})
+    
+    traccion.mover(velocidad_base * 0.7, -velocidad_base * 0.7)
+
+def detener():
+    """Detiene el robot"""
+    if telemetria:
+        telemetria.registrar_evento('MOVIMIENTO', {'accion': 'detener'})
+    
+    traccion.detener()
+
+def mover_motores_diferencial(vel_izq, vel_der):
+    """
+    Control diferencial de motores para PID
+    
+    Args:
+        vel_izq, vel_der: Velocidad de cada motor (-100 a 100)
+    """
+    traccion.mover(vel_izq, vel_der)
+
+# ===== SENSOR ULTRASÓNICO =====
+def medir_distancia():
+    """
+    Estimación del oponente con la última medida del ultrasonidos (no bloquea)
+    
+    Un eco espurio aislado no crea un objetivo ni desvía la pista, y una
+    pérdida breve del eco se cubre con la predicción.
+    
+    Returns:
+        EstimacionOponente: Distancia en cm, acercamiento (cm/s) y estado
+            (ok, prediccion, tentativo, sin_eco, sin_datos)
+    """
+    return seguidor_oponente.actualizar(ultrasonico.leer())
+
+def registrar_lazo(modo, planificador):
+    """Deja en telemetría la frecuencia real y los retrasos de un lazo"""
+    estadisticas = planificador.estadisticas()
+    print(f"[Lazo] {modo}: {estadisticas['frecuencia_real']:.1f} Hz, "
+          f"{estadisticas['retrasos']} retrasos, {estadisticas['ciclos_saltados']} ciclos saltados")
+    if telemetria:
+        telemetria.registrar_evento('LAZO', dict(estadisticas, modo=modo))
+
+# ===== MODO SEGUIMIENTO DE LÍNEA CON PID =====
+def seguir_linea_pid(token):
+    """
+    Seguimiento de línea con control PID mejorado
+    
+    Args:
+        token (TokenCancelacion): Cancelación del modo (supervisor)
+    """
+    if leds:
+        leds.indicar_estado('LINEA')
+    
+    if telemetria:
+        telemetria.registrar_evento('MODO', {'modo': 'linea_pid', 'iniciado': True})
+    
+    pid = ControladorPID(kp=1.5, ki=0.1, kd=0.5)
+    # El PID está ajustado por muestra: recuperar ciclos mantiene su escala de tiempo
+    metricas = metricas_lazos.lazo('linea_pid', 1.0 / FRECUENCIA_LINEA_PID)
+    # Un cambio de línea despierta el lazo sin esperar al siguiente tick
+    sensores_linea.sincronizar()
+    token.al_cancelar(sensores_linea.interrumpir)
+    planificador = PlanificadorPeriodico(frecuencia=FRECUENCIA_LINEA_PID,
+                                         politica=POLITICA_RECUPERAR, metricas=metricas,
+                                         despertar=sensores_linea.esperar_cambio,
+                                         cancelacion=token)
+    
+    while not token.cancelado:
+        izq, cen, der = sensores_linea.leer()
+        metricas.marcar_lectura()
+        
+        if telemetria:
+            telemetria.registrar_evento('SENSORES_IR', {'izq': izq, 'cen': cen, 'der': der})
+        
+        # Calcular error de posición
+        # -1 = muy a la izquierda, 0 = centrado, 1 = muy a la derecha
+        if cen == 0:
+            error = 0
+        elif izq == 0:
+            error = -1
+        elif der == 0:
+            error = 1
+        else:
+            error = 0  # Perdió la línea - mantener dirección
+        
+        # Calcular corrección PID
+        correccion = pid.calcular(error)
+        
+        # Aplicar corrección a motores
+        vel_izq = velocidad_base - correccion * 20
+        vel_der = velocidad_base + correccion * 20
+        
+        # Limitar velocidades
+        vel_izq = max(0, min(100, vel_izq))
+        vel_der = max(0, min(100, vel_der))
+        
+        # Aplicar velocidades
+        mover_motores_diferencial(vel_izq, vel_der)
+        metricas.marcar_actuacion()
+        publicar_ciclo()
+        
+        planificador.esperar()
+    
+    pid.reset()
+    registrar_lazo('linea_pid', planificador)
+
+# ===== MODO SEGUIMIENTO DE LÍNEA BÁSICO =====
+def seguir_linea(token):
+    """Seguimiento de línea básico (sin PID); token: cancelación del modo"""
+    if leds:
+        leds.indicar_estado('LINEA')
+    
+    if telemetria:
+        telemetria.registrar_evento('MODO', {'modo': 'linea_basico', 'iniciado': True})
+    
+    metricas = metricas_lazos.lazo('linea_basico', 1.0 / FRECUENCIA_LINEA)
+    sensores_linea.sincronizar()
+    token.al_cancelar(sensores_linea.interrumpir)
+    planificador = PlanificadorPeriodico(frecuencia=FRECUENCIA_LINEA, metricas=metricas,
+                                         despertar=sensores_linea.esperar_cambio,
+                                         cancelacion=token)
+    
+    while not token.cancelado:
+        izq, cen, der = sensores_linea.leer()
+        metricas.marcar_lectura()
+        
+        if telemetria:
+            telemetria.registrar_evento('SENSORES_IR', {'izq': izq, 'cen': cen, 'der': der})
+        
+        # 0 = línea negra, 1 = superficie blanca
+        if cen == 0:
+            avanzar()
+        elif izq == 0:
+            girar_izquierda()
+        elif der == 0:
+            girar_derecha()
+        else:
+            girar_derecha()
+        metricas.marcar_actuacion()
+        publicar_ciclo()
+        
+        planificador.esperar()
+    
+    registrar_lazo('linea_basico', planificador)
+
+# ===== MODO SUMO MEJORADO =====
+def registrar_sumo(accion, borde_izq, borde_der, medicion):
+    """Telemetría del sumo: cambios de estado y cada tick de ataque"""
+    if not telemetria:
+        return
+    if accion.estado == ATACAR:
+        datos = {'estado': accion.estado, 'distancia': medicion.distancia}
+        if medicion.velocidad is not None:
+            datos['velocidad'] = medicion.velocidad
+        telemetria.registrar_evento('SUMO', datos)
+    elif accion.cambio:
+        datos = {'estado': accion.estado, 'borde_izq': borde_izq, 'borde_der': borde_der}
+        if medicion.distancia is not None:
+            datos['distancia'] = medicion.distancia
+        telemetria.registrar_evento('SUMO', datos)
+
+def registrar_guardia_borde(activacion):
+    """Telemetría de cada marcha atrás forzada por la guardia de borde"""
+    if activacion['excedido']:
+        print(f"[Guardia] Borde en {activacion['latencia_us']} us "
+              f"(presupuesto {PRESUPUESTO_BORDE * 1e6:.0f} us)")
+    if telemetria:
+        telemetria.registrar_evento('GUARDIA_BORDE', activacion)
+
+def lazo_sumo(token, nombre, frecuencia, maquina, politica=POLITICA_SALTAR):
+    """
+    Lazo de sumo: en cada tick lee bordes y ultrasonidos y aplica el paso
+    de la máquina de estados (las maniobras no bloquean el lazo)
+    
+    Args:
+        token (TokenCancelacion): Cancelación del modo
+        nombre (str): Nombre del lazo en métricas y telemetría
+        frecuencia (float): Ticks por segundo
+        maquina (MaquinaSumo): Estrategia
+        politica (str): Política del planificador ante retrasos
+    """
+    metricas = metricas_lazos.lazo(nombre, 1.0 / frecuencia)
+    planificador = PlanificadorPeriodico(frecuencia=frecuencia, politica=politica,
+                                         metricas=metricas, cancelacion=token)
+    maquina.reiniciar(time.monotonic())
+    seguidor_oponente.reiniciar()
+    
+    # Mientras la guardia anula los motores, las órdenes del lazo quedan
+    # pendientes y se aplican al devolverle el control
+    guardia_borde.armar()
+    try:
+        while not token.cancelado:
+            # Bordes y oponente se leen en todos los ticks, también durante el escape
+            borde_izq, borde_der = extraer_bits(GPIO.leer_banco(PINES_BORDE), PINES_BORDE)
+            medicion = medir_distancia()
+            metricas.marcar_lectura()
+            
+            accion = maquina.paso(time.monotonic(), borde_izq, borde_der, medicion, velocidad_base)
+            mover_motores_diferencial(accion.vel_izq, accion.vel_der)
+            metricas.marcar_actuacion()
+            registrar_sumo(accion, borde_izq, borde_der, medicion)
+            publicar_ciclo((borde_izq, borde_der))
+            
+            planificador.esperar()
+    finally:
+        guardia_borde.desarmar()
+    
+    print(f"[Sumo] {maquina.transiciones} transiciones, "
+          f"{maquina.interrupciones} maniobras interrumpidas, "
+          f"{seguidor_oponente.recuperaciones} pistas recuperadas")
+    registrar_lazo(nombre, planificador)
+
+def modo_sumo_mejorado(token):
+    """
+    Modo sumo con estrategia mejorada (espiral de búsqueda, potencia de
+    ataque según el tiempo hasta el contacto, escape alejándose del borde)
+    
+    Args:
+        token (TokenCancelacion): Cancelación del modo (supervisor)
+    """
+    if leds:
+        leds.indicar_estado('SUMO')
+    
+    if telemetria:
+        telemetria.registrar_evento('MODO', {'modo': 'sumo_mejorado', 'iniciado': True})
+    
+    lazo_sumo(token, 'sumo_mejorado', FRECUENCIA_SUMO, MaquinaSumo())
+
+# ===== MODO SUMO BÁSICO =====
+def modo_sumo(token):
+    """Modo sumo básico; token: cancelación del modo"""
+    if leds:
+        leds.indicar_estado('SUMO')
+    
+    if telemetria:
+        telemetria.registrar_evento('MODO', {'modo': 'sumo_basico', 'iniciado': True})
+    
+    maquina = MaquinaSumo(t_retroceso=0.3, t_giro=0.2, distancia_ataque=50,
+                          distancia_embestida=0, t_busqueda=None, ttc_embestida=None)
+    lazo_sumo(token, 'sumo_basico', FRECUENCIA_SUMO_BASICO, maquina)
+
+# ===== MODO LOGÍSTICA (AUTOMATIZACIÓN INDUSTRIAL) =====
+def modo_logistica(token):
+    """
+    Modo logística - Automatización industrial
+    Ciclo: Ir a zona → Detectar color → Agarrar → Transportar → Soltar
+    
+    Args:
+        token (TokenCancelacion): Cancelación del modo; cada espera la
+            comprueba, así que el ciclo se abandona en cualquier paso
+    """
+    if leds:
+        leds.indicar_estado('LOGISTICA')
+    
+    if telemetria:
+        telemetria.registrar_evento('MODO', {'modo': 'logistica', 'iniciado': True})
+    
+    print("[Logística] Iniciando modo automatización...")
+    
+    # Estados del ciclo logístico
+    estados = ['IR_A_RECOGIDA', 'DETECTAR_COLOR', 'AGARRAR', 
+               'IR_A_ENTREGA', 'SOLTAR', 'VOLVER']
+    
+    for estado in estados:
+        if token.cancelado:
+            break
+        
+        print(f"[Logística] Estado: {estado}")
+        if telemetria:
+            telemetria.registrar_evento('LOGISTICA', {'estado': estado})
+        publicar_ciclo()
+        
+        if estado == 'IR_A_RECOGIDA':
+            # Seguir línea hasta zona de recogida
+            if leds:
+                leds.indicar_estado('BUSCANDO')
+            avanzar()
+            if token.esperar(2):  # Simular desplazamiento
+                break
+            detener()
+        
+        elif estado == 'DETECTAR_COLOR':
+            # Detectar color del objeto
+            if leds:
+                leds.indicar_estado('CLASIFICANDO')
+            if sensor_color:
+                color = sensor_color.leer_color()
+                print(f"[Logística] Color detectado: {color}")
+                if telemetria:
+                    telemetria.registrar_evento('COLOR_DETECTADO', {'color': color})
+            if token.esperar(1):
+                break
+        
+        elif estado == 'AGARRAR':
+            # Agarrar objeto con pinza
+            if leds:
+                leds.indicar_estado('TRANSPORTANDO')
+            if pinza:
+                pinza.agarrar_objeto(cancelacion=token)
+            else:
+                print("[Logística] Simulando agarre (pinza no disponible)")
+                token.esperar(1)
+        
+        elif estado == 'IR_A_ENTREGA':
+            # Transportar a zona de entrega
+            avanzar()
+            if token.esperar(2):  # Simular transporte
+                break
+            detener()
+        
+        elif estado == 'SOLTAR':
+            # Soltar objeto
+            if pinza:
+                pinza.soltar_objeto(cancelacion=token)
+            else:
+                print("[Logística] Simulando liberación (pinza no disponible)")
+                token.esperar(1)
+        
+        elif estado == 'VOLVER':
+            # Volver a posición inicial
+            retroceder()
+            if token.esperar(2):
+                break
+            detener()
+    
+    if token.cancelado:
+        print("[Logística] Ciclo cancelado")
+        if telemetria:
+            telemetria.registrar_evento('LOGISTICA', {'estado': 'CANCELADO'})
+        return
+    
+    if leds:
+        leds.secuencia_exito(cancelacion=token)
+    
+    print("[Logística] ✓ Ciclo completado")
+    if telemetria:
+        telemetria.registrar_evento('LOGISTICA', {'estado': 'COMPLETADO'})
+
+# ===== SUPERVISOR DE MODOS =====
+def elevar_prioridad_hilo():
+    """
+    Pasa el hilo actual a SCHED_FIFO (hilos de los lazos)
+    
+    La prioridad se aplica por hilo y no al proceso entero: los hilos que
+    hereden SCHED_FIFO (telemetría, compresión) no podrían ceder la CPU a
+    los lazos, porque FIFO no reparte el tiempo entre prioridades iguales.
+    """
+    if not lazos_tiempo_real:
+        return
+    try:
+        os.sched_setscheduler(0, os.SCHED_FIFO, os.sched_param(PRIORIDAD_CONTROL))
+    except (AttributeError, PermissionError, OSError):
+        pass
+
+def parar_motores():
+    """Para los motores al terminar un modo (antes de arrancar el siguiente)"""
+    if traccion:
+        detener()
+
+def registrar_cambio_modo(cambio):
+    """Deja en telemetría cada cambio de modo con su latencia"""
+    if cambio['excedido']:
+        print(f"[Supervisor] Cambio {cambio['de']} -> {cambio['a']} en "
+              f"{cambio['latencia_ms']} ms (límite {LIMITE_CAMBIO_MODO * 1000:.0f} ms)")
+    if telemetria:
+        telemetria.registrar_evento('CAMBIO_MODO', cambio)
+
+# Dueño del único hilo de modo: cada cambio cancela el anterior antes de arrancar
+supervisor = SupervisorModos(LIMITE_CAMBIO_MODO, al_parar=parar_motores,
+                             al_cambiar=registrar_cambio_modo,
+                             al_iniciar=elevar_prioridad_hilo)
+
+# ===== ESTADO Y COMANDOS =====
+def estado_robot():
+    """Estado actual (modo, velocidad, activo)"""
+    return {
+        'modo': modo_actual,
+        'velocidad': velocidad_base,
+        'activo': robot_activo
+    }
+
+def publicar_estado():
+    """Copia modo, velocidad, activo y motores al bloque compartido"""
+    if estado_compartido is None:
+        return
+    duty_izq, duty_der = traccion.duties() if traccion else (0, 0)
+    estado_compartido.escribir(modo=modo_actual, velocidad=velocidad_base,
+                               activo=robot_activo, comandos=comandos_procesados,
+                               duty_izq=duty_izq, duty_der=duty_der)
+
+def publicar_ciclo(bordes=None):
+    """
+    Publica sensores, distancia y motores al final de un ciclo de lazo
+    
+    Args:
+        bordes (tuple): (borde_izq, borde_der) si el lazo los ha leído
+    """
+    if estado_compartido is None:
+        return
+    sensores = sensores_linea.palabra
+    if bordes is not None:
+        sensores |= (bordes[0] << BIT_BORDE_IZQ) | (bordes[1] << BIT_BORDE_DER)
+    estimacion = ultrasonico.distancia_actual()
+    duty_izq, duty_der = traccion.duties()
+    estado_compartido.escribir(ciclo=True, sensores=sensores,
+                               distancia=estimacion.distancia,
+                               acercamiento=estimacion.velocidad,
+                               estado_distancia=estimacion.estado,
+                               duty_izq=duty_izq, duty_der=duty_der,
+                               t_linea_ns=sensores_linea.ultimo_flanco_ns() or 0)
+
+def procesar_comando(cmd):
+    """
+    Ejecuta un comando de la interfaz web
+    
+    Args:
+        cmd (str): F, B, L, R, S, M1-M4 o V<velocidad>
+        
+    Returns:
+        dict: Estado tras el comando
+    """
+    global modo_actual, velocidad_base, robot_activo, comandos_procesados
+    
+    print(f'[Comando] Recibido: {cmd}')
+    comandos_procesados += 1
+    
+    if cmd == 'F':
+        avanzar()
+    elif cmd == 'B':
+        retroceder()
+    elif cmd == 'L':
+        girar_izquierda()
+    elif cmd == 'R':
+        girar_derecha()
+    elif cmd == 'S':
+        detener()
+    elif cmd == 'M1':  # Modo Línea
+        modo_actual = 'linea'
+        robot_activo = True
+        supervisor.activar('linea', seguir_linea_pid)
+    elif cmd == 'M2':  # Modo Sumo
+        modo_actual = 'sumo'
+        robot_activo = True
+        supervisor.activar('sumo', modo_sumo_mejorado)
+    elif cmd == 'M3':  # Modo Manual
+        robot_activo = False
+        modo_actual = 'manual'
+        supervisor.detener()  # Para también los motores
+        if leds:
+            leds.indicar_estado('MANUAL')
+        gc.collect()  # Fuera de la latencia del cambio
+    elif cmd == 'M4':  # Modo Logística
+        modo_actual = 'logistica'
+        robot_activo = True
+        supervisor.activar('logistica', modo_logistica)
+    elif cmd.startswith('V'):
+        try:
+            vel = int(cmd[1:])
+            if 0 <= vel <= 100:
+                velocidad_base = vel
+        except:
+            pass
+    
+    publicar_estado()
+    return estado_robot()
+
+def aplicar_comando(cmd, secuencia):
+    """
+    Ejecuta un comando en orden, invalidando los movimientos anteriores
+    
+    Args:
+        cmd (str): Comando (ver procesar_comando)
+        secuencia (int): Secuencia del comando en la tubería
+        
+    Returns:
+        dict: Estado tras el comando
+    """
+    with lock_actuacion:
+        buzon_comandos.invalidar(secuencia)
+        return procesar_comando(cmd)
+
+def recibir_orden(cmd, secuencia):
+    """Orden sin respuesta de la interfaz: movimientos al buzón, el resto en orden"""
+    if cmd in MOVIMIENTOS:
+        buzon_comandos.depositar(cmd, secuencia)
+    else:
+        aplicar_comando(cmd, secuencia)
+
+def actuar_comandos():
+    """Hilo de actuación: ejecuta siempre el movimiento más reciente del buzón"""
+    elevar_prioridad_hilo()
+    while True:
+        orden = buzon_comandos.tomar()
+        if orden is None:
+            return  # Buzón cerrado
+        with lock_actuacion:
+            if buzon_comandos.vigente(orden):
+                procesar_comando(orden.cmd)
+                buzon_comandos.registrar_actuacion(orden)
+
+# ===== PETICIONES DEL SERVIDOR WEB =====
+def peticion_estadisticas():
+    """Estado, telemetría, motores y ultrasonidos (para /api/status)"""
+    stats = {}
+    if telemetria:
+        stats = telemetria.obtener_estadisticas()
+    
+    return dict(estado_robot(),
+                telemetria=stats,
+                motores=traccion.estadisticas() if traccion else {},
+                ultrasonico=ultrasonico.estadisticas() if ultrasonico else {})
+
+def peticion_metricas(reiniciar=False):
+    """Histogramas de tiempo de los lazos (con reiniciar=True los pone a cero)"""
+    resultado = {
+        'modo': modo_actual,
+        'activo': robot_activo,
+        'lazos': metricas_lazos.a_dict(),
+        'comandos': buzon_comandos.estadisticas(),
+        'cambios_modo': supervisor.estadisticas(),
+        'guardia_borde': guardia_borde.estadisticas() if guardia_borde else {},
+        'seguidor_oponente': seguidor_oponente.estadisticas()
+    }
+    if reiniciar:
+        metricas_lazos.reiniciar()
+    return resultado
+
+def peticion_archivos_telemetria():
+    """
+    Vuelca la telemetría a disco y devuelve los segmentos de la sesión
+    
+    Las conversiones (JSON, CSV, unión de segmentos) las hace el servidor
+    web sobre los archivos, fuera de este proceso.
+    
+    Returns:
+        list: Rutas de los segmentos, o None sin telemetría
+    """
+    if not telemetria:
+        return None
+    telemetria.guardar()
+    return [str(segmento) for segmento in telemetria.segmentos]
+
+def peticion_calibrar():
+    """Inicia la calibración de sensores; False si no hay calibrador"""
+    if not calibrador:
+        return False
+    threading.Thread(target=calibrador.calibrar_sensores_ir, daemon=True).start()
+    return True
+
+PETICIONES = {
+    'comando': aplicar_comando,
+    'estadisticas': peticion_estadisticas,
+    'metricas': peticion_metricas,
+    'archivos_telemetria': peticion_archivos_telemetria,
+    'calibrar': peticion_calibrar,
+}
+
+# ===== PROCESO DE CONTROL =====
+def nucleo_control():
+    """Núcleo reservado al proceso de control, o None con un solo núcleo"""
+    try:
+        nucleos = sorted(os.sched_getaffinity(0))
+    except AttributeError:
+        return None
+    if len(nucleos) < 2:
+        return None
+    return NUCLEO_CONTROL if NUCLEO_CONTROL is not None else nucleos[-1]
+
+def configurar_tiempo_real():
+    """
+    Núcleo y prioridad del proceso de control (si el sistema lo permite)
+    
+    SCHED_FIFO solo se usa con un núcleo reservado: con uno solo, un lazo
+    ocupado dejaría sin CPU al servidor web. Aquí solo se comprueba que está
+    disponible (el hilo principal vuelve a SCHED_OTHER antes de crear ningún
+    hilo); lo aplican los hilos de los lazos con elevar_prioridad_hilo.
+    
+    Returns:
+        str: Planificación aplicada
+    """
+    nucleo = nucleo_control()
+    if nucleo is None:
+        return 'normal'
+    os.sched_setaffinity(0, {nucleo})
+    global lazos_tiempo_real
+    if PRIORIDAD_CONTROL:
+        try:
+            os.sched_setscheduler(0, os.SCHED_FIFO, os.sched_param(PRIORIDAD_CONTROL))
+            os.sched_setscheduler(0, os.SCHED_OTHER, os.sched_param(0))
+            lazos_tiempo_real = True
+            return f'SCHED_FIFO {PRIORIDAD_CONTROL} en los lazos, núcleo {nucleo}'
+        except (AttributeError, PermissionError, OSError):
+            pass
+    try:
+        os.nice(-10)
+        return f'nice -10, núcleo {nucleo}'
+    except OSError:
+        return f'normal, núcleo {nucleo}'
+
+def finalizar():
+    """Detiene los modos y libera el hardware"""
+    global robot_activo
+    robot_activo = False
+    supervisor.detener()
+    publicar_estado()
+    buzon_comandos.cerrar()
+    if hilo_actuacion:
+        hilo_actuacion.join(timeout=1.0)
+    if guardia_borde:
+        guardia_borde.detener()
+    if ultrasonico:
+        ultrasonico.detener()
+    if traccion:
+        detener()
+        traccion.parar_pwm()
+    if telemetria:
+        telemetria.cerrar()
+        print(f"[Telemetría] Logs guardados en: {telemetria.segmentos[0]}")
+    if leds:
+        leds.apagar()
+    GPIO.cleanup()
+    print("[Sistema] GPIO limpiado")
+
+def ejecutar_proceso_control(conexion, estado, tiempo_real=True):
+    """
+    Punto de entrada del proceso de control
+    
+    Inicializa el hardware y atiende las peticiones de la tubería hasta
+    recibir 'salir' o perder la conexión con el servidor web. Las órdenes
+    ('orden') no tienen respuesta: van al buzón del hilo de actuación.
+    
+    Args:
+        conexion (Connection): Extremo de la tubería del proceso de control
+        estado (BloqueEstado): Bloque de estado compartido (lo escribe este proceso)
+        tiempo_real (bool): Reservar núcleo y subir la prioridad
+    """
+    global estado_compartido, hilo_actuacion
+    estado_compartido = estado
+    planificacion = configurar_tiempo_real() if tiempo_real else 'normal'
+    
+    try:
+        inicializar_gpio()
+        inicializar_modulos()
+        publicar_estado()
+        hilo_actuacion = threading.Thread(target=actuar_comandos, name='actuacion', daemon=True)
+        hilo_actuacion.start()
+        conexion.send((0, 'listo', {
+            'backend': backend_actual().nombre,
+            'planificacion': planificacion,
+            'telemetria': telemetria is not None,
+            'leds': leds is not None
+        }))
+        
+        while True:
+            secuencia, nombre, argumentos = conexion.recv()
+            if nombre == 'salir':
+                break
+            if nombre == 'orden':
+                recibir_orden(secuencia=secuencia, **argumentos)
+                continue
+            if nombre == 'comando':
+                argumentos = dict(argumentos, secuencia=secuencia)
+            try:
+                conexion.send((secuencia, 'ok', PETICIONES[nombre](**argumentos)))
+            except Exception as e:
+                conexion.send((secuencia, 'error', f"{type(e).__name__}: {e}"))
+    except (EOFError, KeyboardInterrupt):
+        pass  # Servidor web terminado o Ctrl+C
+    finally:
+        finalizar()
+
+class ProcesoControl:
+    """
+    Lado del servidor web: arranca el proceso de control y le envía peticiones
+    
+    Un hilo receptor reparte las respuestas de la tubería entre las
+    peticiones que las esperan: el envío solo bloquea lo que dura send(), así
+    que una petición lenta (volcado de telemetría) no retrasa las órdenes
+    (enviar) ni las demás peticiones.
+    """
+    
+    def __init__(self, timeout=2.0, tiempo_real=True, nombre_estado=NOMBRE_BLOQUE,
+                 esperar=None):
+        """
+        Args:
+            timeout (float): Segundos máximos de espera de cada respuesta
+            tiempo_real (bool): Reservar un núcleo y prioridad SCHED_FIFO a
+                los lazos del proceso de control (ver configurar_tiempo_real)
+            nombre_estado (str): Nombre del bloque de estado compartido (otros
+                procesos se conectan con BloqueEstado(nombre))
+            esperar (callable): esperar(evento, timeout) -> bool, espera de
+                las respuestas (por defecto evento.wait; el servidor web la
+                saca del hub de eventlet)
+        """
+        # fork antes de arrancar el servidor: sin hilos ni hub de eventlet aún
+        contexto = multiprocessing.get_context('fork')
+        self.timeout = timeout
+        self.tiempo_real = tiempo_real
+        self.estado = BloqueEstado(nombre_estado, crear=True)
+        self._conexion, self._extremo = contexto.Pipe()
+        self._proceso = contexto.Process(target=ejecutar_proceso_control,
+                                         args=(self._extremo, self.estado, tiempo_real),
+                                         name='control_robot', daemon=True)
+        self._esperar = esperar or (lambda evento, timeout: evento.wait(timeout))
+        self._lock = threading.Lock()         # Secuencia y peticiones pendientes
+        self._lock_envio = threading.Lock()   # Solo mientras dura send()
+        self._secuencia = 0
+        self._pendientes = {}                 # secuencia -> [Event, respuesta]
+        self._receptor = None
+    
+    def iniciar(self, timeout=30.0):
+        """
+        Arranca el proceso y espera a que inicialice el hardware
+        
+        Returns:
+            dict: Backend GPIO, planificación y módulos disponibles
+        """
+        self._proceso.start()
+        self._extremo.close()
+        
+        nucleo = nucleo_control() if self.tiempo_real else None
+        if nucleo is not None:
+            os.sched_setaffinity(0, set(os.sched_getaffinity(0)) - {nucleo})
+        
+        if not self._conexion.poll(timeout):
+            raise TimeoutError("El proceso de control no respondió al iniciar")
+        _, _, info = self._conexion.recv()
+        self._receptor = threading.Thread(target=self._recibir_respuestas,
+                                          name='control-respuestas', daemon=True)
+        self._receptor.start()
+        return info
+    
+    def _recibir_respuestas(self):
+        """Hilo receptor: entrega cada respuesta a la petición que la espera"""
+        try:
+            while True:
+                secuencia, tipo, resultado = self._conexion.recv()
+                with self._lock:
+                    pendiente = self._pendientes.pop(secuencia, None)
+                if pendiente is not None:  # Las de peticiones caducadas se descartan
+                    pendiente[1] = (tipo, resultado)
+                    pendiente[0].set()
+        except (EOFError, OSError):
+            pass  # Proceso de control terminado
+        with self._lock:
+            pendientes, self._pendientes = self._pendientes, {}
+        for evento, _ in pendientes.values():
+            evento.set()  # Sin respuesta: la petición falla en lugar de agotar el tiempo
+    
+    def _enviar(self, nombre, argumentos, respuesta=False):
+        """Asigna secuencia, registra la espera (si la hay) y envía"""
+        pendiente = [threading.Event(), None] if respuesta else None
+        with self._lock:
+            self._secuencia += 1
+            secuencia = self._secuencia
+            if pendiente is not None:
+                self._pendientes[secuencia] = pendiente
+        with self._lock_envio:
+            self._conexion.send((secuencia, nombre, argumentos))
+        return secuencia, pendiente
+    
+    def llamar(self, nombre, timeout=None, **argumentos):
+        """
+        Envía una petición y espera su respuesta
+        
+        Args:
+            nombre (str): Petición (ver PETICIONES)
+            timeout (float): Espera máxima (por defecto la del constructor)
+            **argumentos: Argumentos de la petición
+            
+        Returns:
+            Resultado de la petición
+            
+        Raises:
+            TimeoutError: Si el proceso no responde a tiempo
+            RuntimeError: Si la petición falló en el proceso de control
+        """
+        secuencia, pendiente = self._enviar(nombre, argumentos, respuesta=True)
+        # La espera no retiene ningún lock: otras peticiones y órdenes siguen
+        if not self._esperar(pendiente[0], timeout or self.timeout) or pendiente[1] is None:
+            with self._lock:
+                self._pendientes.pop(secuencia, None)
+            raise TimeoutError(f"Sin respuesta del proceso de control a '{nombre}'")
+        tipo, resultado = pendiente[1]
+        if tipo == 'error':
+            raise RuntimeError(resultado)
+        return resultado
+    
+    def comando(self, cmd):
+        """Envía un comando y espera a que se ejecute; devuelve el estado resultante"""
+        return self.llamar('comando', cmd=cmd)
+    
+    def enviar(self, cmd):
+        """
+        Envía un comando de la interfaz sin esperar respuesta
+        
+        Los movimientos sustituyen al pendiente (el último gana); el estado
+        resultante se ve en el bloque compartido (self.estado).
+        
+        Args:
+            cmd (str): F, B, L, R, S, M1-M4 o V<velocidad>
+        """
+        self._enviar('orden', {'cmd': cmd})
+    
+    def detener(self, timeout=5.0):
+        """Pide al proceso que libere el hardware y espera a que termine"""
+        try:
+            with self._lock_envio:
+                self._conexion.send((0, 'salir', {}))
+        except (OSError, ValueError):
+            pass  # El proceso ya terminó
+        self._proceso.join(timeout)
+        if self._proceso.is_alive():
+            self._proceso.terminate()
+            self._proceso.join(timeout)
+        self.estado.cerrar()
@@ -0,0 +1,294 @@
+#!/usr/bin/env python3
+"""
+Bloque de Estado Compartido entre Procesos
+Robot ASTI Challenge
+
+Instantánea del robot en un bloque de multiprocessing.shared_memory con
+layout fijo (struct), escrita por el proceso de control y leída por
+cualquier número de procesos (servidor web, registrador, monitor de consola)
+sin locks entre procesos. La consistencia se garantiza con un seqlock:
+
+    - El escritor incrementa la secuencia (impar = escritura en curso),
+      escribe los campos y la vuelve a incrementar (par = estable).
+    - El lector copia los campos entre dos lecturas de la secuencia y
+      reintenta si era impar o cambió entremedias.
+
+El escritor nunca espera a los lectores. Los escritores de un mismo proceso
+(hilo de comandos y lazo del modo activo) se serializan con un lock local
+que los lectores no tocan.
+
+Layout (little-endian):
+
+    [secuencia: uint64][magia: 4s][versión: uint16][reservado: 2s]
+    [campos: FORMATO_CAMPOS]
+
+Uso como monitor:
+    python estado_compartido.py                 # Instantánea cada 0,5 s
+    python estado_compartido.py --periodo 0.1
+"""
+
+import argparse
+import math
+import struct
+import sys
+import threading
+import time
+from collections import namedtuple
+from multiprocessing import shared_memory
+
+
+NOMBRE_BLOQUE = 'robot_asti_estado'
+
+MAGIA = b'ASTI'
+VERSION = 1
+_CABECERA = struct.Struct('<4sH2x')
+OFFSET_CABECERA = 8
+OFFSET_CAMPOS = OFFSET_CABECERA + _CABECERA.size
+
+MODOS = ('manual', 'linea', 'sumo', 'logistica')
+ESTADOS_DISTANCIA = ('sin_datos', 'ok', 'sin_eco', 'obsoleta')
+
+# Bits de la máscara de sensores
+BIT_IR_IZQ = 0
+BIT_IR_CEN = 1
+BIT_IR_DER = 2
+BIT_BORDE_IZQ = 3
+BIT_BORDE_DER = 4
+
+CAMPOS = (
+    ('t_ns', 'q'),                 # Última escritura (time.monotonic_ns)
+    ('modo', 'B'),                 # Índice en MODOS
+    ('activo', 'B'),
+    ('velocidad', 'B'),            # Velocidad base (%)
+    ('sensores', 'B'),             # Máscara: IR izq/cen/der (0-2), bordes (3-4)
+    ('distancia', 'f'),            # cm filtrados (NaN sin objetivo)
+    ('acercamiento', 'f'),         # cm/s (NaN si no se conoce)
+    ('duty_izq', 'f'),             # Duty aplicado con signo (-100 a 100)
+    ('duty_der', 'f'),
+    ('estado_distancia', 'B'),     # Índice en ESTADOS_DISTANCIA
+    ('ciclos', 'Q'),               # Ciclos de lazo desde el arranque
+    ('t_ciclo_ns', 'q'),           # Último ciclo de lazo
+    ('t_linea_ns', 'q'),           # Último flanco IR, reloj GPIO.tiempo_ns (0 = ninguno)
+    ('comandos', 'I'),             # Comandos procesados
+)
+FORMATO_CAMPOS = struct.Struct('<' + ''.join(formato for _, formato in CAMPOS))
+TAMANO = OFFSET_CAMPOS + FORMATO_CAMPOS.size
+
+# Bloques creados por este proceso (los registra su resource_tracker)
+_CREADOS = set()
+
+# Reintentos de lectura antes de considerar que el escritor murió a mitad
+MAX_REINTENTOS = 10000
+
+
+class Instantanea(namedtuple('Instantanea', [nombre for nombre, _ in CAMPOS] + ['secuencia'])):
+    """Copia consistente del bloque (ver CAMPOS); modo y estado_distancia ya como texto"""
+
+    __slots__ = ()
+
+    @property
+    def edad(self):
+        """Segundos desde la última escritura"""
+        return (time.monotonic_ns() - self.t_ns) / 1e9 if self.t_ns else None
+
+    def sensor(self, bit):
+        """Valor (0/1) de un bit de la máscara de sensores"""
+        return (self.sensores >> bit) & 1
+
+    def resumen(self):
+        """
+        Returns:
+            dict: modo, velocidad y activo (el estado que muestra la interfaz)
+        """
+        return {'modo': self.modo, 'velocidad': self.velocidad, 'activo': self.activo}
+
+    def a_dict(self):
+        """Diccionario serializable a JSON (NaN como None)"""
+        datos = self._asdict()
+        for clave in ('distancia', 'acercamiento'):
+            if math.isnan(datos[clave]):
+                datos[clave] = None
+        return datos
+
+
+class BloqueEstado:
+    """Bloque de memoria compartida con seqlock"""
+
+    def __init__(self, nombre=NOMBRE_BLOQUE, crear=False):
+        """
+        Crea el bloque o se conecta a uno existente
+
+        Args:
+            nombre (str): Nombre del segmento (/dev/shm/<nombre>)
+            crear (bool): True en el proceso dueño (lo crea, reemplazando uno
+                huérfano de una ejecución anterior); False para conectarse
+
+        Raises:
+            FileNotFoundError: Si crear=False y el bloque no existe
+            ValueError: Si el bloque tiene otro layout
+        """
+        self.nombre = nombre
+        self.dueno = crear
+        if crear:
+            try:
+                self._shm = shared_memory.SharedMemory(nombre, create=True, size=TAMANO)
+            except FileExistsError:
+                huerfano = shared_memory.SharedMemory(nombre)
+                huerfano.close()
+                huerfano.unlink()
+                self._shm = shared_memory.SharedMemory(nombre, create=True, size=TAMANO)
+            _CREADOS.add(nombre)
+        else:
+            self._shm = _conectar(nombre)
+
+        self._buf = self._shm.buf
+        self._secuencia = self._buf[:8].cast('Q')  # Un solo almacenamiento alineado
+
+        if crear:
+            self._buf[:TAMANO] = bytes(TAMANO)
+            _CABECERA.pack_into(self._buf, OFFSET_CABECERA, MAGIA, VERSION)
+        elif _CABECERA.unpack_from(self._buf, OFFSET_CABECERA) != (MAGIA, VERSION):
+            self.cerrar()
+            raise ValueError(f"El bloque '{nombre}' no tiene el layout esperado")
+
+        # Valores vigentes del escritor (cada escritura publica el bloque entero)
+        self._valores = dict.fromkeys((campo for campo, _ in CAMPOS), 0)
+        self._valores.update(distancia=math.nan, acercamiento=math.nan, duty_izq=0.0,
+                             duty_der=0.0)
+        self._lock_escritor = threading.Lock()
+
+    # --- Escritor ---
+    def escribir(self, ciclo=False, **campos):
+        """
+        Actualiza campos y publica la instantánea (sin esperar a los lectores)
+
+        Args:
+            ciclo (bool): Cuenta un ciclo de lazo (ciclos y t_ciclo_ns)
+            **campos: Campos de CAMPOS; modo y estado_distancia como texto,
+                distancia y acercamiento None si no se conocen
+        """
+        with self._lock_escritor:
+            valores = self._valores
+            for nombre, valor in campos.items():
+                if nombre == 'modo':
+                    valor = MODOS.index(valor)
+                elif nombre == 'estado_distancia':
+                    valor = ESTADOS_DISTANCIA.index(valor)
+                elif nombre in ('distancia', 'acercamiento') and valor is None:
+                    valor = math.nan
+                elif nombre not in valores:
+                    raise KeyError(f"Campo desconocido: {nombre}")
+                valores[nombre] = valor
+            valores['t_ns'] = time.monotonic_ns()
+            if ciclo:
+                valores['ciclos'] += 1
+                valores['t_ciclo_ns'] = valores['t_ns']
+
+            secuencia = self._secuencia[0]
+            self._secuencia[0] = secuencia + 1     # Impar: escritura en curso
+            FORMATO_CAMPOS.pack_into(self._buf, OFFSET_CAMPOS, *valores.values())
+            self._secuencia[0] = secuencia + 2     # Par: estable
+
+    # --- Lectores ---
+    def leer(self):
+        """
+        Copia consistente del bloque (no bloquea al escritor)
+
+        Returns:
+            Instantanea: Campos del bloque y secuencia leída
+
+        Raises:
+            RuntimeError: Si el bloque sigue a mitad de escritura tras
+                MAX_REINTENTOS (el escritor murió escribiendo)
+        """
+        for intento in range(MAX_REINTENTOS):
+            antes = self._secuencia[0]
+            if not antes & 1:
+                valores = FORMATO_CAMPOS.unpack_from(self._buf, OFFSET_CAMPOS)
+                if self._secuencia[0] == antes:
+                    break
+            if intento % 100 == 99:
+                time.sleep(0)  # Cede la CPU al escritor (un solo núcleo)
+        else:
+            raise RuntimeError(f"Bloque '{self.nombre}' inconsistente: escritor detenido")
+
+        valores = list(valores)
+        valores[1] = MODOS[valores[1]]
+        valores[2] = bool(valores[2])
+        valores[9] = ESTADOS_DISTANCIA[valores[9]]
+        return Instantanea(*valores, antes)
+
+    def cerrar(self):
+        """Libera la vista del bloque (y lo elimina si este proceso es el dueño)"""
+        self._secuencia.release()
+        self._buf = None
+        self._shm.close()
+        if self.dueno:
+            _CREADOS.discard(self.nombre)
+            try:
+                self._shm.unlink()
+            except FileNotFoundError:
+                pass
+
+    def __getstate__(self):
+        # Al pasar el bloque a otro proceso solo viaja el nombre
+        return {'nombre': self.nombre}
+
+    def __setstate__(self, estado):
+        self.__init__(estado['nombre'])
+
+
+def _conectar(nombre):
+    """Abre un bloque existente sin que el resource_tracker lo borre al salir"""
+    try:
+        return shared_memory.SharedMemory(nombre, track=False)  # Python 3.13+
+    except TypeError:
+        pass
+    from multiprocessing import resource_tracker
+    shm = shared_memory.SharedMemory(nombre)
+    if nombre not in _CREADOS:  # El registro del dueño debe seguir
+        resource_tracker.unregister(shm._name, 'shared_memory')
+    return shm
+
+
+# ===== MONITOR DE CONSOLA =====
+def formatear(instantanea):
+    """Una línea de texto con la instantánea"""
+    ir = ''.join(str(instantanea.sensor(bit)) for bit in (BIT_IR_IZQ, BIT_IR_CEN, BIT_IR_DER))
+    borde = ''.join(str(instantanea.sensor(bit)) for bit in (BIT_BORDE_IZQ, BIT_BORDE_DER))
+    distancia = ('---' if math.isnan(instantanea.distancia)
+                 else f"{instantanea.distancia:5.1f}cm")
+    return (f"{instantanea.modo:<9} {'ACTIVO' if instantanea.activo else 'parado'} "
+            f"v={instantanea.velocidad:3d}% IR={ir} borde={borde} "
+            f"dist={distancia} ({instantanea.estado_distancia}) "
+            f"motores={instantanea.duty_izq:+4.0f}/{instantanea.duty_der:+4.0f} "
+            f"ciclos={instantanea.ciclos} comandos={instantanea.comandos} "
+            f"edad={instantanea.edad or 0:.2f}s")
+
+
+def main(argv=None):
+    """Muestra el estado del robot en ejecución"""
+    parser = argparse.ArgumentParser(description="Monitor del estado compartido del robot")
+    parser.add_argument('--nombre', default=NOMBRE_BLOQUE, help="Nombre del bloque")
+    parser.add_argument('--periodo', type=float, default=0.5, help="Segundos entre líneas")
+    args = parser.parse_args(argv)
+
+    try:
+        bloque = BloqueEstado(args.nombre)
+    except FileNotFoundError:
+        print(f"No hay ningún robot publicando en '{args.nombre}'")
+        return 1
+
+    try:
+        while True:
+            print(formatear(bloque.leer()))
+            time.sleep(args.periodo)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        bloque.cerrar()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,187 @@
+#!/usr/bin/env python3
+"""
+Estrategia de Sumo como Máquina de Estados Temporizada
+Robot ASTI Challenge
+
+Las maniobras (escapar del borde, buscar, atacar) no duermen: cada estado
+tiene un instante de fin y el lazo de sumo llama a paso() en cada tick con
+los sensores recién leídos. Así los bordes y el ultrasonidos se comprueban
+en todos los ciclos, y cualquier maniobra se interrumpe por un borde nuevo
+o por la detección del oponente.
+
+Estados:
+    - BUSCAR:     giro en espiral (derecha, luego izquierda, alternando)
+    - ATACAR:     avance hacia el oponente (potencia máxima si está muy cerca)
+    - RETROCEDER: primera fase del escape al detectar borde
+    - GIRAR:      segunda fase del escape, hacia el lado contrario al borde
+
+Prioridades en cada tick: borde > oponente > maniobra en curso.
+
+En ATACAR la potencia sube con la inminencia del choque: de la velocidad
+base con un tiempo hasta el contacto de ttc_rampa segundos o más, hasta el
+100 % a ttc_embestida o menos (o por debajo de distancia_embestida, ya en
+contacto). La estimación del oponente (seguidor_oponente.py) sigue siendo
+válida durante una pérdida breve del eco, así que el ataque no se corta.
+
+Uso:
+    maquina = MaquinaSumo()
+    while not token.cancelado:
+        accion = maquina.paso(time.monotonic(), borde_izq, borde_der,
+                              seguidor.actualizar(ultrasonico.leer()), velocidad_base)
+        mover_motores_diferencial(accion.vel_izq, accion.vel_der)
+        planificador.esperar()
+"""
+
+from collections import namedtuple
+
+from seguidor_oponente import tiempo_contacto
+
+
+BUSCAR = 'BUSCAR'
+ATACAR = 'ATACAR'
+RETROCEDER = 'RETROCEDER'
+GIRAR = 'GIRAR'
+ESTADOS = (BUSCAR, ATACAR, RETROCEDER, GIRAR)
+
+# Fracción de la velocidad base en los giros (igual que girar_izquierda/derecha)
+FACTOR_GIRO = 0.7
+
+
+class Accion(namedtuple('Accion', 'estado vel_izq vel_der cambio')):
+    """
+    Orden para los motores en un tick
+
+    Attributes:
+        estado (str): Estado tras el tick
+        vel_izq, vel_der (float): Velocidades con signo (-100 a 100)
+        cambio (bool): True si el estado cambió en este tick
+    """
+
+    __slots__ = ()
+
+
+class MaquinaSumo:
+    """Estrategia de sumo por estados con maniobras temporizadas"""
+
+    def __init__(self, t_retroceso=0.4, t_giro=0.3, distancia_ataque=60,
+                 distancia_embestida=20, t_busqueda=1.0, retroceso_min=0.15,
+                 ttc_embestida=0.4, ttc_rampa=1.5):
+        """
+        Args:
+            t_retroceso (float): Segundos de marcha atrás al detectar borde
+            t_giro (float): Segundos de giro tras la marcha atrás
+            distancia_ataque (float): cm por debajo de los que se ataca
+            distancia_embestida (float): cm por debajo de los que se ataca a
+                potencia máxima (0 = nunca)
+            t_busqueda (float): Segundos de cada sentido de la espiral de
+                búsqueda (None = girar siempre a la derecha)
+            retroceso_min (float): Marcha atrás mínima antes de que el
+                oponente pueda interrumpir el escape (un borde siempre puede)
+            ttc_embestida (float): Tiempo hasta el contacto (s) por debajo
+                del que se ataca a potencia máxima (None = sin rampa)
+            ttc_rampa (float): Tiempo hasta el contacto (s) a partir del que
+                la potencia empieza a subir desde la velocidad base
+        """
+        self.t_retroceso = t_retroceso
+        self.t_giro = t_giro
+        self.distancia_ataque = distancia_ataque
+        self.distancia_embestida = distancia_embestida
+        self.t_busqueda = t_busqueda
+        self.retroceso_min = retroceso_min
+        self.ttc_embestida = ttc_embestida
+        self.ttc_rampa = ttc_rampa
+
+        self.transiciones = 0
+        self.interrupciones = 0   # Maniobras de escape cortadas por borde u oponente
+        self.reiniciar(0.0)
+
+    def reiniciar(self, ahora):
+        """Vuelve a BUSCAR (al empezar el modo)"""
+        self.estado = BUSCAR
+        self._inicio = ahora          # Inicio del estado actual
+        self._fin = None              # Fin de la maniobra temporizada actual
+        self._giro_derecha = True     # Sentido del giro de escape
+
+    def _cambiar(self, estado, ahora, duracion=None):
+        if self.estado in (RETROCEDER, GIRAR) and (self._fin is None or ahora < self._fin):
+            self.interrupciones += 1
+        self.estado = estado
+        self._inicio = ahora
+        self._fin = ahora + duracion if duracion is not None else None
+        self.transiciones += 1
+
+    def paso(self, ahora, borde_izq, borde_der, medicion, velocidad):
+        """
+        Avanza la máquina un tick
+
+        Args:
+            ahora (float): Instante actual (time.monotonic)
+            borde_izq, borde_der (int): 1 si el sensor ve el borde
+            medicion (EstimacionOponente): Estimación del oponente (sirve
+                cualquiera con valida, distancia y velocidad)
+            velocidad (float): Velocidad base (%)
+
+        Returns:
+            Accion: Estado y velocidades a aplicar en este tick
+        """
+        anterior = self.estado
+        oponente = medicion.valida and medicion.distancia < self.distancia_ataque
+
+        if borde_izq == 1 or borde_der == 1:
+            # Borde: empieza el escape (o lo prolonga si se sigue viendo),
+            # alejándose del lado detectado
+            if self.estado == RETROCEDER:
+                self._fin = ahora + self.t_retroceso
+            else:
+                self._cambiar(RETROCEDER, ahora, self.t_retroceso)
+            self._giro_derecha = borde_izq == 1
+        elif oponente and (self.estado in (BUSCAR, GIRAR) or
+                           (self.estado == RETROCEDER and
+                            ahora - self._inicio >= self.retroceso_min)):
+            self._cambiar(ATACAR, ahora)
+        elif self.estado == ATACAR and not oponente:
+            self._cambiar(BUSCAR, ahora)
+        elif self.estado == RETROCEDER and ahora >= self._fin:
+            self._cambiar(GIRAR, ahora, self.t_giro)
+        elif self.estado == GIRAR and ahora >= self._fin:
+            self._cambiar(BUSCAR, ahora)
+
+        return Accion(self.estado, *self._velocidades(ahora, medicion, velocidad),
+                      self.estado != anterior)
+
+    def potencia_ataque(self, ttc, velocidad):
+        """
+        Potencia de ataque según el tiempo hasta el contacto
+
+        Args:
+            ttc (float): Segundos hasta el contacto (inf si no se acercan)
+            velocidad (float): Velocidad base (%)
+
+        Returns:
+            float: Entre la velocidad base (lejos) y 100 (choque inminente)
+        """
+        if self.ttc_embestida is None or ttc >= self.ttc_rampa:
+            return velocidad
+        if ttc <= self.ttc_embestida:
+            return 100
+        fraccion = (self.ttc_rampa - ttc) / (self.ttc_rampa - self.ttc_embestida)
+        return velocidad + (100 - velocidad) * fraccion
+
+    def _velocidades(self, ahora, medicion, velocidad):
+        """Velocidades de los motores en el estado actual"""
+        giro = velocidad * FACTOR_GIRO
+        if self.estado == ATACAR:
+            if self.distancia_embestida and medicion.distancia < self.distancia_embestida:
+                return 100, 100  # Muy cerca - máxima potencia
+            potencia = self.potencia_ataque(tiempo_contacto(medicion.distancia,
+                                                            medicion.velocidad), velocidad)
+            return potencia, potencia
+        if self.estado == RETROCEDER:
+            return -velocidad, -velocidad
+        if self.estado == GIRAR:
+            return (giro, -giro) if self._giro_derecha else (-giro, giro)
+
+        # BUSCAR: espiral alternando el sentido cada t_busqueda
+        if self.t_busqueda is None or int((ahora - self._inicio) / self.t_busqueda) % 2 == 0:
+            return giro, -giro
+        return -giro, giro
@@ -0,0 +1,146 @@
+#!/usr/bin/env python3
+"""
+Guardia de Borde por Interrupciones
+Robot ASTI Challenge
+
+En sumo, el lazo del modo lee los sensores de borde en cada tick, pero un
+ciclo atascado (telemetría, recolección de basura, un cambio de contexto)
+puede sacar al robot del dohyo. La guardia escucha los flancos de subida de
+los sensores de borde (hal_gpio) y, desde el propio callback, anula los
+motores con una marcha atrás (TraccionDiferencial.anular) sin pasar por el
+lazo. Cuando el borde deja de verse durante t_escape, devuelve los motores
+al modo con su última orden.
+
+La latencia flanco -> motores se mide con el reloj del GPIO (en el
+simulador con reloj_real, la del código real) y se compara con un
+presupuesto configurable.
+
+Uso:
+    guardia = GuardiaBorde(16, 19, traccion)
+    guardia.armar()        # Al entrar en sumo
+    ...
+    guardia.desarmar()     # Al salir
+"""
+
+import threading
+
+from hal_gpio import GPIO, extraer_bits
+from metricas import HistogramaLatencia
+
+
+class GuardiaBorde:
+    """Anulación de los motores al detectar el borde"""
+
+    def __init__(self, pin_izq, pin_der, traccion, velocidad=100, t_escape=0.3,
+                 presupuesto=0.005, al_activar=None):
+        """
+        Args:
+            pin_izq, pin_der (int): Sensores de borde (HIGH = borde)
+            traccion (TraccionDiferencial): Motores a anular
+            velocidad (float): Velocidad de la marcha atrás (%)
+            t_escape (float): Segundos de marcha atrás tras el último borde
+            presupuesto (float): Latencia máxima flanco -> motores (s)
+            al_activar (callable): al_activar(dict) tras cada activación
+                (pin, latencia_us, excedido), fuera del camino crítico
+        """
+        self.pines = (pin_izq, pin_der)
+        self.traccion = traccion
+        self.velocidad = velocidad
+        self.t_escape = t_escape
+        self.presupuesto = presupuesto
+        self._al_activar = al_activar
+
+        self.armada = False
+        self._lock = threading.Lock()
+        self._temporizador = None
+
+        self.activaciones = 0
+        self.excedidos = 0
+        self.latencia = HistogramaLatencia()
+
+        for pin in self.pines:
+            GPIO.setup(pin, GPIO.IN)
+        self._manejadores = [GPIO.agregar_callback_flanco(pin, GPIO.RISING, self._al_flanco)
+                             for pin in self.pines]
+
+    def armar(self):
+        """Activa la guardia (modos con borde, como el sumo)"""
+        with self._lock:
+            self.armada = True
+        # Si ya se está sobre el borde no habrá flanco: se actúa en el acto
+        izq, der = extraer_bits(GPIO.leer_banco(self.pines), self.pines)
+        if izq or der:
+            self._al_flanco(self.pines[0] if izq else self.pines[1], GPIO.HIGH, GPIO.tiempo_ns())
+
+    def desarmar(self):
+        """Desactiva la guardia y devuelve los motores si estaban anulados"""
+        # Con el lock: ningún flanco en curso puede anular después de liberar
+        with self._lock:
+            self.armada = False
+            if self._temporizador is not None:
+                self._temporizador.cancel()
+                self._temporizador = None
+            self.traccion.liberar()
+
+    def _al_flanco(self, pin, nivel, t_ns):
+        """Callback del flanco de subida: marcha atrás inmediata"""
+        with self._lock:
+            if not self.armada:
+                return
+            self.traccion.anular(-self.velocidad, -self.velocidad)
+            latencia_ns = GPIO.tiempo_ns() - t_ns
+
+            self.activaciones += 1
+            self.latencia.registrar_ns(latencia_ns)
+            excedido = latencia_ns > self.presupuesto * 1e9
+            if excedido:
+                self.excedidos += 1
+            self._programar_fin()
+        if self._al_activar is not None:
+            self._al_activar({'pin': pin, 'latencia_us': latencia_ns // 1000,
+                              'excedido': excedido})
+
+    def _programar_fin(self):
+        """Reinicia el temporizador de fin de escape (con el lock tomado)"""
+        if self._temporizador is not None:
+            self._temporizador.cancel()
+        self._temporizador = threading.Timer(self.t_escape, self._fin_escape)
+        self._temporizador.daemon = True
+        self._temporizador.start()
+
+    def _fin_escape(self):
+        """Fin de la marcha atrás: se prolonga si aún se ve el borde"""
+        with self._lock:
+            if not self.armada:
+                # Nunca dejar los motores anulados con la guardia desarmada
+                self.traccion.liberar()
+                return
+            if self._temporizador is not threading.current_thread():
+                return  # Sustituido por un flanco posterior
+            # Un flanco nuevo deja el pin a HIGH antes de su callback: se ve aquí
+            if any(extraer_bits(GPIO.leer_banco(self.pines), self.pines)):
+                self._programar_fin()
+                return
+            self._temporizador = None
+            self.traccion.liberar()
+
+    def detener(self):
+        """Desarma la guardia y deja de escuchar los flancos"""
+        self.desarmar()
+        for manejador in self._manejadores:
+            manejador.cancelar()
+        self._manejadores = []
+
+    def estadisticas(self):
+        """
+        Returns:
+            dict: Activaciones, presupuesto, excedidos y latencia flanco -> motores
+        """
+        return {
+            'armada': self.armada,
+            'anulando': self.traccion.anulada,
+            'activaciones': self.activaciones,
+            'presupuesto_us': int(self.presupuesto * 1e6),
+            'excedidos': self.excedidos,
+            'latencia': self.latencia.a_dict()
+        }
@@ -0,0 +1,821 @@
+#!/usr/bin/env python3
+"""
+Capa de Abstracción del GPIO (HAL)
+Robot ASTI Challenge
+
+Todos los módulos usan `from hal_gpio import GPIO`, un objeto con la misma
+API que RPi.GPIO (setup, output, input, PWM, add_event_detect...) que
+delega en el backend seleccionado al arrancar:
+
+    - rpi:      RPi.GPIO (PWM por software, flancos con marca de tiempo
+                tomada en el hilo de callbacks)
+    - gpiomem:  RPi.GPIO, leyendo el banco de entradas directamente de los
+                registros mapeados en memoria (/dev/gpiomem)
+    - pigpio:   demonio pigpiod por socket, sin dependencias de Python:
+                PWM temporizado por DMA y flancos con marca de tiempo del
+                hardware (µs)
+    - simulado: simulador determinista con reloj virtual, para los tests
+
+El backend se elige con la variable de entorno ROBOT_GPIO_BACKEND o con
+seleccionar_backend(); por defecto 'gpiomem' (o 'rpi' sin /dev/gpiomem) si
+RPi.GPIO está instalado y 'simulado' si no.
+
+Además de la API de RPi.GPIO, todos los backends ofrecen:
+    GPIO.agregar_callback_flanco(pin, flanco, funcion)  # funcion(pin, nivel, t_ns)
+    GPIO.tiempo_ns()  # Reloj de las marcas de tiempo de los flancos
+    GPIO.leer_banco(pines)  # Niveles de los GPIO 0-31 como máscara de bits
+"""
+
+import collections
+import mmap
+import os
+import socket
+import struct
+import threading
+import time
+
+
+# ===== CONSTANTES (mismos valores que RPi.GPIO) =====
+BOARD = 10
+BCM = 11
+OUT = 0
+IN = 1
+LOW = 0
+HIGH = 1
+PUD_OFF = 20
+PUD_DOWN = 21
+PUD_UP = 22
+RISING = 31
+FALLING = 32
+BOTH = 33
+
+# Operaciones que la fachada toma directamente del backend (sin indirección)
+OPERACIONES = ('setmode', 'setwarnings', 'setup', 'output', 'input', 'cleanup',
+               'PWM', 'add_event_detect', 'remove_event_detect',
+               'agregar_callback_flanco', 'tiempo_ns', 'leer_banco')
+
+VARIABLE_ENTORNO = 'ROBOT_GPIO_BACKEND'
+
+
+class ManejadorFlanco:
+    """Registro de un callback de flanco; cancelar() lo elimina"""
+
+    __slots__ = ('backend', 'pin', 'flanco', 'funcion')
+
+    def __init__(self, backend, pin, flanco, funcion):
+        self.backend = backend
+        self.pin = pin
+        self.flanco = flanco
+        self.funcion = funcion
+
+    def cancelar(self):
+        """Deja de recibir flancos"""
+        self.backend._quitar_callback_flanco(self)
+
+
+class BackendGPIO:
+    """
+    Base de los backends
+
+    Gestiona los callbacks de flanco con marca de tiempo; cada backend
+    decide cómo detecta los flancos (_activar_flancos/_desactivar_flancos)
+    y llama a _despachar_flanco al detectarlos.
+    """
+
+    nombre = None
+
+    def __init__(self):
+        self._callbacks = {}  # pin -> lista de ManejadorFlanco
+        self._lock_callbacks = threading.Lock()
+
+    # --- Flancos con marca de tiempo ---
+    def agregar_callback_flanco(self, pin, flanco, funcion):
+        """
+        Registra una función para los flancos de un pin
+
+        Args:
+            pin (int): Pin (numeración BCM)
+            flanco (int): RISING, FALLING o BOTH
+            funcion (callable): funcion(pin, nivel, t_ns); t_ns en el reloj
+                de tiempo_ns() del backend
+
+        Returns:
+            ManejadorFlanco: Registro (cancelar() para eliminarlo)
+        """
+        if flanco not in (RISING, FALLING, BOTH):
+            raise ValueError(f"Flanco no válido: {flanco}")
+        manejador = ManejadorFlanco(self, pin, flanco, funcion)
+        with self._lock_callbacks:
+            primero = pin not in self._callbacks
+            # Copia en escritura: el despacho recorre la lista sin bloquear
+            self._callbacks[pin] = self._callbacks.get(pin, []) + [manejador]
+        if primero:
+            self._activar_flancos(pin)
+        return manejador
+
+    def _quitar_callback_flanco(self, manejador):
+        with self._lock_callbacks:
+            restantes = [m for m in self._callbacks.get(manejador.pin, []) if m is not manejador]
+            vacio = not restantes and manejador.pin in self._callbacks
+            if restantes:
+                self._callbacks[manejador.pin] = restantes
+            else:
+                self._callbacks.pop(manejador.pin, None)
+        if vacio:
+            self._desactivar_flancos(manejador.pin)
+
+    def _despachar_flanco(self, pin, nivel, t_ns):
+        """Llama a los callbacks del pin que coinciden con el flanco"""
+        for manejador in self._callbacks.get(pin, ()):
+            flanco = manejador.flanco
+            if flanco == BOTH or (flanco == RISING) == bool(nivel):
+                manejador.funcion(pin, nivel, t_ns)
+
+    def _activar_flancos(self, pin):
+        raise NotImplementedError
+
+    def _desactivar_flancos(self, pin):
+        raise NotImplementedError
+
+    def _limpiar_callbacks(self):
+        with self._lock_callbacks:
+            pines = list(self._callbacks)
+            self._callbacks = {}
+        for pin in pines:
+            self._desactivar_flancos(pin)
+
+    # --- API compatible con RPi.GPIO ---
+    def add_event_detect(self, pin, flanco, callback=None, bouncetime=None):
+        """
+        Detección de flancos al estilo RPi.GPIO: callback(pin)
+
+        Args:
+            bouncetime (int): Milisegundos en los que se ignoran flancos
+                tras uno aceptado (antirrebote)
+        """
+        if callback is None:
+            callback = lambda pin: None
+        rebote_ns = (bouncetime or 0) * 1_000_000
+        ultimo = [None]
+
+        def al_flanco(pin, nivel, t_ns):
+            if ultimo[0] is not None and t_ns - ultimo[0] < rebote_ns:
+                return
+            ultimo[0] = t_ns
+            callback(pin)
+
+        self.agregar_callback_flanco(pin, flanco, al_flanco)
+
+    def remove_event_detect(self, pin):
+        """Elimina todos los callbacks de flanco de un pin"""
+        for manejador in list(self._callbacks.get(pin, ())):
+            manejador.cancelar()
+
+    def tiempo_ns(self):
+        """Instante actual en el reloj de las marcas de tiempo de flancos"""
+        return time.monotonic_ns()
+
+    def leer_banco(self, pines=()):
+        """
+        Niveles de las entradas como máscara de bits (bit n = GPIO n)
+
+        Los backends con acceso al banco completo (gpiomem, pigpio,
+        simulado) leen los GPIO 0-31 en una sola operación, sin desfase
+        entre pines, e ignoran `pines`; este respaldo lee uno a uno los
+        pines indicados.
+
+        Args:
+            pines (iterable): Pines que necesita el llamante
+
+        Returns:
+            int: Máscara con el nivel de cada pin
+        """
+        banco = 0
+        for pin in pines:
+            if self.input(pin):
+                banco |= 1 << pin
+        return banco
+
+
+# ===== BACKEND RPi.GPIO =====
+class BackendRPiGPIO(BackendGPIO):
+    """
+    RPi.GPIO
+
+    Las operaciones frecuentes son directamente las funciones de la
+    extensión C. Las marcas de tiempo de los flancos se toman al ejecutarse
+    el callback en el hilo de RPi.GPIO (precisión de decenas de µs a ms).
+    """
+
+    nombre = 'rpi'
+
+    def __init__(self):
+        super().__init__()
+        import RPi.GPIO as gpio
+        self._gpio = gpio
+        self.setmode = gpio.setmode
+        self.setwarnings = gpio.setwarnings
+        self.setup = gpio.setup
+        self.output = gpio.output
+        self.input = gpio.input
+        self.PWM = gpio.PWM
+
+    def _activar_flancos(self, pin):
+        self._gpio.add_event_detect(pin, BOTH, callback=self._al_flanco)
+
+    def _desactivar_flancos(self, pin):
+        self._gpio.remove_event_detect(pin)
+
+    def _al_flanco(self, pin):
+        # RPi.GPIO no dice qué flanco fue (y solo admite una detección por
+        # pin): el nivel se lee aquí, después del flanco, y en pulsos más
+        # cortos que la latencia del callback ya no es el del flanco. Quien
+        # mida pulsos debe deducir la polaridad de su estado (ver ultrasonico)
+        t_ns = time.monotonic_ns()
+        self._despachar_flanco(pin, self._gpio.input(pin), t_ns)
+
+    def cleanup(self, *pines):
+        self._limpiar_callbacks()
+        self._gpio.cleanup(*pines)
+
+
+class BancoGPIO:
+    """
+    Registros del GPIO mapeados en memoria
+
+    /dev/gpiomem expone el bloque de registros del GPIO sin necesidad de
+    root. GPLEV0 (desplazamiento 0x34) contiene el nivel de los GPIO 0-31:
+    leerlo a través de una vista de enteros de 32 bits es una única carga
+    alineada, así que todos los pines se muestrean a la vez.
+    """
+
+    TAMANO = 4096
+    GPLEV0 = 0x34
+
+    def __init__(self, ruta='/dev/gpiomem'):
+        """
+        Args:
+            ruta (str): Dispositivo (o un archivo de 4 KB en los tests)
+        """
+        self.ruta = ruta
+        with open(ruta, 'rb') as archivo:
+            self._mapa = mmap.mmap(archivo.fileno(), self.TAMANO, mmap.MAP_SHARED,
+                                   mmap.PROT_READ)
+        self._registros = memoryview(self._mapa).cast('I')
+        self._indice = self.GPLEV0 // 4
+
+    def leer(self, pines=()):
+        """
+        Nivel de los GPIO 0-31
+
+        Returns:
+            int: Máscara de bits de GPLEV0
+        """
+        return self._registros[self._indice]
+
+    def cerrar(self):
+        """Libera el mapeo"""
+        self._registros.release()
+        self._mapa.close()
+
+
+class BackendGpiomem(BackendRPiGPIO):
+    """RPi.GPIO con lectura del banco de entradas por /dev/gpiomem"""
+
+    nombre = 'gpiomem'
+
+    def __init__(self, ruta='/dev/gpiomem'):
+        super().__init__()
+        self.banco = BancoGPIO(ruta)
+        self.leer_banco = self.banco.leer
+
+    def cleanup(self, *pines):
+        super().cleanup(*pines)
+        if not pines:
+            self.banco.cerrar()
+
+
+# ===== BACKEND PIGPIO =====
+class ErrorPigpio(RuntimeError):
+    """Error devuelto por el demonio pigpiod"""
+
+    def __init__(self, comando, codigo):
+        super().__init__(f"pigpiod: comando {comando} devolvió el error {codigo}")
+        self.comando = comando
+        self.codigo = codigo
+
+
+class RelojTicks:
+    """
+    Convierte los ticks de 32 bits de pigpio (µs, dan la vuelta cada ~72
+    min) en ns de 64 bits, tolerando ticks ligeramente desordenados
+    """
+
+    def __init__(self):
+        self._ultimo_us = None
+        self._lock = threading.Lock()
+
+    def a_ns(self, tick):
+        with self._lock:
+            if self._ultimo_us is None:
+                self._ultimo_us = tick
+                return tick * 1000
+            delta = (tick - self._ultimo_us) & 0xFFFFFFFF
+            if delta >= 0x80000000:
+                return (self._ultimo_us - (0x100000000 - delta)) * 1000  # Del pasado
+            self._ultimo_us += delta
+            return self._ultimo_us * 1000
+
+
+class PWMPigpio:
+    """PWM temporizado por DMA en pigpiod, con la API de RPi.GPIO.PWM"""
+
+    RANGO = 1000  # Resolución del duty: 0.1 %
+
+    def __init__(self, backend, pin, frecuencia):
+        self._backend = backend
+        self.pin = pin
+        self.frecuencia = frecuencia
+
+    def start(self, duty):
+        self._backend._comando(BackendPigpio.CMD_PFS, self.pin, int(self.frecuencia))
+        self._backend._comando(BackendPigpio.CMD_PRS, self.pin, self.RANGO)
+        self.ChangeDutyCycle(duty)
+
+    def ChangeDutyCycle(self, duty):
+        if not 0 <= duty <= 100:
+            raise ValueError("El duty cycle debe estar entre 0 y 100")
+        self._backend._comando(BackendPigpio.CMD_PWM, self.pin,
+                               int(round(duty * self.RANGO / 100)))
+
+    def ChangeFrequency(self, frecuencia):
+        self.frecuencia = frecuencia
+        self._backend._comando(BackendPigpio.CMD_PFS, self.pin, int(frecuencia))
+
+    def stop(self):
+        self._backend._comando(BackendPigpio.CMD_PWM, self.pin, 0)
+
+
+class BackendPigpio(BackendGPIO):
+    """
+    Cliente del protocolo de socket de pigpiod
+
+    Cada comando son 16 bytes (cmd, p1, p2, p3 como uint32 LE) y la
+    respuesta otros 16 con el resultado (int32) al final. Los flancos
+    llegan por un segundo socket de notificaciones: informes de 12 bytes
+    (secuencia, flags, tick en µs, niveles del banco 1).
+    """
+
+    nombre = 'pigpio'
+
+    CMD_MODES = 0
+    CMD_PUD = 2
+    CMD_READ = 3
+    CMD_WRITE = 4
+    CMD_PWM = 5
+    CMD_PRS = 6
+    CMD_PFS = 7
+    CMD_BR1 = 10
+    CMD_TICK = 16
+    CMD_NB = 19
+    CMD_NC = 21
+    CMD_NOIB = 99
+
+    _COMANDO = struct.Struct('<IIII')
+    _RESPUESTA = struct.Struct('<IIIi')
+    _INFORME = struct.Struct('<HHII')
+    _PULL = {PUD_OFF: 0, PUD_DOWN: 1, PUD_UP: 2}
+
+    def __init__(self, host=None, puerto=None):
+        """
+        Args:
+            host (str): Máquina de pigpiod (por defecto $PIGPIO_ADDR o localhost)
+            puerto (int): Puerto (por defecto $PIGPIO_PORT o 8888)
+        """
+        super().__init__()
+        self.host = host or os.environ.get('PIGPIO_ADDR', 'localhost')
+        self.puerto = int(puerto or os.environ.get('PIGPIO_PORT', 8888))
+        self._socket = self._conectar()
+        self._lock = threading.Lock()
+        self._reloj = RelojTicks()
+        self._configurados = set()
+
+        # Notificaciones de flancos (se abren con el primer callback)
+        self._socket_notif = None
+        self._handle = None
+        self._hilo_notif = None
+        self._bits = 0
+        self._niveles = 0
+
+    def _conectar(self):
+        conexion = socket.create_connection((self.host, self.puerto), timeout=5)
+        conexion.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        conexion.settimeout(None)
+        return conexion
+
+    @staticmethod
+    def _recibir(conexion, n):
+        datos = b''
+        while len(datos) < n:
+            bloque = conexion.recv(n - len(datos))
+            if not bloque:
+                raise ConnectionError("Conexión con pigpiod cerrada")
+            datos += bloque
+        return datos
+
+    def _comando(self, cmd, p1=0, p2=0, conexion=None, sin_signo=False):
+        """
+        Envía un comando y devuelve su resultado
+
+        Args:
+            sin_signo (bool): El resultado es un uint32 (ticks, niveles del
+                banco) y no un código de error
+
+        Raises:
+            ErrorPigpio: Si pigpiod devuelve un código negativo
+        """
+        conexion = conexion or self._socket
+        with self._lock:
+            conexion.sendall(self._COMANDO.pack(cmd, p1 & 0xFFFFFFFF, p2 & 0xFFFFFFFF, 0))
+            resultado = self._RESPUESTA.unpack(self._recibir(conexion, self._RESPUESTA.size))[3]
+        if sin_signo:
+            return resultado & 0xFFFFFFFF
+        if resultado < 0:
+            raise ErrorPigpio(cmd, resultado)
+        return resultado
+
+    # --- API compatible con RPi.GPIO ---
+    def setmode(self, modo):
+        if modo != BCM:
+            raise ValueError("pigpio solo admite numeración BCM")
+
+    def setwarnings(self, activar):
+        pass
+
+    def setup(self, pin, modo, pull_up_down=PUD_OFF, initial=None):
+        self._comando(self.CMD_MODES, pin, 1 if modo == OUT else 0)
+        if modo == IN:
+            self._comando(self.CMD_PUD, pin, self._PULL[pull_up_down])
+        elif initial is not None:
+            self.output(pin, initial)
+        self._configurados.add(pin)
+
+    def output(self, pin, nivel):
+        self._comando(self.CMD_WRITE, pin, 1 if nivel else 0)
+
+    def input(self, pin):
+        return self._comando(self.CMD_READ, pin)
+
+    def PWM(self, pin, frecuencia):
+        return PWMPigpio(self, pin, frecuencia)
+
+    def tiempo_ns(self):
+        return self._reloj.a_ns(self._comando(self.CMD_TICK, sin_signo=True))
+
+    def leer_banco(self, pines=()):
+        return self._comando(self.CMD_BR1, sin_signo=True)
+
+    def cleanup(self, *pines):
+        """Devuelve los pines usados a entrada y cierra las conexiones"""
+        self._limpiar_callbacks()
+        for pin in (pines or tuple(self._configurados)):
+            self._comando(self.CMD_MODES, pin, 0)
+            self._configurados.discard(pin)
+        if not pines:
+            self._cerrar_notificaciones()
+            self._socket.close()
+
+    # --- Flancos ---
+    def _activar_flancos(self, pin):
+        if self._socket_notif is None:
+            self._abrir_notificaciones()
+        self._bits |= 1 << pin
+        self._comando(self.CMD_NB, self._handle, self._bits)
+
+    def _desactivar_flancos(self, pin):
+        self._bits &= ~(1 << pin)
+        if self._handle is not None:
+            self._comando(self.CMD_NB, self._handle, self._bits)
+
+    def _abrir_notificaciones(self):
+        self._socket_notif = self._conectar()
+        self._handle = self._comando(self.CMD_NOIB, conexion=self._socket_notif)
+        self._niveles = self._comando(self.CMD_BR1, sin_signo=True)
+        self._hilo_notif = threading.Thread(target=self._bucle_notificaciones,
+                                            name='pigpio-flancos', daemon=True)
+        self._hilo_notif.start()
+
+    def _cerrar_notificaciones(self):
+        if self._socket_notif is None:
+            return
+        try:
+            self._comando(self.CMD_NC, self._handle)
+        except (OSError, ErrorPigpio):
+            pass
+        self._socket_notif.close()
+        self._socket_notif = None
+        self._handle = None
+
+    def _bucle_notificaciones(self):
+        """Lee los informes de niveles y despacha los pines que cambian"""
+        conexion = self._socket_notif
+        tam = self._INFORME.size
+        try:
+            while True:
+                _, flags, tick, niveles = self._INFORME.unpack(self._recibir(conexion, tam))
+                if flags:
+                    continue  # Watchdog, keep-alive o evento: no son cambios de nivel
+                cambios = (niveles ^ self._niveles) & self._bits
+                self._niveles = niveles
+                if not cambios:
+                    continue
+                t_ns = self._reloj.a_ns(tick)
+                while cambios:
+                    bit = cambios & -cambios
+                    pin = bit.bit_length() - 1
+                    self._despachar_flanco(pin, 1 if niveles & bit else 0, t_ns)
+                    cambios ^= bit
+        except (OSError, ConnectionError):
+            pass  # Conexión cerrada en cleanup()
+
+
+# ===== BACKEND SIMULADO =====
+class PWMSimulado:
+    """PWM del simulador: registra el duty aplicado"""
+
+    def __init__(self, simulador, pin, frecuencia):
+        self._simulador = simulador
+        self.pin = pin
+        self.frecuencia = frecuencia
+        self.duty = 0
+        self.activo = False
+
+    def start(self, duty):
+        self.activo = True
+        self.ChangeDutyCycle(duty)
+
+    def ChangeDutyCycle(self, duty):
+        if not 0 <= duty <= 100:
+            raise ValueError("El duty cycle debe estar entre 0 y 100")
+        self.duty = duty
+        self._simulador._registrar('pwm', self.pin, duty)
+
+    def ChangeFrequency(self, frecuencia):
+        self.frecuencia = frecuencia
+
+    def stop(self):
+        self.activo = False
+        self.duty = 0
+
+
+class BackendSimulado(BackendGPIO):
+    """
+    Simulador determinista del GPIO
+
+    Las entradas quedan a HIGH con pull-up y a LOW en otro caso hasta que
+    el test las cambia con simular_entrada(). El reloj de los flancos es
+    virtual y solo avanza con avanzar() o con el retardo de
+    simular_entrada(), así que las marcas de tiempo son reproducibles.
+    Con reloj_real=True avanza además con el tiempo monotónico, para medir
+    latencias reales (flanco -> escritura) del código bajo prueba.
+    conectar() permite modelar dispositivos que reaccionan a las salidas.
+    """
+
+    nombre = 'simulado'
+
+    def __init__(self, historial=10000, reloj_real=False):
+        """
+        Args:
+            historial (int): Operaciones recordadas en `historial`
+            reloj_real (bool): El reloj avanza también con time.monotonic_ns
+        """
+        super().__init__()
+        self.t_ns = 0  # Desplazamiento acumulado por avanzar()
+        self.reloj_real = reloj_real
+        self._origen_ns = time.monotonic_ns()
+        self.modo = None
+        self.pines = {}  # pin -> {'modo', 'nivel', 'pull'}
+        self.pwms = {}
+        self.historial = collections.deque(maxlen=historial)
+        self.escrituras = collections.Counter()
+        self._dispositivos = {}
+
+    def _registrar(self, operacion, pin, valor):
+        self.escrituras[operacion] += 1
+        self.historial.append((self.tiempo_ns(), operacion, pin, valor))
+
+    # --- API compatible con RPi.GPIO ---
+    def setmode(self, modo):
+        self.modo = modo
+
+    def setwarnings(self, activar):
+        pass
+
+    def setup(self, pin, modo, pull_up_down=PUD_OFF, initial=None):
+        nivel = HIGH if (modo == IN and pull_up_down == PUD_UP) else LOW
+        if modo == OUT and initial is not None:
+            nivel = initial
+        self.pines[pin] = {'modo': modo, 'nivel': nivel, 'pull': pull_up_down}
+
+    def output(self, pin, nivel):
+        estado = self.pines.get(pin)
+        if estado is None or estado['modo'] != OUT:
+            raise RuntimeError(f"El pin {pin} no está configurado como salida")
+        nivel = HIGH if nivel else LOW
+        estado['nivel'] = nivel
+        self._registrar('output', pin, nivel)
+        dispositivo = self._dispositivos.get(pin)
+        if dispositivo is not None:
+            dispositivo(self, pin, nivel)
+
+    def input(self, pin):
+        estado = self.pines.get(pin)
+        if estado is None:
+            raise RuntimeError(f"El pin {pin} no está configurado")
+        return estado['nivel']
+
+    def PWM(self, pin, frecuencia):
+        pwm = PWMSimulado(self, pin, frecuencia)
+        self.pwms[pin] = pwm
+        return pwm
+
+    def cleanup(self, *pines):
+        self._limpiar_callbacks()
+        if pines:
+            for pin in pines:
+                self.pines.pop(pin, None)
+        else:
+            self.pines.clear()
+            self.pwms.clear()
+
+    def tiempo_ns(self):
+        if self.reloj_real:
+            return self.t_ns + time.monotonic_ns() - self._origen_ns
+        return self.t_ns
+
+    def leer_banco(self, pines=()):
+        banco = 0
+        for pin, estado in self.pines.items():
+            if estado['nivel'] and pin < 32:
+                banco |= 1 << pin
+        return banco
+
+    # --- Control del simulador ---
+    def avanzar(self, segundos):
+        """Avanza el reloj virtual"""
+        self.t_ns += int(round(segundos * 1e9))
+
+    def simular_entrada(self, pin, nivel, retardo=0.0):
+        """
+        Cambia el nivel de una entrada y dispara sus flancos
+
+        Args:
+            pin (int): Pin de entrada (se configura como IN si no lo estaba)
+            nivel (int): Nuevo nivel
+            retardo (float): Segundos que avanza el reloj antes del cambio
+        """
+        self.avanzar(retardo)
+        estado = self.pines.setdefault(pin, {'modo': IN, 'nivel': LOW, 'pull': PUD_OFF})
+        nivel = HIGH if nivel else LOW
+        if estado['nivel'] == nivel:
+            return
+        estado['nivel'] = nivel
+        self._despachar_flanco(pin, nivel, self.tiempo_ns())
+
+    def conectar(self, pin, dispositivo):
+        """
+        Modela un dispositivo que reacciona a las escrituras en un pin
+
+        Args:
+            pin (int): Pin de salida
+            dispositivo (callable): dispositivo(simulador, pin, nivel), o
+                None para desconectar
+        """
+        if dispositivo is None:
+            self._dispositivos.pop(pin, None)
+        else:
+            self._dispositivos[pin] = dispositivo
+
+    def _activar_flancos(self, pin):
+        pass  # simular_entrada despacha directamente
+
+    def _desactivar_flancos(self, pin):
+        pass
+
+
+# ===== SELECCIÓN DEL BACKEND =====
+BACKENDS = {
+    BackendRPiGPIO.nombre: BackendRPiGPIO,
+    BackendGpiomem.nombre: BackendGpiomem,
+    BackendPigpio.nombre: BackendPigpio,
+    BackendSimulado.nombre: BackendSimulado,
+}
+
+
+class FachadaGPIO:
+    """
+    Objeto `GPIO` que importan los módulos
+
+    Al seleccionar un backend sus operaciones se copian como atributos de
+    la instancia, de modo que GPIO.output(...) llama directamente al
+    backend. Si se usa antes de seleccionar ninguno, se elige el backend
+    por defecto.
+    """
+
+    BOARD = BOARD
+    BCM = BCM
+    OUT = OUT
+    IN = IN
+    LOW = LOW
+    HIGH = HIGH
+    PUD_OFF = PUD_OFF
+    PUD_DOWN = PUD_DOWN
+    PUD_UP = PUD_UP
+    RISING = RISING
+    FALLING = FALLING
+    BOTH = BOTH
+
+    def __init__(self):
+        self.backend = None
+
+    def _usar(self, backend):
+        self.backend = backend
+        for operacion in OPERACIONES:
+            setattr(self, operacion, getattr(backend, operacion))
+
+    def __getattr__(self, nombre):
+        # Solo se llega aquí si aún no hay backend (o el nombre no existe)
+        if nombre in OPERACIONES and self.__dict__.get('backend') is None:
+            seleccionar_backend()
+            return getattr(self, nombre)
+        raise AttributeError(nombre)
+
+
+GPIO = FachadaGPIO()
+
+
+def crear_backend(nombre, **opciones):
+    """
+    Crea un backend por nombre
+
+    Args:
+        nombre (str): 'rpi', 'gpiomem', 'pigpio' o 'simulado'
+        **opciones: Argumentos del constructor (ej: host/puerto de pigpio)
+
+    Returns:
+        BackendGPIO: Backend creado
+    """
+    if nombre not in BACKENDS:
+        raise ValueError(f"Backend GPIO desconocido: {nombre} (opciones: {', '.join(BACKENDS)})")
+    return BACKENDS[nombre](**opciones)
+
+
+def seleccionar_backend(backend=None, **opciones):
+    """
+    Selecciona el backend que usa `GPIO`
+
+    Args:
+        backend (str|BackendGPIO): Nombre o instancia. Sin él se usa
+            $ROBOT_GPIO_BACKEND, o 'gpiomem' ('rpi' sin /dev/gpiomem) si
+            RPi.GPIO está instalado y 'simulado' si no.
+        **opciones: Argumentos del constructor del backend
+
+    Returns:
+        BackendGPIO: Backend activo
+    """
+    if backend is None:
+        backend = os.environ.get(VARIABLE_ENTORNO)
+    if backend is None:
+        try:
+            backend = crear_backend('gpiomem')
+        except OSError:
+            backend = crear_backend('rpi')
+        except (ImportError, RuntimeError):
+            print("[GPIO] RPi.GPIO no disponible: usando el simulador")
+            backend = crear_backend('simulado')
+    elif isinstance(backend, str):
+        backend = crear_backend(backend, **opciones)
+
+    GPIO._usar(backend)
+    return backend
+
+
+def backend_actual():
+    """Backend en uso (lo selecciona si aún no hay ninguno)"""
+    if GPIO.backend is None:
+        seleccionar_backend()
+    return GPIO.backend
+
+
+def extraer_bits(banco, pines):
+    """
+    Decodifica pines de una máscara de leer_banco()
+
+    Args:
+        banco (int): Máscara de niveles
+        pines (iterable): Pines a extraer
+
+    Returns:
+        tuple: Nivel (0/1) de cada pin, en el mismo orden
+    """
+    return tuple((banco >> pin) & 1 for pin in pines)
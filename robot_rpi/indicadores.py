@@ -5,7 +5,7 @@ Para comunicación de estado del robot
 Robot ASTI Challenge
 """
 
-import RPi.GPIO as GPIO
+from hal_gpio import GPIO
 import time
 import threading
 
@@ -91,7 +91,7 @@ class SistemaIndicadores:
         self._set_color(0, 0, 0)
         self.estado_actual = None
     
-    def parpadear(self, estado, veces=3, intervalo=0.3):
+    def parpadear(self, estado, veces=3, intervalo=0.3, cancelacion=None):
         """
         Hace parpadear el LED en un color específico
         
@@ -99,12 +99,16 @@ class SistemaIndicadores:
             estado (str): Estado/color a parpadear
             veces (int): Número de parpadeos
             intervalo (float): Tiempo entre parpadeos
+            cancelacion (TokenCancelacion): Corta el parpadeo si se cancela
+                el modo (supervisor_modos)
         """
+        esperar = cancelacion.esperar if cancelacion is not None else time.sleep
         for _ in range(veces):
             self.indicar_estado(estado)
-            time.sleep(intervalo)
+            cancelado = esperar(intervalo)
             self.apagar()
-            time.sleep(intervalo)
+            if cancelado or esperar(intervalo):
+                break
     
     def _efecto_parpadeo_continuo(self, estado, intervalo):
         """Efecto de parpadeo continuo (thread)"""
@@ -175,10 +179,10 @@ class SistemaIndicadores:
         self.apagar()
         print("[LED] ✓ Secuencia completada")
     
-    def secuencia_exito(self):
+    def secuencia_exito(self, cancelacion=None):
         """Secuencia de LEDs para indicar éxito"""
         print("[LED] ¡Éxito!")
-        self.parpadear('EXITO', veces=5, intervalo=0.2)
+        self.parpadear('EXITO', veces=5, intervalo=0.2, cancelacion=cancelacion)
     
     def secuencia_error(self):
         """Secuencia de LEDs para indicar error"""
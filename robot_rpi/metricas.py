@@ -0,0 +1,218 @@
+#!/usr/bin/env python3
+"""
+Métricas de Tiempo de los Lazos de Control
+Robot ASTI Challenge
+
+Histogramas preasignados de:
+    - duracion: tiempo de trabajo de cada iteración (sin la espera)
+    - jitter:   desviación (absoluta) del periodo real respecto al nominal
+    - latencia: tiempo desde la lectura de sensores hasta la actuación
+
+Cada histograma tiene cubetas logarítmicas en base 2 sobre microsegundos;
+registrar una muestra es un bit_length() y unas sumas, sin reservar memoria,
+así que puede dejarse activo durante la competición.
+"""
+
+import threading
+import time
+from array import array
+
+
+class HistogramaLatencia:
+    """Histograma de duraciones con cubetas en potencias de 2 (µs)"""
+
+    CUBETAS = 22  # [0, 1) µs, [1, 2) µs, ... [2^20, ∞) µs (más de ~1 s)
+
+    def __init__(self):
+        self.conteos = array('L', [0]) * self.CUBETAS
+        self.reiniciar()
+
+    def reiniciar(self):
+        """Pone a cero el histograma"""
+        for i in range(self.CUBETAS):
+            self.conteos[i] = 0
+        self.total = 0
+        self.suma_us = 0
+        self.minimo_us = None
+        self.maximo_us = 0
+
+    def registrar_ns(self, duracion_ns):
+        """
+        Añade una muestra
+
+        Args:
+            duracion_ns (int): Duración en nanosegundos (valor absoluto)
+        """
+        us = abs(duracion_ns) // 1000
+        cubeta = us.bit_length()
+        if cubeta >= self.CUBETAS:
+            cubeta = self.CUBETAS - 1
+        self.conteos[cubeta] += 1
+        self.total += 1
+        self.suma_us += us
+        if self.minimo_us is None or us < self.minimo_us:
+            self.minimo_us = us
+        if us > self.maximo_us:
+            self.maximo_us = us
+
+    @staticmethod
+    def limite_superior_us(cubeta):
+        """Límite superior (exclusivo) de una cubeta en µs"""
+        return 1 << cubeta
+
+    def percentil(self, p):
+        """
+        Estimación de un percentil (límite superior de su cubeta)
+
+        Args:
+            p (float): Percentil entre 0 y 100
+
+        Returns:
+            int: Valor en µs, o None si no hay muestras
+        """
+        if self.total == 0:
+            return None
+        objetivo = max(1, int(self.total * p / 100 + 0.5))
+        acumulado = 0
+        for cubeta, conteo in enumerate(self.conteos):
+            acumulado += conteo
+            if acumulado >= objetivo:
+                return min(self.limite_superior_us(cubeta), self.maximo_us)
+        return self.maximo_us
+
+    def a_dict(self):
+        """
+        Resumen serializable
+
+        Returns:
+            dict: Muestras, media, mínimo, máximo, percentiles y cubetas
+        """
+        return {
+            'muestras': self.total,
+            'media_us': self.suma_us / self.total if self.total else None,
+            'min_us': self.minimo_us,
+            'max_us': self.maximo_us if self.total else None,
+            'p50_us': self.percentil(50),
+            'p90_us': self.percentil(90),
+            'p99_us': self.percentil(99),
+            'cubetas': [
+                {'hasta_us': self.limite_superior_us(c), 'conteo': n}
+                for c, n in enumerate(self.conteos) if n
+            ]
+        }
+
+
+class MetricasLazo:
+    """
+    Tiempos de un lazo de control
+
+    Uso en cada iteración:
+        metricas.marcar_lectura()      # tras leer los sensores
+        metricas.marcar_actuacion()    # tras mandar la orden a los motores
+    El inicio y el fin de cada ciclo los marca el planificador.
+    """
+
+    def __init__(self, nombre, periodo=None, reloj_ns=time.perf_counter_ns):
+        """
+        Args:
+            nombre (str): Nombre del lazo (ej: 'linea_pid')
+            periodo (float): Periodo nominal en segundos (para el jitter)
+            reloj_ns (callable): Reloj en nanosegundos
+        """
+        self.nombre = nombre
+        self.periodo_ns = None if periodo is None else int(periodo * 1e9)
+        self._reloj_ns = reloj_ns
+        self.duracion = HistogramaLatencia()
+        self.jitter = HistogramaLatencia()
+        self.latencia = HistogramaLatencia()
+        self._inicio_ns = None
+        self._lectura_ns = None
+
+    def inicio_ciclo(self):
+        """Marca el comienzo de una iteración y mide el jitter del periodo"""
+        ahora = self._reloj_ns()
+        if self._inicio_ns is not None and self.periodo_ns is not None:
+            self.jitter.registrar_ns(ahora - self._inicio_ns - self.periodo_ns)
+        self._inicio_ns = ahora
+
+    def fin_ciclo(self):
+        """Marca el final del trabajo de una iteración (antes de esperar)"""
+        if self._inicio_ns is not None:
+            self.duracion.registrar_ns(self._reloj_ns() - self._inicio_ns)
+
+    def marcar_lectura(self):
+        """Instante de lectura de los sensores"""
+        self._lectura_ns = self._reloj_ns()
+
+    def marcar_actuacion(self):
+        """Instante de actuación: registra la latencia desde la última lectura"""
+        if self._lectura_ns is not None:
+            self.latencia.registrar_ns(self._reloj_ns() - self._lectura_ns)
+            self._lectura_ns = None
+
+    def interrumpir(self):
+        """Descarta el ciclo en curso (tras una maniobra bloqueante)"""
+        self._inicio_ns = None
+        self._lectura_ns = None
+
+    def reiniciar(self):
+        """Pone a cero los histogramas"""
+        self.duracion.reiniciar()
+        self.jitter.reiniciar()
+        self.latencia.reiniciar()
+        self.interrumpir()
+
+    def a_dict(self):
+        """Resumen serializable de los tres histogramas"""
+        return {
+            'periodo_us': None if self.periodo_ns is None else self.periodo_ns // 1000,
+            'duracion': self.duracion.a_dict(),
+            'jitter': self.jitter.a_dict(),
+            'latencia': self.latencia.a_dict()
+        }
+
+
+class RegistroMetricas:
+    """Métricas de todos los lazos, por nombre de modo"""
+
+    def __init__(self):
+        self._lazos = {}
+        self._lock = threading.Lock()
+
+    def lazo(self, nombre, periodo=None):
+        """
+        Métricas de un lazo (se crean la primera vez)
+
+        Los histogramas se conservan entre activaciones del mismo modo.
+
+        Args:
+            nombre (str): Nombre del lazo
+            periodo (float): Periodo nominal en segundos
+
+        Returns:
+            MetricasLazo: Métricas del lazo
+        """
+        with self._lock:
+            metricas = self._lazos.get(nombre)
+            if metricas is None:
+                metricas = MetricasLazo(nombre, periodo)
+                self._lazos[nombre] = metricas
+            metricas.interrumpir()
+            return metricas
+
+    def reiniciar(self):
+        """Pone a cero las métricas de todos los lazos"""
+        with self._lock:
+            for metricas in self._lazos.values():
+                metricas.reiniciar()
+
+    def a_dict(self):
+        """
+        Resumen de todos los lazos
+
+        Returns:
+            dict: nombre -> métricas del lazo
+        """
+        with self._lock:
+            lazos = list(self._lazos.items())
+        return {nombre: metricas.a_dict() for nombre, metricas in lazos}
@@ -0,0 +1,237 @@
+#!/usr/bin/env python3
+"""
+Control de Motores DC con Puente H
+Robot ASTI Challenge
+
+Cada motor recuerda el nivel de sus pines de dirección y el duty cycle del
+PWM, y solo escribe en el GPIO cuando algo cambia: en un lazo PID que repite
+la misma orden, la mayoría de ciclos no toca el hardware. El duty puede
+cuantizarse para que pequeñas variaciones de la corrección no provoquen
+escrituras.
+
+La tracción admite una anulación de seguridad (guardia_borde.py): mientras
+está anulada, las órdenes de los modos se ignoran y solo se recuerda la
+última, que se aplica al liberar. Si no llega ninguna (lazo atascado), al
+liberar se paran los motores: nunca se repite la orden previa al borde.
+
+Con `token_actual` (supervisor_modos.token_actual) se descartan además las
+órdenes de un modo ya cancelado que aún no ha terminado: la comprobación se
+hace bajo el mismo lock que la parada del supervisor, así que una orden
+rezagada nunca llega después de parar los motores.
+"""
+
+import threading
+
+from hal_gpio import GPIO
+
+
+class Motor:
+    """Motor DC con dos pines de dirección y un pin PWM de velocidad"""
+
+    def __init__(self, pin_a, pin_b, pin_pwm, frecuencia=500, cuantizacion=0):
+        """
+        Inicializa el motor
+
+        Args:
+            pin_a, pin_b (int): Pines de dirección del puente H
+            pin_pwm (int): Pin de habilitación (PWM)
+            frecuencia (int): Frecuencia del PWM en Hz
+            cuantizacion (float): Paso de duty cycle en % (0 = sin cuantizar)
+        """
+        self.pin_a = pin_a
+        self.pin_b = pin_b
+        self.cuantizacion = cuantizacion
+
+        GPIO.setup(pin_a, GPIO.OUT)
+        GPIO.setup(pin_b, GPIO.OUT)
+        GPIO.setup(pin_pwm, GPIO.OUT)
+        self.pwm = GPIO.PWM(pin_pwm, frecuencia)
+        self.pwm.start(0)
+
+        # Estado conocido del hardware (None = desconocido, se escribirá)
+        self._nivel_a = None
+        self._nivel_b = None
+        self._duty = 0
+
+        self.escrituras = 0
+        self.escrituras_evitadas = 0
+
+    def _escribir_pin(self, pin, nivel, actual):
+        """Escribe un pin solo si cambia de nivel; devuelve el nivel final"""
+        if nivel == actual:
+            self.escrituras_evitadas += 1
+        else:
+            GPIO.output(pin, nivel)
+            self.escrituras += 1
+        return nivel
+
+    def _cuantizar(self, duty):
+        """Limita el duty a 0-100 y lo redondea al paso de cuantización"""
+        duty = max(0, min(100, duty))
+        if self.cuantizacion:
+            duty = min(100, round(duty / self.cuantizacion) * self.cuantizacion)
+        return duty
+
+    def _aplicar(self, nivel_a, nivel_b, duty):
+        self._nivel_a = self._escribir_pin(self.pin_a, nivel_a, self._nivel_a)
+        self._nivel_b = self._escribir_pin(self.pin_b, nivel_b, self._nivel_b)
+        if duty == self._duty:
+            self.escrituras_evitadas += 1
+        else:
+            self.pwm.ChangeDutyCycle(duty)
+            self._duty = duty
+            self.escrituras += 1
+
+    def mover(self, velocidad):
+        """
+        Aplica una velocidad con signo
+
+        Args:
+            velocidad (float): -100 a 100 (negativo = hacia atrás)
+        """
+        if velocidad >= 0:
+            self._aplicar(GPIO.HIGH, GPIO.LOW, self._cuantizar(velocidad))
+        else:
+            self._aplicar(GPIO.LOW, GPIO.HIGH, self._cuantizar(-velocidad))
+
+    def detener(self):
+        """Pone ambos pines de dirección a LOW y el duty a 0"""
+        self._aplicar(GPIO.LOW, GPIO.LOW, 0)
+
+    @property
+    def duty(self):
+        """Duty aplicado con signo (-100 a 100; negativo = hacia atrás)"""
+        if not self._duty or self._nivel_a == self._nivel_b:
+            return 0
+        return self._duty if self._nivel_a == GPIO.HIGH else -self._duty
+
+    def invalidar(self):
+        """Olvida el estado cacheado: la próxima orden escribe todo"""
+        self._nivel_a = None
+        self._nivel_b = None
+        self._duty = None
+
+    def parar_pwm(self):
+        """Detiene la señal PWM (al apagar el robot)"""
+        self.pwm.stop()
+        self.invalidar()
+
+
+class TraccionDiferencial:
+    """Par de motores izquierdo/derecho"""
+
+    def __init__(self, motor_izq, motor_der, token_actual=None):
+        """
+        Args:
+            motor_izq, motor_der (Motor): Motores de cada lado
+            token_actual (callable): Devuelve el token de cancelación del modo
+                que llama (None fuera de un modo) (opcional)
+        """
+        self.motor_izq = motor_izq
+        self.motor_der = motor_der
+        self._token_actual = token_actual
+
+        # Las órdenes llegan del lazo del modo, del hilo de actuación y de
+        # los callbacks de la guardia de borde
+        self._lock = threading.Lock()
+        self.anulada = False
+        self._pendiente = None        # Última orden recibida durante la anulación (None = parar)
+        self.ordenes_ignoradas = 0
+        self.ordenes_obsoletas = 0    # Órdenes de modos ya cancelados
+
+    def _obsoleta(self):
+        """True si la orden viene de un modo cancelado (con el lock tomado)"""
+        if self._token_actual is None:
+            return False
+        token = self._token_actual()
+        if token is not None and token.cancelado:
+            self.ordenes_obsoletas += 1
+            return True
+        return False
+
+    def mover(self, vel_izq, vel_der):
+        """
+        Control diferencial
+
+        Args:
+            vel_izq, vel_der (float): Velocidad de cada motor (-100 a 100)
+        """
+        with self._lock:
+            if self._obsoleta():
+                return
+            if self.anulada:
+                self._pendiente = (vel_izq, vel_der)
+                self.ordenes_ignoradas += 1
+                return
+            self.motor_izq.mover(vel_izq)
+            self.motor_der.mover(vel_der)
+
+    def detener(self):
+        """Detiene ambos motores"""
+        with self._lock:
+            if self._obsoleta():
+                return
+            if self.anulada:
+                self._pendiente = None
+                self.ordenes_ignoradas += 1
+                return
+            self.motor_izq.detener()
+            self.motor_der.detener()
+
+    def anular(self, vel_izq, vel_der):
+        """
+        Toma los motores por encima de los modos (maniobra de seguridad)
+
+        Args:
+            vel_izq, vel_der (float): Velocidades de la maniobra
+        """
+        with self._lock:
+            if not self.anulada:
+                self.anulada = True
+                self._pendiente = None  # La orden previa llevaba hacia el borde
+            self.motor_izq.mover(vel_izq)
+            self.motor_der.mover(vel_der)
+
+    def liberar(self):
+        """
+        Devuelve los motores a los modos: aplica la última orden recibida
+        durante la anulación o, si no llegó ninguna, los para
+        """
+        with self._lock:
+            if not self.anulada:
+                return
+            self.anulada = False
+            if self._pendiente is None:
+                self.motor_izq.detener()
+                self.motor_der.detener()
+            else:
+                self.motor_izq.mover(self._pendiente[0])
+                self.motor_der.mover(self._pendiente[1])
+
+    def parar_pwm(self):
+        """Detiene la señal PWM de ambos motores"""
+        self.motor_izq.parar_pwm()
+        self.motor_der.parar_pwm()
+
+    def duties(self):
+        """Duty aplicado con signo de cada motor (izquierdo, derecho)"""
+        return self.motor_izq.duty, self.motor_der.duty
+
+    def estadisticas(self):
+        """
+        Escrituras al hardware realizadas y evitadas por la caché
+
+        Returns:
+            dict: Contadores totales, porcentaje de escrituras evitadas,
+                órdenes ignoradas durante una anulación y de modos cancelados
+        """
+        escrituras = self.motor_izq.escrituras + self.motor_der.escrituras
+        evitadas = self.motor_izq.escrituras_evitadas + self.motor_der.escrituras_evitadas
+        total = escrituras + evitadas
+        return {
+            'escrituras': escrituras,
+            'escrituras_evitadas': evitadas,
+            'porcentaje_evitadas': 100.0 * evitadas / total if total else 0.0,
+            'ordenes_ignoradas': self.ordenes_ignoradas,
+            'ordenes_obsoletas': self.ordenes_obsoletas
+        }
@@ -5,7 +5,7 @@ Para manipulación de objetos - Automatización Industrial
 Robot ASTI Challenge
 """
 
-import RPi.GPIO as GPIO
+from hal_gpio import GPIO
 import time
 
 
@@ -52,83 +52,113 @@ class ControlPinza:
         # Servo típico: 2% = 0°, 12% = 180°
         return 2 + (angulo / 180) * 10
     
-    def mover_a_angulo(self, angulo, velocidad=0.5):
+    @staticmethod
+    def _pausa(segundos, cancelacion=None):
+        """
+        Pausa interrumpible por el token del modo (supervisor_modos)
+        
+        Returns:
+            bool: True si se canceló
+        """
+        if cancelacion is None:
+            time.sleep(segundos)
+            return False
+        return cancelacion.esperar(segundos)
+    
+    def mover_a_angulo(self, angulo, velocidad=0.5, cancelacion=None):
         """
         Mueve el servo a un ángulo específico
         
         Args:
             angulo (int): Ángulo objetivo (0-180)
             velocidad (float): Velocidad de movimiento (segundos de pausa)
+            cancelacion (TokenCancelacion): Acorta la pausa si se cancela
         """
         # Limitar ángulo
         angulo = max(0, min(180, angulo))
         
         duty_cycle = self._angulo_a_duty_cycle(angulo)
         self.pwm.ChangeDutyCycle(duty_cycle)
-        time.sleep(velocidad)
+        self._pausa(velocidad, cancelacion)
         
         # Detener señal PWM para evitar jitter
         self.pwm.ChangeDutyCycle(0)
         
         self.angulo_actual = angulo
     
-    def abrir(self, velocidad=0.5):
+    def abrir(self, velocidad=0.5, cancelacion=None):
         """
         Abre la pinza completamente
         
         Args:
             velocidad (float): Velocidad de apertura
+            cancelacion (TokenCancelacion): Token del modo (opcional)
         """
         print("[Pinza] Abriendo...")
-        self.mover_a_angulo(self.angulo_abierto, velocidad)
+        self.mover_a_angulo(self.angulo_abierto, velocidad, cancelacion)
     
-    def cerrar(self, velocidad=0.5):
+    def cerrar(self, velocidad=0.5, cancelacion=None):
         """
         Cierra la pinza completamente
         
         Args:
             velocidad (float): Velocidad de cierre
+            cancelacion (TokenCancelacion): Token del modo (opcional)
         """
         print("[Pinza] Cerrando...")
-        self.mover_a_angulo(self.angulo_cerrado, velocidad)
+        self.mover_a_angulo(self.angulo_cerrado, velocidad, cancelacion)
     
-    def agarrar_objeto(self, pausa_antes=0.5, pausa_despues=0.5):
+    def agarrar_objeto(self, pausa_antes=0.5, pausa_despues=0.5, cancelacion=None):
         """
         Secuencia completa para agarrar un objeto
         
         Args:
             pausa_antes (float): Pausa antes de cerrar
             pausa_despues (float): Pausa después de cerrar
+            cancelacion (TokenCancelacion): Interrumpe la secuencia si se cancela
+            
+        Returns:
+            bool: True si la secuencia se completó
         """
         print("[Pinza] Iniciando secuencia de agarre...")
         
         # 1. Asegurar que está abierta
-        self.abrir()
-        time.sleep(pausa_antes)
+        self.abrir(cancelacion=cancelacion)
+        if self._pausa(pausa_antes, cancelacion):
+            return False
         
         # 2. Cerrar para agarrar
-        self.cerrar()
-        time.sleep(pausa_despues)
+        self.cerrar(cancelacion=cancelacion)
+        if self._pausa(pausa_despues, cancelacion):
+            return False
         
         print("[Pinza] ✓ Objeto agarrado")
+        return True
     
-    def soltar_objeto(self, pausa_antes=0.5, pausa_despues=0.5):
+    def soltar_objeto(self, pausa_antes=0.5, pausa_despues=0.5, cancelacion=None):
         """
         Secuencia completa para soltar un objeto
         
         Args:
             pausa_antes (float): Pausa antes de abrir
             pausa_despues (float): Pausa después de abrir
+            cancelacion (TokenCancelacion): Interrumpe la secuencia si se cancela
+            
+        Returns:
+            bool: True si la secuencia se completó
         """
         print("[Pinza] Iniciando secuencia de liberación...")
         
-        time.sleep(pausa_antes)
+        if self._pausa(pausa_antes, cancelacion):
+            return False
         
         # Abrir para soltar
-        self.abrir()
-        time.sleep(pausa_despues)
+        self.abrir(cancelacion=cancelacion)
+        if self._pausa(pausa_despues, cancelacion):
+            return False
         
         print("[Pinza] ✓ Objeto liberado")
+        return True
     
     def ajustar_apertura(self, porcentaje):
         """
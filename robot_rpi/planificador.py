@@ -0,0 +1,192 @@
+#!/usr/bin/env python3
+"""
+Planificador de Lazos de Control a Frecuencia Fija
+Robot ASTI Challenge
+
+Los lazos de los modos autónomos no duermen un tiempo fijo después de
+trabajar (el periodo real derivaría con el tiempo de GPIO, telemetría y
+ultrasonidos): esperan hasta un instante límite absoluto sobre
+time.monotonic(), que avanza exactamente un periodo por ciclo.
+
+Si un ciclo se pasa de su límite (retraso) hay dos políticas:
+    - saltar:    se descartan los ciclos perdidos y se sigue en la rejilla
+                 original de instantes (la fase se conserva).
+    - recuperar: los ciclos siguientes se ejecutan sin esperar hasta
+                 alcanzar la rejilla, con un máximo de ciclos de recuperación.
+
+Opcionalmente alimenta las métricas de tiempo del lazo (metricas.py): marca
+el inicio de cada ciclo al despertar y el fin antes de esperar.
+
+Con `despertar` (ej: SensoresLinea.esperar_cambio) la espera puede acabar
+antes del límite por un evento: ese ciclo extra se ejecuta en el acto y el
+siguiente vuelve al instante de la rejilla, que no se desplaza. Como mucho
+hay un despertar anticipado por periodo.
+
+Con `cancelacion` (TokenCancelacion de supervisor_modos) las esperas acaban
+en cuanto se cancela el modo, sin esperar al final del periodo.
+
+Uso:
+    planificador = PlanificadorPeriodico(frecuencia=20)
+    while robot_activo:
+        hacer_trabajo()
+        planificador.esperar()
+"""
+
+import time
+
+
+# Políticas ante un ciclo retrasado
+POLITICA_SALTAR = 'saltar'
+POLITICA_RECUPERAR = 'recuperar'
+POLITICAS_RETRASO = (POLITICA_SALTAR, POLITICA_RECUPERAR)
+
+
+class PlanificadorPeriodico:
+    """Marca el ritmo de un lazo con instantes límite absolutos"""
+
+    def __init__(self, periodo=None, frecuencia=None, politica=POLITICA_SALTAR,
+                 max_recuperar=5, reloj=time.monotonic, dormir=time.sleep,
+                 metricas=None, despertar=None, cancelacion=None):
+        """
+        Inicializa el planificador
+
+        Args:
+            periodo (float): Periodo del lazo en segundos
+            frecuencia (float): Alternativa al periodo, en Hz
+            politica (str): 'saltar' o 'recuperar' ante un retraso
+            max_recuperar (int): Ciclos de retraso máximos que se recuperan;
+                con más, se resincroniza la rejilla (política 'recuperar')
+            reloj (callable): Reloj monotónico en segundos
+            dormir (callable): Función de espera en segundos
+            metricas (MetricasLazo): Métricas de tiempo del lazo (opcional)
+            despertar (callable): despertar(timeout) -> bool; espera como
+                dormir pero devuelve True si un evento la interrumpe
+            cancelacion (TokenCancelacion): Token del modo; si se indica, las
+                esperas (con el dormir por defecto) terminan al cancelarlo
+        """
+        if (periodo is None) == (frecuencia is None):
+            raise ValueError("Indica periodo o frecuencia (solo uno)")
+        if politica not in POLITICAS_RETRASO:
+            raise ValueError(f"Política de retraso no válida: {politica}")
+
+        self.periodo = periodo if periodo is not None else 1.0 / frecuencia
+        if self.periodo <= 0:
+            raise ValueError("El periodo debe ser positivo")
+        self.politica = politica
+        self.max_recuperar = max_recuperar
+        self._reloj = reloj
+        if cancelacion is not None and dormir is time.sleep:
+            dormir = cancelacion.esperar
+        self._dormir = dormir
+        self._cancelacion = cancelacion
+        self.metricas = metricas
+        self._despertar = despertar
+        self.reiniciar()
+
+    def reiniciar(self):
+        """Empieza una rejilla nueva a partir de ahora y pone a cero los contadores"""
+        self.ciclos = 0
+        self.retrasos = 0
+        self.ciclos_saltados = 0
+        self.retraso_max = 0.0
+        self.despertares = 0
+        self._despertado = False
+        self._inicio = self._reloj()
+        self._limite = self._inicio + self.periodo
+        self._empezar_ciclo(interrumpido=True)
+
+    def resincronizar(self):
+        """
+        Empieza una rejilla nueva a partir de ahora conservando los contadores
+
+        Para después de una maniobra bloqueante deliberada, que no debe
+        contar como retraso.
+        """
+        self._limite = self._reloj() + self.periodo
+        self._empezar_ciclo(interrumpido=True)
+
+    def _empezar_ciclo(self, interrumpido=False):
+        """Marca en las métricas el comienzo de un ciclo"""
+        if self.metricas is not None:
+            if interrumpido:
+                self.metricas.interrumpir()
+            self.metricas.inicio_ciclo()
+
+    def esperar(self):
+        """
+        Espera hasta el límite del ciclo actual
+
+        Returns:
+            bool: True si el ciclo terminó a tiempo, False si hubo retraso
+        """
+        self.ciclos += 1
+        if self.metricas is not None:
+            self.metricas.fin_ciclo()
+        if self._cancelacion is not None and self._cancelacion.cancelado:
+            return True  # El lazo termina: no se espera
+        ahora = self._reloj()
+
+        if ahora < self._limite:
+            if self._despertar is not None and not self._despertado:
+                if self._despertar(self._limite - ahora):
+                    # Ciclo extra por un evento: el límite actual se mantiene
+                    self.despertares += 1
+                    self._despertado = True
+                    self._empezar_ciclo(interrumpido=True)
+                    return True
+            else:
+                self._dormir(self._limite - ahora)
+            interrumpido = self._despertado
+            self._despertado = False
+            self._limite += self.periodo
+            self._empezar_ciclo(interrumpido)
+            return True
+
+        # Retraso: el trabajo del ciclo superó el límite
+        self._despertado = False
+        retraso = ahora - self._limite
+        self.retrasos += 1
+        self.retraso_max = max(self.retraso_max, retraso)
+        perdidos = int(retraso // self.periodo)
+
+        if self.politica == POLITICA_RECUPERAR and perdidos < self.max_recuperar:
+            # Sin esperar: los siguientes ciclos alcanzan la rejilla
+            self._limite += self.periodo
+            self._empezar_ciclo()
+            return False
+
+        # Saltar los ciclos perdidos manteniendo la fase de la rejilla
+        self.ciclos_saltados += perdidos
+        self._limite += (perdidos + 1) * self.periodo
+        self._dormir(max(0.0, self._limite - ahora))
+        self._limite += self.periodo
+        self._empezar_ciclo()
+        return False
+
+    def frecuencia_real(self):
+        """
+        Ciclos por segundo medidos desde el último reinicio
+
+        Returns:
+            float: Frecuencia real del lazo en Hz
+        """
+        transcurrido = self._reloj() - self._inicio
+        return self.ciclos / transcurrido if transcurrido > 0 else 0.0
+
+    def estadisticas(self):
+        """
+        Estado del planificador
+
+        Returns:
+            dict: Periodo, ciclos, retrasos, ciclos saltados, despertares
+                anticipados y frecuencia real
+        """
+        return {
+            'periodo': self.periodo,
+            'ciclos': self.ciclos,
+            'retrasos': self.retrasos,
+            'ciclos_saltados': self.ciclos_saltados,
+            'despertares': self.despertares,
+            'retraso_max': self.retraso_max,
+            'frecuencia_real': self.frecuencia_real()
+        }
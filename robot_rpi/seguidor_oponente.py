@@ -0,0 +1,360 @@
+#!/usr/bin/env python3
+"""
+Seguimiento del Oponente con Filtro de Kalman
+Robot ASTI Challenge
+
+Fusiona las medidas sucesivas del ultrasonidos en una estimación de la
+distancia al oponente y de su velocidad de acercamiento, con un filtro de
+Kalman de velocidad constante (estado [distancia, acercamiento]; la
+aceleración relativa no modelada entra como ruido de proceso):
+
+    - Cada medida con eco se valida contra la predicción: las que quedan a
+      más de umbral_validacion desviaciones se rechazan como atípicas (y
+      tras max_rechazos seguidas se reinicia la pista sobre el nuevo valor).
+    - Sin eco, la pista se mantiene por predicción durante t_perdida: una
+      pérdida breve no corta el ataque y la primera medida que vuelve a
+      encajar la recupera sin reconfirmar.
+    - Una pista nueva necesita `confirmacion` medidas antes de ser válida
+      (un eco espurio aislado no provoca un ataque).
+
+Con la distancia y el acercamiento, tiempo_contacto() da los segundos hasta
+el choque, que la estrategia de sumo usa para dosificar la potencia.
+
+Uso:
+    seguidor = SeguidorOponente()
+    estimacion = seguidor.actualizar(ultrasonico.leer())   # En cada tick
+    if estimacion.valida:
+        ... estimacion.distancia, estimacion.velocidad, estimacion.ttc
+
+Banco de pruebas (aproximación simulada, Kalman frente a la mediana):
+    python seguidor_oponente.py
+    python seguidor_oponente.py --ruido 2 --perdida 0.25 --atipicas 0.05
+"""
+
+import argparse
+import math
+import random
+import sys
+import time
+from collections import namedtuple
+
+from ultrasonico import (FiltroDistancia, Medicion, ESTADO_OK, ESTADO_SIN_ECO,
+                         ESTADO_SIN_DATOS)
+
+
+ESTADO_PREDICCION = 'prediccion'   # Pista mantenida sin eco reciente
+ESTADO_TENTATIVO = 'tentativo'     # Pista nueva aún sin confirmar
+
+
+def tiempo_contacto(distancia, velocidad):
+    """
+    Segundos hasta el contacto
+
+    Args:
+        distancia (float): Distancia en cm
+        velocidad (float): Velocidad de acercamiento en cm/s
+
+    Returns:
+        float: Tiempo hasta el contacto (inf si no se acerca o no se conoce)
+    """
+    if distancia is None or not velocidad or velocidad <= 0:
+        return math.inf
+    return distancia / velocidad
+
+
+class EstimacionOponente(namedtuple('EstimacionOponente',
+                                    'distancia velocidad estado desviacion t_ns')):
+    """
+    Estado estimado del oponente en un instante
+
+    Attributes:
+        distancia (float): cm al oponente (None sin pista)
+        velocidad (float): Acercamiento en cm/s (positivo si se acercan)
+        estado (str): ok, prediccion, tentativo, sin_eco o sin_datos
+        desviacion (float): Desviación típica de la distancia (cm)
+        t_ns (int): Instante de la estimación
+    """
+
+    __slots__ = ()
+
+    @property
+    def valida(self):
+        return self.estado in (ESTADO_OK, ESTADO_PREDICCION)
+
+    @property
+    def ttc(self):
+        """Tiempo hasta el contacto (s)"""
+        return tiempo_contacto(self.distancia, self.velocidad)
+
+
+class SeguidorOponente:
+    """Filtro de Kalman de velocidad constante sobre el ultrasonidos"""
+
+    def __init__(self, ruido_medida=2.0, ruido_aceleracion=100.0, umbral_validacion=3.0,
+                 max_rechazos=3, t_perdida=0.3, confirmacion=2, velocidad_inicial=100.0):
+        """
+        Args:
+            ruido_medida (float): Desviación típica del HC-SR04 (cm)
+            ruido_aceleracion (float): Aceleración relativa no modelada (cm/s²)
+            umbral_validacion (float): Desviaciones de la innovación a partir
+                de las que una medida es atípica
+            max_rechazos (int): Atípicas seguidas que reinician la pista
+            t_perdida (float): Segundos sin medidas aceptadas antes de dar el
+                oponente por perdido
+            confirmacion (int): Medidas aceptadas para validar una pista nueva
+            velocidad_inicial (float): Incertidumbre inicial del acercamiento (cm/s)
+        """
+        self.varianza_medida = ruido_medida ** 2
+        self.q = ruido_aceleracion ** 2
+        self.umbral2 = umbral_validacion ** 2
+        self.max_rechazos = max_rechazos
+        self._t_perdida_ns = int(t_perdida * 1e9)
+        self.confirmacion = confirmacion
+        self.varianza_velocidad = velocidad_inicial ** 2
+
+        self.actualizaciones = 0
+        self.rechazadas = 0
+        self.reinicios = 0
+        self.perdidas = 0           # Pistas abandonadas por falta de eco
+        self.recuperaciones = 0     # Pistas recuperadas tras medidas sin eco
+        self.reiniciar()
+
+    def reiniciar(self):
+        """Olvida la pista y las medidas (al empezar el modo)"""
+        self._t_medida_ns = None        # Última medida procesada del sensor
+        self._olvidar_pista()
+
+    def _olvidar_pista(self):
+        self.activo = False
+        self._d = self._v = 0.0
+        self._p00 = self._p01 = self._p11 = 0.0
+        self._t_ns = None               # Instante del estado
+        self._t_aceptada_ns = None      # Última medida aceptada
+        self._aceptadas = 0
+        self._rechazos = 0
+        self._sin_eco = 0               # Medidas sin eco desde la última aceptada
+
+    def actualizar(self, medicion, ahora_ns=None):
+        """
+        Incorpora la última medida del sensor (si es nueva) y estima
+
+        Args:
+            medicion (Medicion): Salida de SensorUltrasonico.leer()
+            ahora_ns (int): Instante de la estimación (por defecto, ahora)
+
+        Returns:
+            EstimacionOponente: Estado predicho al instante ahora_ns
+        """
+        if (medicion.t_ns is not None and medicion.t_ns != self._t_medida_ns and
+                medicion.estado in (ESTADO_OK, ESTADO_SIN_ECO)):
+            self._t_medida_ns = medicion.t_ns
+            if medicion.valida:
+                self._corregir(medicion.t_ns, medicion.distancia)
+            elif self.activo:
+                self._sin_eco += 1
+        return self.estimar(time.monotonic_ns() if ahora_ns is None else ahora_ns)
+
+    def _iniciar(self, t_ns, distancia):
+        self.activo = True
+        self._d, self._v = distancia, 0.0
+        self._p00, self._p01, self._p11 = self.varianza_medida, 0.0, self.varianza_velocidad
+        self._t_ns = self._t_aceptada_ns = t_ns
+        self._aceptadas = 1
+        self._rechazos = 0
+        self._sin_eco = 0
+
+    def _predecir(self, t_ns):
+        """Lleva el estado a t_ns (d' = -v, v' = ruido)"""
+        dt = (t_ns - self._t_ns) / 1e9
+        if dt <= 0:
+            return
+        p00, p01, p11 = self._p00, self._p01, self._p11
+        self._d -= self._v * dt
+        self._p00 = p00 - 2 * dt * p01 + dt * dt * p11 + self.q * dt ** 3 / 3
+        self._p01 = p01 - dt * p11 - self.q * dt * dt / 2
+        self._p11 = p11 + self.q * dt
+        self._t_ns = t_ns
+
+    def _corregir(self, t_ns, distancia):
+        if not self.activo:
+            self._iniciar(t_ns, distancia)
+            return
+        self._predecir(t_ns)
+
+        innovacion = distancia - self._d
+        s = self._p00 + self.varianza_medida
+        if innovacion * innovacion > self.umbral2 * s:
+            self.rechazadas += 1
+            self._rechazos += 1
+            if self._rechazos >= self.max_rechazos:
+                # Varias seguidas lejos de la predicción: otro objetivo
+                self.reinicios += 1
+                self._iniciar(t_ns, distancia)
+            return
+
+        k0, k1 = self._p00 / s, self._p01 / s
+        self._d += k0 * innovacion
+        self._v += k1 * innovacion
+        p00, p01, p11 = self._p00, self._p01, self._p11
+        self._p00 = (1 - k0) * p00
+        self._p01 = (1 - k0) * p01
+        self._p11 = p11 - k1 * p01
+
+        if self._sin_eco and self._aceptadas >= self.confirmacion:
+            self.recuperaciones += 1
+        self.actualizaciones += 1
+        self._aceptadas += 1
+        self._rechazos = 0
+        self._sin_eco = 0
+        self._t_aceptada_ns = t_ns
+
+    def estimar(self, ahora_ns):
+        """
+        Estado predicho a un instante (abandona la pista si lleva más de
+        t_perdida sin medidas aceptadas)
+
+        Returns:
+            EstimacionOponente: Distancia, acercamiento y estado de la pista
+        """
+        if not self.activo:
+            return EstimacionOponente(None, None, ESTADO_SIN_DATOS if self._t_medida_ns is None
+                                      else ESTADO_SIN_ECO, None, ahora_ns)
+        if ahora_ns - self._t_aceptada_ns > self._t_perdida_ns:
+            if self._aceptadas >= self.confirmacion:
+                self.perdidas += 1
+            self._olvidar_pista()
+            return EstimacionOponente(None, None, ESTADO_SIN_ECO, None, ahora_ns)
+
+        dt = max(0.0, (ahora_ns - self._t_ns) / 1e9)
+        distancia = max(0.0, self._d - self._v * dt)
+        varianza = (self._p00 - 2 * dt * self._p01 + dt * dt * self._p11 +
+                    self.q * dt ** 3 / 3)
+        if self._aceptadas < self.confirmacion:
+            estado = ESTADO_TENTATIVO
+        elif self._sin_eco:
+            estado = ESTADO_PREDICCION
+        else:
+            estado = ESTADO_OK
+        return EstimacionOponente(distancia, self._v, estado, math.sqrt(max(0.0, varianza)),
+                                  ahora_ns)
+
+    def estadisticas(self):
+        """
+        Returns:
+            dict: Contadores de la pista (medidas aceptadas, atípicas,
+                reinicios, pérdidas y recuperaciones)
+        """
+        return {
+            'activo': self.activo,
+            'actualizaciones': self.actualizaciones,
+            'rechazadas': self.rechazadas,
+            'reinicios': self.reinicios,
+            'perdidas': self.perdidas,
+            'recuperaciones': self.recuperaciones
+        }
+
+
+# ===== BANCO DE PRUEBAS EN SIMULACIÓN =====
+def simular_aproximacion(seguidor=None, duracion=3.0, frecuencia=16, distancia_inicial=150.0,
+                         velocidad=60.0, aceleracion=0.0, ruido=1.0, prob_perdida=0.05,
+                         prob_atipica=0.03, perdida=(1.0, 1.2), semilla=0):
+    """
+    Aproximación simulada al oponente: Kalman frente al filtro de mediana
+
+    Ambos reciben las mismas medidas (ruido gaussiano, ecos perdidos al azar,
+    ecos espurios y un hueco sin eco) y se evalúan en cada medida frente a
+    la trayectoria real.
+
+    Args:
+        seguidor (SeguidorOponente): Seguidor a evaluar (por defecto, uno nuevo)
+        duracion (float): Segundos simulados
+        frecuencia (float): Disparos del ultrasonidos por segundo
+        distancia_inicial (float): cm al empezar
+        velocidad (float): Acercamiento inicial (cm/s)
+        aceleracion (float): Aumento del acercamiento (cm/s²)
+        ruido (float): Desviación típica de las medidas (cm)
+        prob_perdida (float): Probabilidad de un disparo sin eco
+        prob_atipica (float): Probabilidad de un eco espurio
+        perdida (tuple): Intervalo (s) sin ningún eco, o None
+        semilla (int): Semilla del generador aleatorio
+
+    Returns:
+        dict: Por filtro ('kalman', 'mediana'): RMSE de distancia y velocidad
+            sobre las estimaciones válidas y cobertura (% de instantes válidos)
+    """
+    seguidor = seguidor or SeguidorOponente()
+    mediana = FiltroDistancia()
+    aleatorio = random.Random(semilla)
+    errores = {'kalman': ([], []), 'mediana': ([], [])}
+    instantes = 0
+
+    for i in range(int(duracion * frecuencia)):
+        t = i / frecuencia
+        t_ns = int(t * 1e9)
+        real = distancia_inicial - velocidad * t - aceleracion * t * t / 2
+        if real <= 0:
+            break
+        acercamiento = velocidad + aceleracion * t
+
+        sin_eco = (aleatorio.random() < prob_perdida or
+                   (perdida is not None and perdida[0] <= t < perdida[1]))
+        if sin_eco:
+            medida = None
+        elif aleatorio.random() < prob_atipica:
+            medida = aleatorio.uniform(5, 300)
+        else:
+            medida = real + aleatorio.gauss(0, ruido)
+
+        medicion = Medicion(medida, ESTADO_OK if medida is not None else ESTADO_SIN_ECO, t_ns)
+        instantes += 1
+        for nombre, estimacion in (('kalman', seguidor.actualizar(medicion, t_ns)),
+                                   ('mediana', mediana.agregar(t_ns, medida))):
+            if not estimacion.valida:
+                continue
+            errores[nombre][0].append(estimacion.distancia - real)
+            if estimacion.velocidad is not None:
+                errores[nombre][1].append(estimacion.velocidad - acercamiento)
+
+    def rmse(valores):
+        return math.sqrt(sum(e * e for e in valores) / len(valores)) if valores else None
+
+    return {nombre: {'rmse_distancia': rmse(distancia), 'rmse_velocidad': rmse(acerc),
+                     'cobertura': 100.0 * len(distancia) / instantes if instantes else 0.0}
+            for nombre, (distancia, acerc) in errores.items()}
+
+
+def main(argv=None):
+    """Compara el seguimiento de Kalman con la mediana en una aproximación simulada"""
+    parser = argparse.ArgumentParser(description="Banco de pruebas del seguimiento del oponente")
+    parser.add_argument('--ruido', type=float, default=1.0, help="Desviación de las medidas (cm)")
+    parser.add_argument('--velocidad', type=float, default=60.0, help="Acercamiento (cm/s)")
+    parser.add_argument('--aceleracion', type=float, default=0.0, help="cm/s²")
+    parser.add_argument('--perdidas', type=float, default=0.05, help="Probabilidad sin eco")
+    parser.add_argument('--atipicas', type=float, default=0.03, help="Probabilidad de eco espurio")
+    parser.add_argument('--perdida', type=float, default=0.2,
+                        help="Segundos seguidos sin eco a mitad de la aproximación")
+    parser.add_argument('--repeticiones', type=int, default=20)
+    args = parser.parse_args(argv)
+
+    totales = {}
+    for semilla in range(args.repeticiones):
+        resultado = simular_aproximacion(velocidad=args.velocidad, aceleracion=args.aceleracion,
+                                         ruido=args.ruido, prob_perdida=args.perdidas,
+                                         prob_atipica=args.atipicas,
+                                         perdida=(1.0, 1.0 + args.perdida) if args.perdida else None,
+                                         semilla=semilla)
+        for nombre, metricas in resultado.items():
+            for clave, valor in metricas.items():
+                if valor is not None:
+                    totales.setdefault(nombre, {}).setdefault(clave, []).append(valor)
+
+    print(f"{'filtro':<8} {'RMSE dist (cm)':>15} {'RMSE vel (cm/s)':>16} {'cobertura':>10}")
+    for nombre, metricas in totales.items():
+        medias = {clave: sum(valores) / len(valores) for clave, valores in metricas.items()}
+        print(f"{nombre:<8} {medias.get('rmse_distancia', math.nan):15.2f} "
+              f"{medias.get('rmse_velocidad', math.nan):16.2f} {medias['cobertura']:9.1f}%")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -5,7 +5,7 @@ Para clasificación de objetos - Automatización Industrial
 Robot ASTI Challenge
 """
 
-import RPi.GPIO as GPIO
+from hal_gpio import GPIO
 import time
 
 
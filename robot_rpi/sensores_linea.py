@@ -0,0 +1,133 @@
+#!/usr/bin/env python3
+"""
+Sensores IR de Línea por Flancos
+Robot ASTI Challenge
+
+Los tres sensores IR (izquierdo, central, derecho) se escuchan con
+callbacks de flanco (hal_gpio) que actualizan una palabra de estado
+compartida (bit 0 = izq, bit 1 = cen, bit 2 = der) y la marca de tiempo de
+cada transición. El lazo lee la palabra sin tocar el GPIO y, pasándole
+esperar_cambio al planificador, se despierta en cuanto cambia la línea en
+vez de esperar al siguiente tick (hasta 50-100 ms antes).
+
+Uso:
+    sensores = SensoresLinea(5, 6, 13)
+    planificador = PlanificadorPeriodico(frecuencia=20, despertar=sensores.esperar_cambio)
+    while activo:
+        izq, cen, der = sensores.leer()
+        ...
+        planificador.esperar()
+"""
+
+import threading
+
+from hal_gpio import GPIO
+
+
+class SensoresLinea:
+    """Estado de los sensores IR actualizado por interrupciones"""
+
+    NOMBRES = ('izq', 'cen', 'der')
+
+    def __init__(self, pin_izq, pin_cen, pin_der):
+        """
+        Inicializa los sensores
+
+        Args:
+            pin_izq, pin_cen, pin_der (int): Pines de los sensores IR
+        """
+        self.pines = (pin_izq, pin_cen, pin_der)
+        self._bits = {pin: 1 << i for i, pin in enumerate(self.pines)}
+
+        self._cambio = threading.Condition()
+        self.palabra = 0
+        self.version = 0            # Se incrementa con cada transición
+        self._version_leida = 0
+        self._interrumpido = False  # Despertar pedido por interrumpir()
+        self.t_flancos_ns = [None, None, None]  # Última transición de cada sensor
+        self.flancos = 0
+
+        for pin in self.pines:
+            GPIO.setup(pin, GPIO.IN)
+        self._manejadores = [GPIO.agregar_callback_flanco(pin, GPIO.BOTH, self._al_flanco)
+                             for pin in self.pines]
+        self.sincronizar()
+
+    def _al_flanco(self, pin, nivel, t_ns):
+        """Callback de flanco: actualiza la palabra y despierta al lazo"""
+        bit = self._bits[pin]
+        with self._cambio:
+            palabra = (self.palabra | bit) if nivel else (self.palabra & ~bit)
+            if palabra == self.palabra:
+                return
+            self.palabra = palabra
+            self.version += 1
+            self.flancos += 1
+            self.t_flancos_ns[bit.bit_length() - 1] = t_ns
+            self._cambio.notify_all()
+
+    def sincronizar(self):
+        """Relee los tres pines (al arrancar o si se sospecha un flanco perdido)"""
+        banco = GPIO.leer_banco(self.pines)  # Los tres en el mismo instante
+        palabra = 0
+        for pin in self.pines:
+            if (banco >> pin) & 1:
+                palabra |= self._bits[pin]
+        with self._cambio:
+            if palabra != self.palabra:
+                self.palabra = palabra
+                self.version += 1
+                self._cambio.notify_all()
+
+    def leer(self):
+        """
+        Estado actual de los sensores (sin acceder al GPIO)
+
+        Returns:
+            tuple: (izq, cen, der) con 0 = línea negra, 1 = superficie blanca
+        """
+        # Versión antes que palabra (los flancos escriben palabra y luego
+        # versión): si cambian entremedias, la versión leída es la antigua y
+        # esperar_cambio despierta en lugar de perder la transición
+        self._version_leida = self.version
+        palabra = self.palabra
+        return palabra & 1, (palabra >> 1) & 1, (palabra >> 2) & 1
+
+    def ultimo_flanco_ns(self):
+        """Marca de tiempo (reloj de GPIO.tiempo_ns) de la transición más reciente"""
+        tiempos = [t for t in self.t_flancos_ns if t is not None]
+        return max(tiempos) if tiempos else None
+
+    def esperar_cambio(self, timeout):
+        """
+        Espera una transición posterior a la última lectura
+
+        Args:
+            timeout (float): Segundos máximos de espera
+
+        Returns:
+            bool: True si hubo transición (incluso antes de llamar) o una
+                interrupción, False si se agotó el tiempo
+        """
+        with self._cambio:
+            despierto = self._cambio.wait_for(
+                lambda: self.version != self._version_leida or self._interrumpido, timeout)
+            self._interrumpido = False
+            return despierto
+
+    def interrumpir(self):
+        """
+        Despierta la espera en curso (o la siguiente) de esperar_cambio
+
+        Para registrarla con TokenCancelacion.al_cancelar: el lazo de línea
+        sale de su espera en cuanto se cancela el modo.
+        """
+        with self._cambio:
+            self._interrumpido = True
+            self._cambio.notify_all()
+
+    def detener(self):
+        """Deja de escuchar los flancos"""
+        for manejador in self._manejadores:
+            manejador.cancelar()
+        self._manejadores = []
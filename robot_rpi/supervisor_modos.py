@@ -0,0 +1,223 @@
+#!/usr/bin/env python3
+"""
+Supervisor de Modos con Cancelación Cooperativa
+Robot ASTI Challenge
+
+Un único hilo de trabajo por modo autónomo. Cambiar de modo (o volver a
+manual) cancela el token del modo en curso, espera a que su hilo termine
+como mucho `limite_cambio` segundos, para los motores y solo entonces
+arranca el siguiente: nunca hay dos lazos peleando por los motores.
+
+Los modos reciben el token y lo comprueban en cada espera:
+
+    def mi_modo(token):
+        planificador = PlanificadorPeriodico(frecuencia=20, cancelacion=token)
+        while not token.cancelado:
+            ...
+            planificador.esperar()      # Vuelve en cuanto se cancela
+        ...
+        if token.esperar(2.0):          # En lugar de time.sleep(2.0)
+            return
+
+Un modo que no termina dentro del límite (rezagado) puede seguir en marcha
+un rato: token_actual() devuelve el token del modo que ejecuta el hilo
+llamante para que los actuadores (TraccionDiferencial) descarten sus órdenes
+una vez cancelado.
+
+La latencia de cada cambio (desde la petición hasta el nuevo modo en
+marcha con los motores parados) se mide en un histograma; los cambios que
+superan el límite se cuentan y se notifican (al_cambiar) para la telemetría.
+"""
+
+import threading
+import time
+
+from metricas import HistogramaLatencia
+
+
+_hilo_modo = threading.local()
+
+
+def token_actual():
+    """Token del modo que ejecuta el hilo llamante (None fuera de un modo)"""
+    return getattr(_hilo_modo, 'token', None)
+
+
+class TokenCancelacion:
+    """Señal de cancelación de un modo (se activa una sola vez)"""
+
+    def __init__(self):
+        self._evento = threading.Event()
+        self._lock = threading.Lock()
+        self._callbacks = []
+
+    @property
+    def cancelado(self):
+        return self._evento.is_set()
+
+    def cancelar(self):
+        """Activa la cancelación y despierta las esperas registradas"""
+        with self._lock:
+            if self._evento.is_set():
+                return
+            self._evento.set()
+            callbacks, self._callbacks = self._callbacks, []
+        for callback in callbacks:
+            callback()
+
+    def esperar(self, segundos):
+        """
+        Espera interrumpible (sustituye a time.sleep en los modos)
+
+        Args:
+            segundos (float): Tiempo máximo de espera
+
+        Returns:
+            bool: True si se canceló (antes o durante la espera)
+        """
+        return self._evento.wait(max(0.0, segundos))
+
+    def al_cancelar(self, callback):
+        """
+        Registra una función que despierta otras esperas (p. ej. las de
+        SensoresLinea.esperar_cambio); si ya está cancelado se llama en el acto
+        """
+        with self._lock:
+            if not self._evento.is_set():
+                self._callbacks.append(callback)
+                return
+        callback()
+
+
+class SupervisorModos:
+    """Dueño del hilo del modo activo"""
+
+    def __init__(self, limite_cambio=0.02, al_parar=None, al_cambiar=None,
+                 al_iniciar=None, reloj_ns=time.monotonic_ns):
+        """
+        Args:
+            limite_cambio (float): Segundos máximos de un cambio de modo
+            al_parar (callable): Se llama al terminar el modo saliente (parar
+                motores), antes de arrancar el siguiente
+            al_cambiar (callable): al_cambiar(dict) con los datos de cada
+                cambio (de, a, latencia_ms, excedido, rezagado)
+            al_iniciar (callable): Se llama desde el hilo de cada modo antes
+                de su cuerpo (p. ej. para fijar su prioridad)
+            reloj_ns (callable): Reloj para medir la latencia
+        """
+        self.limite_cambio = limite_cambio
+        self._al_parar = al_parar
+        self._al_cambiar = al_cambiar
+        self._al_iniciar = al_iniciar
+        self._reloj_ns = reloj_ns
+        self._lock = threading.Lock()
+
+        self.modo = None
+        self._token = None
+        self._hilo = None
+
+        self.cambios = 0
+        self.excedidos = 0      # Cambios por encima de limite_cambio
+        self.rezagados = 0      # Modos que no terminaron dentro del límite
+        self.errores = 0
+        self.latencia = HistogramaLatencia()
+
+    @property
+    def activo(self):
+        """True si el hilo del modo sigue en marcha"""
+        return self._hilo is not None and self._hilo.is_alive()
+
+    def activar(self, nombre, funcion, *args):
+        """
+        Sustituye el modo en curso por otro
+
+        Args:
+            nombre (str): Nombre del modo
+            funcion (callable): funcion(token, *args), el cuerpo del modo
+            *args: Argumentos adicionales
+
+        Returns:
+            float: Latencia del cambio en segundos
+        """
+        with self._lock:
+            inicio = self._reloj_ns()
+            anterior, rezagado = self._parar(inicio)
+            token = TokenCancelacion()
+            hilo = threading.Thread(target=self._ejecutar, args=(nombre, funcion, token) + args,
+                                    name=f'modo_{nombre}', daemon=True)
+            self.modo, self._token, self._hilo = nombre, token, hilo
+            hilo.start()
+            return self._registrar_cambio(anterior, nombre, inicio, rezagado)
+
+    def detener(self):
+        """
+        Cancela el modo en curso (vuelta a manual)
+
+        Returns:
+            float: Latencia del cambio en segundos (0 si no había modo)
+        """
+        with self._lock:
+            if self._hilo is None:
+                if self._al_parar is not None:
+                    self._al_parar()
+                return 0.0
+            inicio = self._reloj_ns()
+            anterior, rezagado = self._parar(inicio)
+            self.modo, self._token, self._hilo = None, None, None
+            return self._registrar_cambio(anterior, None, inicio, rezagado)
+
+    def _parar(self, inicio):
+        """Cancela el modo actual y espera su fin dentro del límite"""
+        anterior = self.modo
+        rezagado = False
+        if self._hilo is not None:
+            self._token.cancelar()
+            restante = self.limite_cambio - (self._reloj_ns() - inicio) / 1e9
+            self._hilo.join(max(0.0, restante))
+            rezagado = self._hilo.is_alive()
+            if rezagado:
+                # Terminará por su cuenta; sus órdenes a los motores se
+                # descartan por el token cancelado (token_actual)
+                self.rezagados += 1
+        if self._al_parar is not None:
+            self._al_parar()
+        return anterior, rezagado
+
+    def _registrar_cambio(self, anterior, nuevo, inicio, rezagado):
+        latencia_ns = self._reloj_ns() - inicio
+        excedido = latencia_ns > self.limite_cambio * 1e9
+        self.cambios += 1
+        self.latencia.registrar_ns(latencia_ns)
+        if excedido:
+            self.excedidos += 1
+        if self._al_cambiar is not None:
+            self._al_cambiar({'de': anterior, 'a': nuevo,
+                              'latencia_ms': round(latencia_ns / 1e6, 3),
+                              'excedido': excedido, 'rezagado': rezagado})
+        return latencia_ns / 1e9
+
+    def _ejecutar(self, nombre, funcion, token, *args):
+        _hilo_modo.token = token
+        try:
+            if self._al_iniciar is not None:
+                self._al_iniciar()
+            funcion(token, *args)
+        except Exception as e:
+            self.errores += 1
+            print(f"[Supervisor] Error en el modo {nombre}: {e}")
+
+    def estadisticas(self):
+        """
+        Returns:
+            dict: Modo activo, límite, contadores y latencia de los cambios
+        """
+        return {
+            'modo': self.modo,
+            'activo': self.activo,
+            'limite_ms': self.limite_cambio * 1000,
+            'cambios': self.cambios,
+            'excedidos': self.excedidos,
+            'rezagados': self.rezagados,
+            'errores': self.errores,
+            'latencia': self.latencia.a_dict()
+        }
@@ -2,129 +2,1631 @@
 """
 Sistema de Telemetría para Robot ASTI Challenge
 Registra eventos, genera estadísticas y crea evidencias para documentación
+
+Los eventos se guardan en formato JSON Lines (un evento por línea) añadiendo
+solo los eventos nuevos en cada guardado, sin reescribir el archivo completo.
+Opcionalmente se puede usar el formato binario compacto (telemetria_binaria).
+
+Una sesión puede repartirse en segmentos rotados por tamaño o tiempo; los
+segmentos cerrados se comprimen con gzip en segundo plano y se aplica una
+política de retención sobre el directorio de logs.
+
+Los tipos de alta frecuencia pueden diezmarse con políticas de muestreo
+(solo cambios, 1 de cada N, tasa máxima o reservorio) que llevan la cuenta
+de los eventos suprimidos.
 """
 
 import json
 import datetime
+import gzip
 import os
+import sys
 import csv
+import queue
+import random
+import shutil
+import struct
+import textwrap
+import threading
+import time
+from array import array
+from bisect import bisect_left, bisect_right
 from pathlib import Path
 
+import telemetria_binaria
+
+
+# Formatos de log en disco
+FORMATO_JSONL = 'jsonl'
+FORMATO_BINARIO = 'binario'
+FORMATOS = (FORMATO_JSONL, FORMATO_BINARIO)
+
+
+# Políticas cuando la cola del escritor en segundo plano está llena
+POLITICA_DESCARTAR_ANTIGUO = 'descartar_antiguo'
+POLITICA_DESCARTAR_NUEVO = 'descartar_nuevo'
+POLITICA_BLOQUEAR = 'bloquear'
+POLITICAS_DESBORDE = (POLITICA_DESCARTAR_ANTIGUO, POLITICA_DESCARTAR_NUEVO, POLITICA_BLOQUEAR)
+
+# Marca de fin para los hilos escritor y de mantenimiento
+_FIN_ESCRITOR = object()
+
+# Extensiones de archivo sujetas a la política de retención
+EXTENSIONES_LOG = ('.jsonl', '.bin', '.gz', '.idx', '.json', '.csv')
+
+
+# ===== SEGMENTOS =====
+def ruta_segmento(primer_segmento, numero):
+    """
+    Ruta (sin comprimir) del segmento N de una sesión
+    
+    El segmento 0 es el archivo original; los siguientes añaden el número:
+    `<sesion>.jsonl`, `<sesion>.001.jsonl`, `<sesion>.002.jsonl`...
+    """
+    primer = Path(primer_segmento)
+    if numero == 0:
+        return primer
+    return primer.with_name(f"{primer.stem}.{numero:03d}{primer.suffix}")
+
+
+def localizar_segmento(ruta):
+    """
+    Ruta existente de un segmento: la original o su versión comprimida
+    
+    Returns:
+        Path: Ruta encontrada, o None si no existe
+    """
+    ruta = Path(ruta)
+    if ruta.exists():
+        return ruta
+    comprimido = Path(f"{ruta}.gz")
+    if comprimido.exists():
+        return comprimido
+    return None
+
+
+def abrir_segmento(ruta):
+    """Abre en binario un segmento, esté o no comprimido ya"""
+    try:
+        return open(ruta, 'rb')
+    except FileNotFoundError:
+        # El hilo de compresión puede haberlo sustituido por su .gz
+        return gzip.open(f"{ruta}.gz", 'rb')
+
+
+def segmentos_de_sesion(primer_segmento):
+    """
+    Segmentos existentes de una sesión, en orden
+    
+    Args:
+        primer_segmento (str|Path): Ruta del primer segmento (sin .gz)
+        
+    Returns:
+        list: Rutas sin comprimir de cada segmento
+    """
+    segmentos = []
+    while localizar_segmento(ruta_segmento(primer_segmento, len(segmentos))) is not None:
+        segmentos.append(ruta_segmento(primer_segmento, len(segmentos)))
+    return segmentos
+
+
+def comprimir_segmento(ruta):
+    """
+    Comprime un segmento cerrado con gzip y borra el original
+    
+    El .gz se escribe primero con nombre temporal, así los lectores siempre
+    encuentran una de las dos versiones completa.
+    
+    Returns:
+        Path: Ruta del archivo comprimido
+    """
+    ruta = Path(ruta)
+    destino = Path(f"{ruta}.gz")
+    temporal = Path(f"{ruta}.gz.tmp")
+    with open(ruta, 'rb') as origen, gzip.open(temporal, 'wb') as f:
+        shutil.copyfileobj(origen, f, 64 * 1024)
+    os.replace(temporal, destino)
+    os.remove(ruta)
+    return destino
+
+
+def aplicar_retencion(directorio, max_bytes=None, max_dias=None, excluir=()):
+    """
+    Borra los logs más antiguos que superen la retención configurada
+    
+    Args:
+        directorio (str|Path): Directorio de logs
+        max_bytes (int): Tamaño total máximo de los logs (None = sin límite)
+        max_dias (float): Antigüedad máxima en días (None = sin límite)
+        excluir (iterable): Rutas que no se deben borrar (sesión en curso)
+        
+    Returns:
+        list: Archivos borrados
+    """
+    excluidos = {Path(r).resolve() for r in excluir}
+    archivos = []
+    for ruta in Path(directorio).iterdir():
+        if not ruta.is_file() or not ruta.name.endswith(EXTENSIONES_LOG):
+            continue
+        if ruta.resolve() in excluidos:
+            continue
+        try:
+            info = ruta.stat()
+        except FileNotFoundError:
+            continue
+        archivos.append((info.st_mtime, info.st_size, ruta))
+    archivos.sort()
+    
+    total = sum(tam for _, tam, _ in archivos)
+    if max_bytes is not None:
+        total += sum(Path(r).stat().st_size for r in excluidos if Path(r).exists())
+    limite_antiguedad = None if max_dias is None else time.time() - max_dias * 86400
+    
+    borrados = []
+    for mtime, tam, ruta in archivos:
+        caducado = limite_antiguedad is not None and mtime < limite_antiguedad
+        excede = max_bytes is not None and total > max_bytes
+        if not (caducado or excede):
+            continue
+        try:
+            ruta.unlink()
+        except OSError:
+            continue
+        total -= tam
+        borrados.append(ruta)
+    return borrados
+
+
+def _como_lista(archivo):
+    """Normaliza una ruta o lista de segmentos a lista de Path"""
+    if isinstance(archivo, (list, tuple)):
+        return [Path(a) for a in archivo]
+    return [Path(archivo)]
+
+
+def leer_eventos(archivo):
+    """
+    Lee eventos de un archivo de telemetría
+    
+    Acepta el formato JSON Lines actual, el binario compacto y el formato
+    antiguo (array JSON completo), comprimidos o no. Con una lista de
+    segmentos los recorre en orden.
+    
+    Args:
+        archivo (str|Path|list): Archivo de telemetría o lista de segmentos
+        
+    Yields:
+        dict: Cada evento registrado
+    """
+    if isinstance(archivo, (list, tuple)):
+        for segmento in archivo:
+            yield from leer_eventos(segmento)
+        return
+    
+    archivo = localizar_segmento(archivo) or Path(archivo)
+    if telemetria_binaria.es_archivo_binario(archivo):
+        yield from telemetria_binaria.leer_eventos(archivo)
+        return
+    
+    with telemetria_binaria.abrir_archivo(archivo, 'rt') as f:
+        inicio = f.read(1)
+        while inicio and inicio.isspace():
+            inicio = f.read(1)
+        f.seek(0)
+        
+        if inicio == '[':
+            # Formato antiguo: array JSON completo
+            for evento in json.load(f):
+                yield evento
+            return
+        
+        for linea in f:
+            linea = linea.strip()
+            if linea:
+                yield json.loads(linea)
+
+
+def convertir_a_json(archivo_jsonl, archivo_json=None):
+    """
+    Convierte un log JSON Lines al formato antiguo (array JSON con indentación)
+    
+    Args:
+        archivo_jsonl (str|Path|list): Log de origen o lista de segmentos
+        archivo_json (str|Path): Archivo de destino (opcional, mismo nombre .json)
+        
+    Returns:
+        Path: Ruta del archivo generado
+    """
+    if archivo_json is None:
+        archivo_json = _como_lista(archivo_jsonl)[0].with_suffix('.json')
+    
+    with open(archivo_json, 'w', encoding='utf-8') as f:
+        f.write('[')
+        primero = True
+        for evento in leer_eventos(archivo_jsonl):
+            f.write('\n' if primero else ',\n')
+            texto = json.dumps(evento, indent=2, ensure_ascii=False)
+            f.write(textwrap.indent(texto, '  '))
+            primero = False
+        f.write('\n]' if not primero else ']')
+    
+    return Path(archivo_json)
+
+
+# Columnas fijas de cada fila CSV (antes de los campos de datos)
+COLUMNAS_BASE = ('timestamp', 'tiempo_transcurrido', 'tipo')
+
+
+def descubrir_columnas(archivo):
+    """
+    Campos de datos de cada tipo de evento de un log
+    
+    Usa el índice del log si existe (sin leer los eventos); si no, hace una
+    pasada que solo guarda los nombres de los campos.
+    
+    Args:
+        archivo (str|Path|list): Log de telemetría o lista de segmentos
+        
+    Returns:
+        dict: tipo -> lista de campos en orden de aparición
+    """
+    indice = ruta_indice(_como_lista(archivo)[0])
+    if indice.exists():
+        return IndiceTelemetria.cargar(indice).columnas()
+    
+    columnas = {}
+    for evento in leer_eventos(archivo):
+        campos = columnas.setdefault(evento['tipo'], {})
+        for clave in evento.get('datos', {}):
+            campos[clave] = None
+    return {tipo: list(campos) for tipo, campos in columnas.items()}
+
+
+def convertir_a_csv(archivo, archivo_csv=None, por_tipo=False, columnas=None):
+    """
+    Exporta un log de telemetría (cualquier formato) a CSV en una sola pasada
+    
+    Los eventos se leen del log en streaming (memoria constante) y cada fila
+    se coloca con posiciones de columna precalculadas por tipo.
+    
+    Args:
+        archivo (str|Path|list): Log de origen o lista de segmentos
+        archivo_csv (str|Path): Archivo de destino (opcional, mismo nombre .csv).
+            Con por_tipo, base del nombre: <base>_<TIPO>.csv
+        por_tipo (bool): Un CSV por tipo de evento, solo con sus columnas
+        columnas (dict): tipo -> campos de datos (opcional, se descubren del log)
+        
+    Returns:
+        Path | list: Archivo(s) generado(s), o None si el log está vacío
+    """
+    if archivo_csv is None:
+        archivo_csv = _como_lista(archivo)[0].with_suffix('.csv')
+    archivo_csv = Path(archivo_csv)
+    if columnas is None:
+        columnas = descubrir_columnas(archivo)
+    if not columnas:
+        return None
+    
+    if por_tipo:
+        return _exportar_csv_por_tipo(archivo, archivo_csv, columnas)
+    
+    # Mismas columnas que el exportador original: ordenadas alfabéticamente
+    nombres = set(COLUMNAS_BASE) | {'datos'}
+    for campos in columnas.values():
+        nombres.update(f"datos_{c}" for c in campos)
+    nombres = sorted(nombres)
+    posicion = {nombre: i for i, nombre in enumerate(nombres)}
+    pos_base = [posicion[c] for c in COLUMNAS_BASE]
+    pos_datos = {tipo: {c: posicion[f"datos_{c}"] for c in campos}
+                 for tipo, campos in columnas.items()}
+    
+    with open(archivo_csv, 'w', newline='', encoding='utf-8') as f:
+        writer = csv.writer(f)
+        writer.writerow(nombres)
+        for evento in leer_eventos(archivo):
+            fila = [None] * len(nombres)
+            for pos, clave in zip(pos_base, COLUMNAS_BASE):
+                fila[pos] = evento[clave]
+            posiciones = pos_datos[evento['tipo']]
+            for clave, valor in evento['datos'].items():
+                fila[posiciones[clave]] = valor
+            writer.writerow(fila)
+    
+    return archivo_csv
+
+
+def _exportar_csv_por_tipo(archivo, archivo_csv, columnas):
+    """Escribe un CSV por tipo de evento en una sola pasada por el log"""
+    base = archivo_csv.with_suffix('')
+    destinos = {}
+    archivos = []
+    try:
+        for tipo, campos in columnas.items():
+            ruta = Path(f"{base}_{tipo}.csv")
+            f = open(ruta, 'w', newline='', encoding='utf-8')
+            archivos.append(f)
+            writer = csv.writer(f)
+            writer.writerow(['timestamp', 'tiempo_transcurrido'] + [f"datos_{c}" for c in campos])
+            destinos[tipo] = (writer, {c: 2 + i for i, c in enumerate(campos)}, len(campos) + 2, ruta)
+        
+        for evento in leer_eventos(archivo):
+            writer, posiciones, ancho, _ = destinos[evento['tipo']]
+            fila = [None] * ancho
+            fila[0] = evento['timestamp']
+            fila[1] = evento['tiempo_transcurrido']
+            for clave, valor in evento['datos'].items():
+                fila[posiciones[clave]] = valor
+            writer.writerow(fila)
+    finally:
+        for f in archivos:
+            f.close()
+    
+    return [ruta for _, _, _, ruta in destinos.values()]
+
+
+def unir_segmentos(segmentos, destino):
+    """
+    Une los segmentos de una sesión en un único archivo sin comprimir
+    
+    Args:
+        segmentos (list): Rutas de los segmentos, en orden
+        destino (str|Path): Archivo de salida
+        
+    Returns:
+        Path: Ruta del archivo generado
+    """
+    with open(destino, 'wb') as salida:
+        for numero, segmento in enumerate(segmentos):
+            with abrir_segmento(segmento) as f:
+                binario = f.read(len(telemetria_binaria.MAGIA)) == telemetria_binaria.MAGIA
+                f.seek(0)
+                if binario and numero > 0:
+                    f.seek(telemetria_binaria.TAM_CABECERA)  # Una sola cabecera
+                shutil.copyfileobj(f, salida, 64 * 1024)
+    return Path(destino)
+
+
+def exportar_sesion(segmentos, destino=None):
+    """
+    Archivo único con una sesión completa en su formato original
+    
+    Con un solo segmento devuelve ese mismo archivo; con varios los une
+    (descomprimiendo los cerrados) en `<sesion>.completo.<ext>`.
+    
+    Args:
+        segmentos (str|Path|list): Primer segmento o lista de segmentos
+        destino (str): Archivo de salida (opcional)
+        
+    Returns:
+        Path: Ruta del archivo con la sesión completa
+    """
+    segmentos = _como_lista(segmentos)
+    if len(segmentos) == 1 and destino is None:
+        return segmentos[0]
+    if destino is None:
+        primer = segmentos[0]
+        destino = primer.with_name(f"{primer.stem}.completo{primer.suffix}")
+    return unir_segmentos(segmentos, destino)
+
+
+class BufferCircular:
+    """
+    Buffer circular de capacidad fija para el historial en memoria
+    
+    La lista interna se reserva una sola vez; al llenarse, cada elemento
+    nuevo sobrescribe al más antiguo, así la memoria no crece con la sesión.
+    
+    Registran eventos varios hilos a la vez (lazo del modo, actuación,
+    guardia de borde, comandos): cada operación se hace bajo un lock.
+    """
+    
+    def __init__(self, capacidad):
+        """
+        Args:
+            capacidad (int): Número máximo de elementos en memoria
+        """
+        if capacidad <= 0:
+            raise ValueError("La capacidad del buffer debe ser positiva")
+        
+        self.capacidad = capacidad
+        self._elementos = [None] * capacidad
+        self._inicio = 0  # Posición del elemento más antiguo
+        self._tamano = 0
+        self.total_agregados = 0
+        self._lock = threading.Lock()
+    
+    def append(self, elemento):
+        """Añade un elemento, descartando el más antiguo si está lleno"""
+        with self._lock:
+            if self._tamano < self.capacidad:
+                self._elementos[(self._inicio + self._tamano) % self.capacidad] = elemento
+                self._tamano += 1
+            else:
+                self._elementos[self._inicio] = elemento
+                self._inicio = (self._inicio + 1) % self.capacidad
+            self.total_agregados += 1
+    
+    def ultimos(self, n):
+        """
+        Obtiene los últimos N elementos (del más antiguo al más reciente)
+        
+        Args:
+            n (int): Número de elementos
+            
+        Returns:
+            list: Últimos N elementos
+        """
+        with self._lock:
+            n = max(0, min(n, self._tamano))
+            primero = self._inicio + self._tamano - n
+            return [self._elementos[(primero + i) % self.capacidad] for i in range(n)]
+    
+    def limpiar(self):
+        """Vacía el buffer sin liberar la memoria reservada"""
+        with self._lock:
+            for i in range(self.capacidad):
+                self._elementos[i] = None
+            self._inicio = 0
+            self._tamano = 0
+    
+    def __len__(self):
+        return self._tamano
+    
+    def __iter__(self):
+        # Copia bajo el lock: se puede recorrer mientras otros hilos añaden
+        return iter(self.ultimos(self.capacidad))
+
+
+class IndiceTelemetria:
+    """
+    Índice por tipo y por tiempo de los eventos guardados en disco
+    
+    Para cada evento guarda su offset en bytes dentro del log y su instante
+    (ns desde el inicio de la sesión). Los eventos se indexan en orden de
+    escritura, así que los tiempos quedan ordenados y las búsquedas por rango
+    son una bisección: O(log n + k).
+    
+    También lleva los campos de datos vistos por tipo, que sirven de esquema
+    de columnas al exportar sin recorrer el log.
+    
+    El índice se persiste en un archivo auxiliar (`<log>.idx`) que solo crece
+    por el final, igual que el log.
+    """
+    
+    MAGIA = b'ASTIIDX1'
+    _ENTRADA = struct.Struct('<cHHQq')  # b'E', código de tipo, segmento, offset, t_ns
+    _TIPO = struct.Struct('<cHH')      # b'T', código, longitud del nombre
+    _COLUMNA = struct.Struct('<cHH')   # b'K', código de tipo, longitud del campo
+    
+    def __init__(self, ruta=None):
+        """
+        Args:
+            ruta (str|Path): Archivo donde persistir el índice (opcional)
+        """
+        self.ruta = Path(ruta) if ruta else None
+        self.segmentos = array('H')
+        self.offsets = array('Q')
+        self.tiempos = array('q')
+        self._tipos = []       # código -> nombre
+        self._codigos = {}     # nombre -> código
+        self._por_tipo = {}    # nombre -> (posiciones, tiempos)
+        self._columnas = {}    # nombre -> campos de datos (dict como conjunto ordenado)
+        self._lock = threading.Lock()
+        self.origen = None    # .idx del que se lee (cargar/actualizar)
+        self._leido = 0        # Bytes del .idx ya incorporados
+        
+        if self.ruta is not None and not self.ruta.exists():
+            with open(self.ruta, 'wb') as f:
+                f.write(self.MAGIA)
+    
+    @classmethod
+    def cargar(cls, ruta):
+        """
+        Carga un índice persistido (sin volver a escribirlo)
+        
+        Args:
+            ruta (str|Path): Archivo .idx
+            
+        Returns:
+            IndiceTelemetria: Índice en memoria (actualizar() añade lo que
+                se escriba después en el archivo)
+        """
+        indice = cls()
+        indice.origen = Path(ruta)
+        indice.actualizar()
+        return indice
+    
+    def actualizar(self):
+        """
+        Incorpora las entradas añadidas al .idx desde la última lectura
+        
+        Solo se leen los bytes nuevos: un lector que mantiene el índice en
+        memoria (servidor web) sigue la sesión en curso sin volver a cargarla.
+        Una entrada a medio escribir se deja para la próxima llamada.
+        
+        Returns:
+            int: Eventos nuevos indexados
+        """
+        with open(self.origen, 'rb') as f:
+            f.seek(self._leido)
+            contenido = f.read()
+        
+        offset = 0
+        if self._leido == 0:
+            if contenido[:len(self.MAGIA)] != self.MAGIA:
+                raise ValueError(f"{self.origen} no es un índice de telemetría")
+            offset = len(self.MAGIA)
+        
+        nuevos = 0
+        with self._lock:
+            while offset < len(contenido):
+                marca = contenido[offset:offset + 1]
+                if marca in (b'T', b'K'):
+                    cabecera = self._TIPO if marca == b'T' else self._COLUMNA
+                    if offset + cabecera.size > len(contenido):
+                        break
+                    _, codigo, longitud = cabecera.unpack_from(contenido, offset)
+                    inicio = offset + cabecera.size
+                    if inicio + longitud > len(contenido):
+                        break  # Nombre truncado: aún se está escribiendo
+                    nombre = contenido[inicio:inicio + longitud].decode('utf-8')
+                    if marca == b'T':
+                        self._declarar_tipo(nombre)
+                    else:
+                        self._columnas[self._tipos[codigo]][nombre] = None
+                    offset = inicio + longitud
+                elif marca == b'E':
+                    if offset + self._ENTRADA.size > len(contenido):
+                        break  # Entrada truncada (escritura en curso o corte de energía)
+                    _, codigo, segmento, pos_archivo, t_ns = self._ENTRADA.unpack_from(contenido, offset)
+                    self._agregar_en_memoria(self._tipos[codigo], t_ns, segmento, pos_archivo)
+                    offset += self._ENTRADA.size
+                    nuevos += 1
+                else:
+                    raise ValueError(f"Entrada de índice no válida en el byte {self._leido + offset}")
+        self._leido += offset
+        return nuevos
+    
+    def _declarar_tipo(self, tipo):
+        codigo = len(self._tipos)
+        self._tipos.append(tipo)
+        self._codigos[tipo] = codigo
+        self._por_tipo[tipo] = (array('L'), array('q'))
+        self._columnas[tipo] = {}
+        return codigo
+    
+    def _agregar_en_memoria(self, tipo, t_ns, segmento, offset):
+        posiciones, tiempos = self._por_tipo[tipo]
+        posiciones.append(len(self.offsets))
+        tiempos.append(t_ns)
+        self.segmentos.append(segmento)
+        self.offsets.append(offset)
+        self.tiempos.append(t_ns)
+    
+    def agregar(self, entradas):
+        """
+        Indexa un lote de eventos recién escritos
+        
+        Args:
+            entradas (list): Tuplas (tipo, t_ns, segmento, offset, campos_de_datos)
+        """
+        registros = []
+        with self._lock:
+            for tipo, t_ns, segmento, offset, campos in entradas:
+                codigo = self._codigos.get(tipo)
+                if codigo is None:
+                    codigo = self._declarar_tipo(tipo)
+                    nombre = tipo.encode('utf-8')
+                    registros.append(self._TIPO.pack(b'T', codigo, len(nombre)) + nombre)
+                conocidos = self._columnas[tipo]
+                for campo in campos:
+                    if campo not in conocidos:
+                        conocidos[campo] = None
+                        nombre = campo.encode('utf-8')
+                        registros.append(self._COLUMNA.pack(b'K', codigo, len(nombre)) + nombre)
+                self._agregar_en_memoria(tipo, t_ns, segmento, offset)
+                registros.append(self._ENTRADA.pack(b'E', codigo, segmento, offset, t_ns))
+        
+        if self.ruta is not None and registros:
+            with open(self.ruta, 'ab') as f:
+                f.write(b''.join(registros))
+    
+    def buscar(self, tipo=None, desde_ns=None, hasta_ns=None, inicio=0, limite=None):
+        """
+        Busca eventos por tipo y/o rango de tiempo
+        
+        Args:
+            tipo (str): Tipo de evento (None = todos)
+            desde_ns, hasta_ns (int): Rango cerrado de tiempo (None = abierto)
+            inicio (int): Primer resultado a devolver (paginación)
+            limite (int): Máximo de resultados a devolver (None = todos)
+            
+        Returns:
+            tuple: (total_coincidencias, lista de posiciones de la página)
+        """
+        with self._lock:
+            if tipo is None:
+                posiciones, tiempos = None, self.tiempos
+            elif tipo in self._por_tipo:
+                posiciones, tiempos = self._por_tipo[tipo]
+            else:
+                return 0, []
+            
+            i0 = 0 if desde_ns is None else bisect_left(tiempos, desde_ns)
+            i1 = len(tiempos) if hasta_ns is None else bisect_right(tiempos, hasta_ns)
+            total = max(0, i1 - i0)
+            
+            a = i0 + max(0, inicio)
+            b = i1 if limite is None else min(i1, a + limite)
+            if a >= b:
+                return total, []
+            if posiciones is None:
+                return total, list(range(a, b))
+            return total, posiciones[a:b].tolist()
+    
+    def extension(self, posicion):
+        """
+        Segmento, offset y tamaño en el log del evento en una posición
+        
+        Returns:
+            tuple: (segmento, offset, tamaño) — tamaño None si es el último
+                evento de su segmento
+        """
+        with self._lock:
+            segmento = self.segmentos[posicion]
+            offset = self.offsets[posicion]
+            if posicion + 1 < len(self.offsets) and self.segmentos[posicion + 1] == segmento:
+                return segmento, offset, self.offsets[posicion + 1] - offset
+            return segmento, offset, None
+    
+    def tipos(self):
+        """Tipos de evento presentes en el índice"""
+        with self._lock:
+            return list(self._tipos)
+    
+    def columnas(self):
+        """
+        Campos de datos vistos por tipo
+        
+        Returns:
+            dict: tipo -> lista de campos en orden de aparición
+        """
+        with self._lock:
+            return {tipo: list(campos) for tipo, campos in self._columnas.items()}
+    
+    def __len__(self):
+        return len(self.offsets)
+
+
+def ruta_indice(archivo):
+    """Ruta del índice asociado a un log"""
+    return Path(f"{archivo}.idx")
+
+
+def leer_eventos_indexados(archivo, indice, posiciones):
+    """
+    Lee del log solo los eventos de las posiciones indicadas
+    
+    Args:
+        archivo (str|Path): Primer segmento del log (JSON Lines o binario)
+        indice (IndiceTelemetria): Índice del log
+        posiciones (list): Posiciones a leer (en orden creciente)
+        
+    Returns:
+        list: Eventos materializados
+    """
+    eventos = []
+    abiertos = {}  # segmento -> (archivo abierto, anclas binarias o None)
+    try:
+        for posicion in posiciones:
+            segmento, offset, tam = indice.extension(posicion)
+            if segmento not in abiertos:
+                f = abrir_segmento(ruta_segmento(archivo, segmento))
+                cabecera = f.read(telemetria_binaria.TAM_CABECERA)
+                anclas = None
+                if cabecera[:len(telemetria_binaria.MAGIA)] == telemetria_binaria.MAGIA:
+                    anclas = telemetria_binaria.CABECERA.unpack_from(cabecera, len(telemetria_binaria.MAGIA))
+                abiertos[segmento] = (f, anclas)
+            
+            f, anclas = abiertos[segmento]
+            f.seek(offset)
+            if anclas is None:
+                eventos.append(json.loads(f.readline().decode('utf-8')))
+                continue
+            registro = f.read(tam) if tam is not None else f.read()
+            tipo, t_ns, datos, _ = telemetria_binaria.decodificar_evento(registro)
+            eventos.append(telemetria_binaria.materializar(tipo, t_ns, datos, *anclas))
+    finally:
+        for f, _ in abiertos.values():
+            f.close()
+    return eventos
+
+
+def consultar_archivo(archivo, indice=None, tipo=None, desde=None, hasta=None,
+                      pagina=0, tam_pagina=100):
+    """
+    Consulta paginada de un log usando su índice (sin cargar la sesión)
+    
+    Args:
+        archivo (str|Path): Log de telemetría (primer segmento)
+        indice (IndiceTelemetria): Índice (opcional, se carga de `<log>.idx`)
+        tipo (str): Tipo de evento (None = todos)
+        desde, hasta (float): Rango en segundos desde el inicio de la sesión
+        pagina (int): Número de página (desde 0)
+        tam_pagina (int): Eventos por página
+        
+    Returns:
+        dict: Eventos de la página y datos de paginación
+    """
+    if indice is None:
+        indice = IndiceTelemetria.cargar(ruta_indice(archivo))
+    
+    desde_ns = None if desde is None else int(desde * 1e9)
+    hasta_ns = None if hasta is None else int(hasta * 1e9)
+    total, posiciones = indice.buscar(tipo, desde_ns, hasta_ns,
+                                      inicio=pagina * tam_pagina, limite=tam_pagina)
+    return {
+        'eventos': leer_eventos_indexados(archivo, indice, posiciones),
+        'total': total,
+        'pagina': pagina,
+        'tam_pagina': tam_pagina,
+        'paginas': (total + tam_pagina - 1) // tam_pagina
+    }
+
+
+class ContadorVentana:
+    """
+    Tasa de eventos en una ventana deslizante, en tiempo constante
+    
+    La ventana se divide en cubetas de ancho fijo que se reutilizan de forma
+    circular; registrar y consultar no dependen del número de eventos.
+    """
+    
+    def __init__(self, ventana=10.0, cubetas=10):
+        """
+        Args:
+            ventana (float): Duración de la ventana en segundos
+            cubetas (int): Número de cubetas en que se divide la ventana
+        """
+        self.ventana = ventana
+        self.cubetas = cubetas
+        self._ancho_ns = int(ventana * 1e9 / cubetas)
+        self._conteos = [0] * cubetas
+        self._ids = [-1] * cubetas  # Cubeta absoluta a la que pertenece cada hueco
+    
+    def registrar(self, t_ns):
+        """Cuenta un evento en el instante t_ns (reloj monotónico)"""
+        id_cubeta = t_ns // self._ancho_ns
+        hueco = id_cubeta % self.cubetas
+        if self._ids[hueco] != id_cubeta:
+            self._ids[hueco] = id_cubeta
+            self._conteos[hueco] = 0
+        self._conteos[hueco] += 1
+    
+    def tasa(self, t_ns):
+        """
+        Eventos por segundo en la ventana que termina en t_ns
+        
+        Returns:
+            float: Tasa estimada
+        """
+        minimo = t_ns // self._ancho_ns - self.cubetas + 1
+        total = sum(c for c, i in zip(self._conteos, self._ids) if i >= minimo)
+        return total / self.ventana
+
+
+class EstadisticaTipo:
+    """Contadores incrementales de un tipo de evento"""
+    
+    __slots__ = ('eventos', 'primer_ns', 'ultimo_ns', 'ventana')
+    
+    def __init__(self, t_ns, ventana):
+        self.eventos = 0
+        self.primer_ns = t_ns
+        self.ultimo_ns = t_ns
+        self.ventana = ventana
+
+
+# ===== POLÍTICAS DE MUESTREO =====
+class PoliticaMuestreo:
+    """
+    Decide qué eventos de un tipo se registran
+    
+    Las subclases implementan `_admitir`; la clase base lleva la cuenta de
+    eventos observados y suprimidos para que las estadísticas sean fieles.
+    """
+    
+    def __init__(self):
+        self.observados = 0
+        self.suprimidos = 0
+    
+    def admitir(self, datos, t_ns):
+        """
+        Indica si un evento debe registrarse
+        
+        Args:
+            datos (dict): Datos del evento
+            t_ns (int): Instante del evento (reloj monotónico)
+            
+        Returns:
+            bool: True si se registra, False si se suprime
+        """
+        self.observados += 1
+        if self._admitir(datos, t_ns):
+            return True
+        self.suprimidos += 1
+        return False
+    
+    def _admitir(self, datos, t_ns):
+        raise NotImplementedError
+    
+    def descripcion(self):
+        """Texto corto con la política y sus parámetros"""
+        return type(self).__name__
+
+
+class SoloCambios(PoliticaMuestreo):
+    """Registra un evento solo si sus datos difieren de los del anterior"""
+    
+    def __init__(self, refresco=None):
+        """
+        Args:
+            refresco (float): Segundos tras los que se registra aunque no haya
+                cambios, como señal de vida (None = nunca)
+        """
+        super().__init__()
+        self._anterior = None
+        self._ultimo_ns = None
+        self._refresco_ns = None if refresco is None else int(refresco * 1e9)
+    
+    def _admitir(self, datos, t_ns):
+        if datos == self._anterior:
+            if self._refresco_ns is None or t_ns - self._ultimo_ns < self._refresco_ns:
+                return False
+        self._anterior = dict(datos)
+        self._ultimo_ns = t_ns
+        return True
+    
+    def descripcion(self):
+        if self._refresco_ns is None:
+            return "solo_cambios"
+        return f"solo_cambios(refresco={self._refresco_ns / 1e9:g}s)"
+
+
+class CadaN(PoliticaMuestreo):
+    """Registra uno de cada N eventos (el primero siempre)"""
+    
+    def __init__(self, n):
+        """
+        Args:
+            n (int): Periodo de diezmado (1 = todos)
+        """
+        if n < 1:
+            raise ValueError("n debe ser al menos 1")
+        super().__init__()
+        self.n = n
+    
+    def _admitir(self, datos, t_ns):
+        return (self.observados - 1) % self.n == 0
+    
+    def descripcion(self):
+        return f"cada_{self.n}"
+
+
+class TasaMaxima(PoliticaMuestreo):
+    """Registra como mucho un número de eventos por segundo"""
+    
+    def __init__(self, eventos_por_segundo):
+        """
+        Args:
+            eventos_por_segundo (float): Tasa máxima de registro
+        """
+        if eventos_por_segundo <= 0:
+            raise ValueError("eventos_por_segundo debe ser positivo")
+        super().__init__()
+        self.eventos_por_segundo = eventos_por_segundo
+        self._intervalo_ns = int(1e9 / eventos_por_segundo)
+        self._siguiente_ns = None
+    
+    def _admitir(self, datos, t_ns):
+        if self._siguiente_ns is not None and t_ns < self._siguiente_ns:
+            return False
+        self._siguiente_ns = t_ns + self._intervalo_ns
+        return True
+    
+    def descripcion(self):
+        return f"max_{self.eventos_por_segundo:g}_por_s"
+
+
+class PorCambioDe(PoliticaMuestreo):
+    """
+    Registra siempre los eventos en que cambia un campo; el resto pasan por
+    otra política (p. ej. los ticks repetidos de un mismo estado)
+    """
+    
+    def __init__(self, campo, politica):
+        """
+        Args:
+            campo (str): Campo cuyos cambios se registran siempre
+            politica (PoliticaMuestreo): Política para los eventos sin cambio
+        """
+        super().__init__()
+        self.campo = campo
+        self.politica = politica
+        self._anterior = self  # Centinela: el primer evento es un cambio
+    
+    def _admitir(self, datos, t_ns):
+        # La política interna ve todos los eventos (p. ej. una tasa cuenta
+        # también los cambios), pero no puede suprimir un cambio
+        admitido = self.politica.admitir(datos, t_ns)
+        valor = datos.get(self.campo)
+        if valor != self._anterior:
+            self._anterior = valor
+            return True
+        return admitido
+    
+    def descripcion(self):
+        return f"cambios_de_{self.campo}+{self.politica.descripcion()}"
+
+
+class Reservorio(PoliticaMuestreo):
+    """
+    Muestra aleatoria uniforme de k eventos por ventana de tiempo
+    
+    El reservorio clásico retiene los eventos hasta el final de la ventana,
+    lo que rompería el orden temporal del log y del índice. Aquí se eligen al
+    empezar cada ventana k posiciones al azar entre los eventos esperados
+    (los de la ventana anterior) y se registran al llegar, sin retrasos.
+    """
+    
+    def __init__(self, k, ventana=1.0, semilla=None):
+        """
+        Args:
+            k (int): Eventos a registrar por ventana
+            ventana (float): Duración de la ventana en segundos
+            semilla (int): Semilla del generador aleatorio (opcional)
+        """
+        if k < 1:
+            raise ValueError("k debe ser al menos 1")
+        super().__init__()
+        self.k = k
+        self.ventana = ventana
+        self._ancho_ns = int(ventana * 1e9)
+        self._azar = random.Random(semilla)
+        self._id_ventana = None
+        self._en_ventana = 0
+        self._esperados = k
+        self._elegidos = frozenset()
+    
+    def _admitir(self, datos, t_ns):
+        id_ventana = t_ns // self._ancho_ns
+        if id_ventana != self._id_ventana:
+            if self._id_ventana is not None:
+                # Ventanas vacías intermedias: sin referencia, se espera k
+                continuo = id_ventana == self._id_ventana + 1
+                self._esperados = max(self._en_ventana, self.k) if continuo else self.k
+            self._id_ventana = id_ventana
+            self._en_ventana = 0
+            self._elegidos = frozenset(self._azar.sample(range(self._esperados), self.k))
+        
+        posicion = self._en_ventana
+        self._en_ventana += 1
+        return posicion in self._elegidos
+    
+    def descripcion(self):
+        return f"reservorio_{self.k}_por_{self.ventana:g}s"
+
 
 class SistemaTelemetria:
     """Sistema completo de telemetría y logging"""
     
-    def __init__(self, archivo_log="telemetria.json", directorio_logs="logs"):
+    def __init__(self, archivo_log="telemetria.json", directorio_logs="logs",
+                 asincrono=False, tam_cola=1000, politica_desborde=POLITICA_DESCARTAR_ANTIGUO,
+                 tam_lote=50, capacidad_memoria=2000, formato=FORMATO_JSONL,
+                 ventana_tasa=10.0, tam_max_segmento=None, duracion_max_segmento=None,
+                 comprimir_segmentos=True, retencion_bytes=None, retencion_dias=None,
+                 muestreo=None):
+        """
+        Inicializa el sistema de telemetría
+        
+        Args:
+            archivo_log (str): Nombre base del archivo de log
+            directorio_logs (str): Directorio donde se guardan los logs
+            asincrono (bool): Si True, registrar_evento solo encola y un hilo
+                escritor dedicado guarda en disco por lotes
+            tam_cola (int): Capacidad máxima de la cola del escritor
+            politica_desborde (str): Qué hacer con la cola llena:
+                'descartar_antiguo', 'descartar_nuevo' o 'bloquear'
+            tam_lote (int): Máximo de eventos escritos por lote
+            capacidad_memoria (int): Eventos recientes que se mantienen en
+                memoria; los anteriores solo quedan en el log en disco
+            formato (str): 'jsonl' (legible) o 'binario' (registros struct
+                compactos, también en memoria)
+            ventana_tasa (float): Segundos de la ventana para estimar eventos/s
+            tam_max_segmento (int): Bytes a partir de los que se rota el
+                segmento de log (None = sin rotación por tamaño)
+            duracion_max_segmento (float): Segundos a partir de los que se rota
+                el segmento (None = sin rotación por tiempo)
+            comprimir_segmentos (bool): Comprimir con gzip los segmentos cerrados
+            retencion_bytes (int): Tamaño total máximo del directorio de logs
+            retencion_dias (float): Antigüedad máxima de los logs en días
+            muestreo (dict): Política de muestreo por tipo de evento
+                (tipo -> PoliticaMuestreo); los demás tipos se registran todos
+        """
+        if politica_desborde not in POLITICAS_DESBORDE:
+            raise ValueError(f"Política de desborde no válida: {politica_desborde}")
+        if formato not in FORMATOS:
+            raise ValueError(f"Formato de log no válido: {formato}")
+        
         self.directorio = Path(directorio_logs)
         self.directorio.mkdir(exist_ok=True)
         
         # Crear nombre de archivo con timestamp
+        self.formato = formato
+        self.binario = formato == FORMATO_BINARIO
         timestamp = datetime.datetime.now().strftime("%Y%m%d_%H%M%S")
-        self.archivo = self.directorio / f"{timestamp}_{archivo_log}"
+        base = Path(archivo_log).stem
+        self.archivo = self._reservar_archivo(f"{timestamp}_{base}",
+                                              '.bin' if self.binario else '.jsonl')
+        
+        # Ancla de tiempo para los registros binarios (timestamp monotónico)
+        self._ancla_pared_ns = time.time_ns()
+        self._ancla_mono_ns = time.monotonic_ns()
+        self._iniciar_segmento()
+        self.segmentos = [self.archivo]
+        
+        # Rotación, compresión y retención (hilo de mantenimiento de baja prioridad)
+        self.tam_max_segmento = tam_max_segmento
+        self.duracion_max_segmento = duracion_max_segmento
+        self.comprimir_segmentos = comprimir_segmentos
+        self.retencion_bytes = retencion_bytes
+        self.retencion_dias = retencion_dias
+        self._cola_mantenimiento = None
+        self._hilo_mantenimiento = None
+        if retencion_bytes is not None or retencion_dias is not None:
+            self._programar_mantenimiento(None)
         
-        self.datos = []
-        self.inicio_sesion = datetime.datetime.now()
+        self.datos = BufferCircular(capacidad_memoria)
+        self._pendientes = []  # (tipo, t_ns, evento) aún no escritos en disco
+        self.indice = IndiceTelemetria(ruta_indice(self.segmentos[0]))
+        self.inicio_sesion = datetime.datetime.fromtimestamp(self._ancla_pared_ns / 1e9)
+        self._inicio_mono_ns = self._ancla_mono_ns  # Origen de los tiempos en memoria
         self.eventos_desde_guardado = 0
         
+        # Estadísticas incrementales (consulta en tiempo constante)
+        self.ventana_tasa = ventana_tasa
+        self._lock_estadisticas = threading.Lock()  # Registran eventos varios hilos
+        self._reiniciar_estadisticas()
+        
+        # Diezmado por tipo de evento
+        self.muestreo = dict(muestreo or {})
+        
+        # Escritor en segundo plano (modo asíncrono)
+        self.asincrono = asincrono
+        self.politica_desborde = politica_desborde
+        self.tam_lote = tam_lote
+        self.eventos_descartados = 0
+        self._lock_descartes = threading.Lock()
+        self._cola = None
+        self._hilo_escritor = None
+        
+        if asincrono:
+            self._cola = queue.Queue(maxsize=tam_cola)
+            self._hilo_escritor = threading.Thread(
+                target=self._bucle_escritor,
+                name='telemetria-escritor',
+                daemon=True
+            )
+            self._hilo_escritor.start()
+        
         print(f"[Telemetría] Iniciada - Archivo: {self.archivo}")
     
+    def _reservar_archivo(self, nombre, extension):
+        """
+        Crea un archivo de log nuevo sin pisar otra sesión del mismo segundo
+        
+        Args:
+            nombre (str): Nombre base (timestamp + nombre de log)
+            extension (str): Extensión del archivo
+            
+        Returns:
+            Path: Ruta del archivo reservado
+        """
+        archivo = self.directorio / f"{nombre}{extension}"
+        n = 1
+        while True:
+            try:
+                open(archivo, 'x').close()
+                return archivo
+            except FileExistsError:
+                archivo = self.directorio / f"{nombre}_{n}{extension}"
+                n += 1
+    
+    def _iniciar_segmento(self):
+        """Prepara el segmento actual (cabecera binaria) y su contador de tamaño"""
+        if self.binario:
+            with open(self.archivo, 'wb') as f:
+                f.write(telemetria_binaria.codificar_cabecera(self._ancla_pared_ns,
+                                                              self._ancla_mono_ns))
+        self._tam_cabecera = self.archivo.stat().st_size
+        self._tam_segmento = self._tam_cabecera
+        self._inicio_segmento = time.monotonic()
+    
+    def _debe_rotar(self, bytes_nuevos):
+        """Indica si el lote siguiente debe ir a un segmento nuevo"""
+        if self._tam_segmento <= self._tam_cabecera:
+            return False  # Nunca dejar un segmento vacío
+        if self.tam_max_segmento is not None and self._tam_segmento + bytes_nuevos > self.tam_max_segmento:
+            return True
+        if self.duracion_max_segmento is not None:
+            return time.monotonic() - self._inicio_segmento >= self.duracion_max_segmento
+        return False
+    
+    def _rotar_segmento(self):
+        """Cierra el segmento actual y empieza uno nuevo"""
+        anterior = self.archivo
+        self.archivo = ruta_segmento(self.segmentos[0], len(self.segmentos))
+        open(self.archivo, 'x').close()
+        self._iniciar_segmento()
+        self.segmentos.append(self.archivo)
+        print(f"[Telemetría] Nuevo segmento: {self.archivo}")
+        
+        if self.comprimir_segmentos or self.retencion_bytes is not None or self.retencion_dias is not None:
+            self._programar_mantenimiento(anterior if self.comprimir_segmentos else None)
+    
+    def _programar_mantenimiento(self, segmento):
+        """
+        Encola trabajo para el hilo de mantenimiento (lo crea si hace falta)
+        
+        Args:
+            segmento (Path): Segmento cerrado a comprimir, o None para
+                aplicar solo la retención
+        """
+        if self._hilo_mantenimiento is None:
+            self._cola_mantenimiento = queue.Queue()
+            self._hilo_mantenimiento = threading.Thread(
+                target=self._bucle_mantenimiento,
+                name='telemetria-mantenimiento',
+                daemon=True
+            )
+            self._hilo_mantenimiento.start()
+        self._cola_mantenimiento.put(segmento)
+    
+    def _bucle_mantenimiento(self):
+        """Hilo de baja prioridad: comprime segmentos y aplica la retención"""
+        try:
+            # SCHED_IDLE: solo usa la CPU que nadie más quiere, aunque el hilo
+            # que lo creó (p. ej. el lazo de un modo) fuera de tiempo real
+            os.sched_setscheduler(0, os.SCHED_IDLE, os.sched_param(0))
+        except (AttributeError, OSError):
+            pass
+        try:
+            # En Linux la prioridad se aplica por hilo (id nativo)
+            os.setpriority(os.PRIO_PROCESS, threading.get_native_id(), 19)
+        except (AttributeError, OSError):
+            pass
+        
+        while True:
+            segmento = self._cola_mantenimiento.get()
+            try:
+                if segmento is _FIN_ESCRITOR:
+                    break
+                if segmento is not None:
+                    comprimir_segmento(segmento)
+                if self.retencion_bytes is not None or self.retencion_dias is not None:
+                    sesion = self.segmentos + [Path(f"{s}.gz") for s in self.segmentos]
+                    sesion.append(ruta_indice(self.segmentos[0]))
+                    borrados = aplicar_retencion(self.directorio, self.retencion_bytes,
+                                                 self.retencion_dias, excluir=sesion)
+                    for ruta in borrados:
+                        print(f"[Telemetría] Retención: borrado {ruta.name}")
+            except Exception as e:
+                print(f"[Telemetría] Error de mantenimiento: {e}")
+            finally:
+                self._cola_mantenimiento.task_done()
+    
+    def _reiniciar_estadisticas(self):
+        """Pone a cero los contadores incrementales"""
+        with self._lock_estadisticas:
+            self.total_eventos = 0
+            self._estadisticas_tipo = {}
+            self._tasa_total = ContadorVentana(self.ventana_tasa)
+    
+    def _actualizar_estadisticas(self, tipo, t_ns):
+        """
+        Actualiza contadores, primer/último instante y tasa de un evento
+        
+        Lo llaman a la vez el lazo del modo, la actuación, la guardia de
+        borde y los comandos: alta del tipo y contadores van bajo el lock.
+        """
+        with self._lock_estadisticas:
+            self.total_eventos += 1
+            self._tasa_total.registrar(t_ns)
+            
+            estadistica = self._estadisticas_tipo.get(tipo)
+            if estadistica is None:
+                estadistica = self._estadisticas_tipo.setdefault(
+                    tipo, EstadisticaTipo(t_ns, ContadorVentana(self.ventana_tasa)))
+            estadistica.eventos += 1
+            estadistica.ultimo_ns = t_ns
+            estadistica.ventana.registrar(t_ns)
+    
+    def configurar_muestreo(self, tipo, politica):
+        """
+        Asigna (o quita, con None) la política de muestreo de un tipo
+        
+        Args:
+            tipo (str): Tipo de evento
+            politica (PoliticaMuestreo): Política a aplicar
+        """
+        if politica is None:
+            self.muestreo.pop(tipo, None)
+        else:
+            self.muestreo[tipo] = politica
+    
     def registrar_evento(self, tipo, datos):
         """
         Registra un evento con timestamp
         
+        Solo se captura un instante monotónico (entero en ns); el timestamp
+        ISO y el tiempo transcurrido se calculan al serializar o exportar a
+        partir del ancla de la sesión.
+        
+        Si el tipo tiene política de muestreo y esta lo descarta, solo se
+        cuenta como suprimido.
+        
         Args:
             tipo (str): Tipo de evento (ej: 'MOVIMIENTO', 'SENSOR', 'MODO')
             datos (dict): Datos del evento
+            
+        Returns:
+            bool: True si el evento se registró, False si se suprimió
         """
-        evento = {
-            'timestamp': datetime.datetime.now().isoformat(),
-            'tiempo_transcurrido': (datetime.datetime.now() - self.inicio_sesion).total_seconds(),
-            'tipo': tipo,
-            'datos': datos
-        }
-        self.datos.append(evento)
+        t_ns = time.monotonic_ns()
+        politica = self.muestreo.get(tipo)
+        if politica is not None and not politica.admitir(datos, t_ns):
+            return False
+        self._actualizar_estadisticas(tipo, t_ns)
+        
+        if self.binario:
+            # Registro empaquetado: mismo objeto en memoria y en disco
+            entrada = (tipo, t_ns, telemetria_binaria.codificar_evento(tipo, datos, t_ns))
+            self.datos.append(entrada[2])
+        else:
+            # La propia entrada (tipo, t_ns, datos) es el evento en memoria
+            entrada = (tipo, t_ns, datos)
+            self.datos.append(entrada)
+        
+        if self._cola is not None:
+            # Modo asíncrono: la E/S de disco nunca ocurre en este hilo
+            self._encolar(entrada)
+            return True
+        
+        self._pendientes.append(entrada)
         self.eventos_desde_guardado += 1
         
         # Guardar cada 10 eventos (optimizado para RPi 2 W)
         if self.eventos_desde_guardado >= 10:
             self.guardar()
             self.eventos_desde_guardado = 0
+        return True
     
-    def guardar(self):
-        """Guarda los datos en archivo JSON"""
+    def _encolar(self, entrada):
+        """Encola un evento para el hilo escritor aplicando la política de desborde"""
+        if self.politica_desborde == POLITICA_BLOQUEAR:
+            self._cola.put(entrada)
+            return
+        
+        try:
+            self._cola.put_nowait(entrada)
+            return
+        except queue.Full:
+            pass
+        
+        if self.politica_desborde == POLITICA_DESCARTAR_ANTIGUO:
+            # Sacar el evento más antiguo para dejar sitio al nuevo
+            try:
+                self._cola.get_nowait()
+                self._cola.task_done()
+            except queue.Empty:
+                pass
+            try:
+                self._cola.put_nowait(entrada)
+            except queue.Full:
+                pass  # Otro productor ocupó el hueco: se pierde este evento
+        
+        with self._lock_descartes:
+            self.eventos_descartados += 1
+    
+    def _bucle_escritor(self):
+        """Hilo escritor: saca eventos de la cola y los guarda por lotes"""
+        while True:
+            lote = [self._cola.get()]
+            
+            # Agrupar lo que ya esté en cola (sin esperar)
+            while len(lote) < self.tam_lote and lote[-1] is not _FIN_ESCRITOR:
+                try:
+                    lote.append(self._cola.get_nowait())
+                except queue.Empty:
+                    break
+            
+            fin = lote[-1] is _FIN_ESCRITOR
+            entradas = lote[:-1] if fin else lote
+            if entradas:
+                self._escribir_lote(entradas)
+            
+            for _ in lote:
+                self._cola.task_done()
+            
+            if fin:
+                break
+    
+    def _escribir_lote(self, entradas):
+        """
+        Añade un lote de eventos al archivo de log y los indexa
+        
+        Args:
+            entradas (list): Tuplas (tipo, t_ns, evento)
+            
+        Returns:
+            bool: True si se escribió correctamente
+        """
         try:
-            with open(self.archivo, 'w', encoding='utf-8') as f:
-                json.dump(self.datos, f, indent=2, ensure_ascii=False)
+            if self.binario:
+                registros = [evento for _, _, evento in entradas]
+                campos = [telemetria_binaria.claves_registro(r) for r in registros]
+            else:
+                # El timestamp ISO se genera aquí (en el hilo escritor si es asíncrono)
+                registros = [(json.dumps(self._materializar(entrada), ensure_ascii=False) + '\n').encode('utf-8')
+                             for entrada in entradas]
+                campos = [datos.keys() for _, _, datos in entradas]
+            
+            contenido = b''.join(registros)
+            if self._debe_rotar(len(contenido)):
+                self._rotar_segmento()
+            segmento = len(self.segmentos) - 1
+            
+            with open(self.archivo, 'ab') as f:
+                offset = f.tell()
+                f.write(contenido)
+            self._tam_segmento = offset + len(contenido)
+            
+            entradas_indice = []
+            for (tipo, t_ns, _), registro, claves in zip(entradas, registros, campos):
+                entradas_indice.append((tipo, t_ns - self._ancla_mono_ns, segmento, offset, claves))
+                offset += len(registro)
+            self.indice.agregar(entradas_indice)
             return True
         except Exception as e:
             print(f"[Telemetría] Error al guardar: {e}")
             return False
     
+    def guardar(self):
+        """
+        Añade al archivo JSON Lines los eventos pendientes de guardar
+        
+        En modo asíncrono espera a que el hilo escritor vacíe la cola.
+        """
+        if self._cola is not None:
+            if self._hilo_escritor.is_alive():
+                self._cola.join()
+            return True
+        
+        if not self._escribir_lote(self._pendientes):
+            return False
+        self._pendientes = []
+        self.eventos_desde_guardado = 0
+        return True
+    
+    def cerrar(self):
+        """Guarda lo pendiente y detiene el hilo escritor (si existe)"""
+        if self.muestreo:
+            # Dejar constancia en el log de lo que no se registró
+            self.registrar_evento('MUESTREO', self.resumen_muestreo())
+        
+        if self._hilo_escritor is not None and self._hilo_escritor.is_alive():
+            self._cola.put(_FIN_ESCRITOR)
+            self._hilo_escritor.join()
+        
+        # A partir de aquí cualquier evento nuevo se guarda de forma síncrona
+        self._cola = None
+        self._hilo_escritor = None
+        self.guardar()
+        
+        # Terminar las compresiones pendientes
+        if self._hilo_mantenimiento is not None:
+            self._cola_mantenimiento.put(_FIN_ESCRITOR)
+            self._hilo_mantenimiento.join()
+            self._hilo_mantenimiento = None
+    
+    def resumen_muestreo(self):
+        """
+        Contadores de las políticas de muestreo
+        
+        Returns:
+            dict: tipo -> política, eventos observados y suprimidos
+        """
+        return {
+            tipo: {
+                'politica': politica.descripcion(),
+                'observados': politica.observados,
+                'suprimidos': politica.suprimidos
+            }
+            for tipo, politica in self.muestreo.items()
+        }
+    
     def obtener_estadisticas(self):
         """
         Genera estadísticas de la sesión
         
+        Se calculan a partir de contadores incrementales, así que el coste no
+        depende de la longitud de la sesión.
+        
         Returns:
             dict: Estadísticas completas
         """
-        return {
-            'total_eventos': len(self.datos),
+        ahora_ns = time.monotonic_ns()
+        total, tasa_total, tipos = self._copiar_estadisticas(ahora_ns)
+        por_tipo = {}
+        for tipo, (eventos, primer_ns, ultimo_ns, tasa) in tipos.items():
+            por_tipo[tipo] = {
+                'eventos': eventos,
+                'primer_evento': (primer_ns - self._inicio_mono_ns) / 1e9,
+                'ultimo_evento': (ultimo_ns - self._inicio_mono_ns) / 1e9,
+                'tasa': tasa
+            }
+        muestreo = self.resumen_muestreo()
+        for tipo, contadores in muestreo.items():
+            if tipo in por_tipo:
+                por_tipo[tipo]['suprimidos'] = contadores['suprimidos']
+        
+        stats = {
+            'total_eventos': total,
+            'eventos_en_memoria': len(self.datos),
             'tiempo_total': (datetime.datetime.now() - self.inicio_sesion).total_seconds(),
-            'eventos_por_tipo': self._contar_por_tipo(),
+            'eventos_por_tipo': {tipo: t['eventos'] for tipo, t in por_tipo.items()},
+            'tasa_eventos': tasa_total,
+            'ventana_tasa': self.ventana_tasa,
+            'tipos': por_tipo,
             'inicio_sesion': self.inicio_sesion.isoformat(),
-            'archivo': str(self.archivo)
+            'archivo': str(self.archivo),
+            'segmentos': len(self.segmentos),
+            'eventos_suprimidos': sum(c['suprimidos'] for c in muestreo.values()),
+            'muestreo': muestreo
         }
+        if self._cola is not None:
+            stats['eventos_descartados'] = self.eventos_descartados
+            stats['eventos_en_cola'] = self._cola.qsize()
+        return stats
+    
+    def _materializar(self, evento, origen_ns=None):
+        """
+        Convierte un evento en memoria al dict del formato JSON
+        
+        Args:
+            evento: Registro binario o entrada (tipo, t_ns, datos)
+            origen_ns (int): Instante monotónico desde el que se cuenta el
+                tiempo transcurrido (por defecto, el ancla del log)
+        """
+        if self.binario:
+            tipo, t_ns, datos, _ = telemetria_binaria.decodificar_evento(evento)
+        else:
+            tipo, t_ns, datos = evento
+        if origen_ns is None:
+            origen_ns = self._ancla_mono_ns
+        return telemetria_binaria.materializar(tipo, t_ns, datos,
+                                               self._ancla_pared_ns + origen_ns - self._ancla_mono_ns,
+                                               origen_ns)
     
-    def _contar_por_tipo(self):
-        """Cuenta eventos por tipo"""
-        conteo = {}
+    def _eventos_en_memoria(self):
+        """Recorre los eventos en memoria ya materializados"""
         for evento in self.datos:
-            tipo = evento['tipo']
-            conteo[tipo] = conteo.get(tipo, 0) + 1
-        return conteo
+            yield self._materializar(evento, self._inicio_mono_ns)
+    
+    def _copiar_estadisticas(self, ahora_ns):
+        """
+        Instantánea coherente de los contadores incrementales
+        
+        Los hilos de los modos siguen registrando eventos (y dando de alta
+        tipos) mientras otro hilo (p. ej. el de peticiones) las consulta.
+        
+        Returns:
+            tuple: (total, tasa_total, {tipo: (eventos, primer_ns, ultimo_ns, tasa)})
+        """
+        with self._lock_estadisticas:
+            tipos = {tipo: (e.eventos, e.primer_ns, e.ultimo_ns, e.ventana.tasa(ahora_ns))
+                     for tipo, e in self._estadisticas_tipo.items()}
+            return self.total_eventos, self._tasa_total.tasa(ahora_ns), tipos
     
-    def exportar_csv(self, archivo_csv=None):
+    def exportar_csv(self, archivo_csv=None, por_tipo=False):
         """
         Exporta datos a CSV para análisis
         
+        Lee el log en disco en streaming (memoria constante) usando las
+        columnas registradas en el índice, así que sirve para sesiones largas.
+        
         Args:
             archivo_csv (str): Nombre del archivo CSV (opcional)
+            por_tipo (bool): Un CSV por tipo de evento (<nombre>_<TIPO>.csv)
         """
-        if archivo_csv is None:
-            archivo_csv = self.archivo.with_suffix('.csv')
+        # Leer desde el log en disco para incluir la sesión completa
+        self.guardar()
         
         try:
-            with open(archivo_csv, 'w', newline='', encoding='utf-8') as f:
-                if not self.datos:
-                    return False
-                
-                # Obtener todas las claves posibles
-                claves = set()
-                for evento in self.datos:
-                    claves.update(evento.keys())
-                    if 'datos' in evento:
-                        claves.update([f"datos_{k}" for k in evento['datos'].keys()])
-                
-                writer = csv.DictWriter(f, fieldnames=sorted(claves))
-                writer.writeheader()
-                
-                for evento in self.datos:
-                    fila = evento.copy()
-                    if 'datos' in fila:
-                        datos = fila.pop('datos')
-                        for k, v in datos.items():
-                            fila[f'datos_{k}'] = v
-                    writer.writerow(fila)
-            
-            print(f"[Telemetría] Exportado a CSV: {archivo_csv}")
+            destino = convertir_a_csv(self.segmentos, archivo_csv, por_tipo=por_tipo,
+                                      columnas=self.indice.columnas())
+            if destino is None:
+                return False
+            print(f"[Telemetría] Exportado a CSV: {destino}")
             return True
         except Exception as e:
             print(f"[Telemetría] Error al exportar CSV: {e}")
             return False
     
+    def leer_eventos(self):
+        """
+        Lee desde disco todos los eventos guardados de la sesión
+        
+        Recorre todos los segmentos, comprimidos o no.
+        
+        Yields:
+            dict: Cada evento guardado
+        """
+        yield from leer_eventos(list(self.segmentos))
+    
+    def exportar_json(self, archivo_json=None):
+        """
+        Exporta la sesión al formato JSON antiguo (array completo)
+        
+        Args:
+            archivo_json (str): Nombre del archivo JSON (opcional)
+            
+        Returns:
+            Path: Ruta del archivo generado, o None si hubo error
+        """
+        self.guardar()
+        try:
+            return convertir_a_json(list(self.segmentos), archivo_json)
+        except Exception as e:
+            print(f"[Telemetría] Error al exportar JSON: {e}")
+            return None
+    
+    def consultar(self, tipo=None, desde=None, hasta=None, pagina=0, tam_pagina=100):
+        """
+        Consulta paginada de la sesión completa usando el índice
+        
+        Args:
+            tipo (str): Tipo de evento (None = todos)
+            desde, hasta (float): Rango en segundos desde el inicio de la sesión
+            pagina (int): Número de página (desde 0)
+            tam_pagina (int): Eventos por página
+            
+        Returns:
+            dict: Eventos de la página y datos de paginación
+        """
+        self.guardar()
+        return consultar_archivo(self.segmentos[0], self.indice, tipo, desde, hasta,
+                                 pagina, tam_pagina)
+    
+    def exportar_sesion(self, destino=None):
+        """
+        Archivo único con la sesión completa en su formato original
+        
+        Con un solo segmento devuelve el log actual; con varios los une
+        (descomprimiendo los cerrados) en `<sesion>.completo.<ext>`.
+        
+        Args:
+            destino (str): Archivo de salida (opcional)
+            
+        Returns:
+            Path: Ruta del archivo con la sesión completa
+        """
+        self.guardar()
+        return exportar_sesion(list(self.segmentos), destino)
+    
     def obtener_eventos_por_tipo(self, tipo):
         """
-        Filtra eventos por tipo
+        Filtra eventos por tipo (entre los que siguen en memoria)
         
         Args:
             tipo (str): Tipo de evento a filtrar
@@ -132,7 +1634,7 @@ class SistemaTelemetria:
         Returns:
             list: Lista de eventos del tipo especificado
         """
-        return [e for e in self.datos if e['tipo'] == tipo]
+        return [e for e in self._eventos_en_memoria() if e['tipo'] == tipo]
     
     def obtener_ultimos_eventos(self, n=10):
         """
@@ -144,13 +1646,21 @@ class SistemaTelemetria:
         Returns:
             list: Últimos N eventos
         """
-        return self.datos[-n:] if len(self.datos) >= n else self.datos
+        return [self._materializar(e, self._inicio_mono_ns) for e in self.datos.ultimos(n)]
     
     def limpiar(self):
         """Limpia los datos de la sesión actual"""
-        self.datos = []
-        self.inicio_sesion = datetime.datetime.now()
+        self.guardar()  # El log en disco conserva lo ya registrado
+        self.datos.limpiar()
+        # Los tiempos en memoria y las estadísticas vuelven a contar desde
+        # cero; el ancla del log y del índice no cambia en toda la sesión
+        self._inicio_mono_ns = time.monotonic_ns()
+        self.inicio_sesion = datetime.datetime.fromtimestamp(
+            (self._ancla_pared_ns + self._inicio_mono_ns - self._ancla_mono_ns) / 1e9)
         self.eventos_desde_guardado = 0
+        self._reiniciar_estadisticas()
+        for politica in self.muestreo.values():
+            politica.observados = politica.suprimidos = 0
         print("[Telemetría] Datos limpiados")
     
     def generar_reporte(self):
@@ -173,18 +1683,30 @@ class SistemaTelemetria:
         reporte.append("Eventos por tipo:")
         for tipo, cantidad in sorted(stats['eventos_por_tipo'].items()):
             reporte.append(f"  - {tipo}: {cantidad}")
+        if stats['muestreo']:
+            reporte.append("")
+            reporte.append(f"Eventos suprimidos por muestreo: {stats['eventos_suprimidos']}")
+            for tipo, contadores in sorted(stats['muestreo'].items()):
+                reporte.append(f"  - {tipo} ({contadores['politica']}): "
+                               f"{contadores['suprimidos']} de {contadores['observados']}")
         reporte.append("=" * 50)
         
         return "\n".join(reporte)
     
     def __del__(self):
         """Guardar datos al destruir el objeto"""
-        if self.eventos_desde_guardado > 0:
+        if self._pendientes:
             self.guardar()
 
 
 # Ejemplo de uso
 if __name__ == "__main__":
+    # Conversión de un log al formato antiguo: python telemetria.py <log.jsonl>
+    if len(sys.argv) > 1:
+        destino = convertir_a_json(sys.argv[1])
+        print(f"Convertido a: {destino}")
+        sys.exit(0)
+    
     # Crear sistema de telemetría
     telemetria = SistemaTelemetria()
     
@@ -201,7 +1723,8 @@ if __name__ == "__main__":
     # Exportar a CSV
     telemetria.exportar_csv()
     
-    # Guardar JSON
+    # Guardar log JSON Lines y convertir al formato antiguo
     telemetria.guardar()
+    telemetria.exportar_json()
     
     print(f"\nArchivos generados en: {telemetria.directorio}")
@@ -0,0 +1,336 @@
+#!/usr/bin/env python3
+"""
+Formato Binario Compacto de Telemetría
+Robot ASTI Challenge
+
+Cada tipo de evento de alta frecuencia (SENSORES_IR, MOVIMIENTO, SUMO) tiene
+un esquema con un layout `struct` fijo. Un registro ocupa:
+
+    [id_tipo: uint8][t_ns: uint64 monotónico][payload fijo del tipo]
+
+Los eventos sin esquema (o cuyos datos no encajan en él) se guardan como
+registro genérico: id 0 + longitud uint16 + JSON UTF-8.
+
+El archivo empieza con una cabecera que ancla el reloj monotónico al reloj
+de pared, de modo que los timestamps ISO solo se calculan al decodificar.
+
+Uso como decodificador:
+    python telemetria_binaria.py sesion.bin                  # -> sesion.json
+    python telemetria_binaria.py sesion.bin --formato csv    # -> sesion.csv
+"""
+
+import argparse
+import datetime
+import gzip
+import json
+import math
+import struct
+import sys
+from pathlib import Path
+
+
+MAGIA = b'ASTITEL1'
+CABECERA = struct.Struct('<qq')  # (ancla_pared_ns, ancla_monotonica_ns)
+TAM_CABECERA = len(MAGIA) + CABECERA.size
+
+ID_GENERICO = 0
+_GENERICO = struct.Struct('<BQH')  # id, t_ns, longitud del JSON
+
+# Valor reservado para campos ausentes según el formato struct
+_AUSENTE = {
+    'B': 0xFF,
+    'b': -0x80,
+    'H': 0xFFFF,
+    'h': -0x8000,
+    'f': math.nan,
+    'd': math.nan,
+}
+
+
+class EsquemaEvento:
+    """Layout binario fijo para un tipo de evento"""
+
+    def __init__(self, tipo, id_tipo, campos):
+        """
+        Args:
+            tipo (str): Tipo de evento (ej: 'SENSORES_IR')
+            id_tipo (int): Identificador de 1 a 255
+            campos (list): Tuplas (nombre, formato_struct) o
+                (nombre, formato_struct, valores_enum) para campos de texto
+        """
+        if not 0 < id_tipo < 256:
+            raise ValueError("id_tipo debe estar entre 1 y 255")
+
+        self.tipo = tipo
+        self.id_tipo = id_tipo
+        self.campos = []
+        formato = '<BQ'
+        for campo in campos:
+            nombre, fmt = campo[0], campo[1]
+            enum = tuple(campo[2]) if len(campo) > 2 else None
+            self.campos.append((nombre, fmt, enum, _AUSENTE[fmt]))
+            formato += fmt
+
+        self.nombres = tuple(c[0] for c in self.campos)
+        self._conjunto_nombres = frozenset(self.nombres)
+        self.struct = struct.Struct(formato)
+        self.tam = self.struct.size
+        self._indices_enum = {
+            nombre: {v: i for i, v in enumerate(enum)}
+            for nombre, _, enum, _ in self.campos if enum
+        }
+
+    def codificar(self, datos, t_ns):
+        """
+        Empaqueta un evento
+
+        Args:
+            datos (dict): Datos del evento
+            t_ns (int): Timestamp monotónico en nanosegundos
+
+        Returns:
+            bytes: Registro empaquetado, o None si los datos no encajan
+        """
+        if not datos.keys() <= self._conjunto_nombres:
+            return None
+
+        valores = [self.id_tipo, t_ns]
+        for nombre, _, enum, ausente in self.campos:
+            if nombre not in datos:
+                valores.append(ausente)
+            elif enum:
+                indice = self._indices_enum[nombre].get(datos[nombre])
+                if indice is None:
+                    return None
+                valores.append(indice)
+            else:
+                valores.append(datos[nombre])
+
+        try:
+            return self.struct.pack(*valores)
+        except struct.error:
+            return None
+
+    def decodificar(self, buffer, offset=0):
+        """
+        Desempaqueta un registro
+
+        Returns:
+            tuple: (t_ns, datos)
+        """
+        valores = self.struct.unpack_from(buffer, offset)
+        datos = {}
+        for (nombre, fmt, enum, ausente), valor in zip(self.campos, valores[2:]):
+            if fmt in 'fd':
+                if math.isnan(valor):
+                    continue
+                valor = int(valor) if valor.is_integer() else valor
+            elif valor == ausente:
+                continue
+            elif enum:
+                valor = enum[valor]
+            datos[nombre] = valor
+        return valores[1], datos
+
+
+# ===== REGISTRO DE ESQUEMAS =====
+ESQUEMAS_POR_TIPO = {}
+ESQUEMAS_POR_ID = {}
+
+
+def registrar_esquema(esquema):
+    """Añade un esquema al registro global"""
+    if esquema.id_tipo in ESQUEMAS_POR_ID and ESQUEMAS_POR_ID[esquema.id_tipo].tipo != esquema.tipo:
+        raise ValueError(f"id_tipo {esquema.id_tipo} ya usado por {ESQUEMAS_POR_ID[esquema.id_tipo].tipo}")
+    ESQUEMAS_POR_TIPO[esquema.tipo] = esquema
+    ESQUEMAS_POR_ID[esquema.id_tipo] = esquema
+
+
+registrar_esquema(EsquemaEvento('SENSORES_IR', 1, [
+    ('izq', 'B'), ('cen', 'B'), ('der', 'B'),
+]))
+registrar_esquema(EsquemaEvento('MOVIMIENTO', 2, [
+    ('accion', 'B', ('avanzar', 'retroceder', 'girar_izquierda', 'girar_derecha', 'detener')),
+    ('velocidad', 'f'),
+]))
+registrar_esquema(EsquemaEvento('SUMO', 3, [
+    ('estado', 'B', ('BUSCAR', 'ATACAR', 'ESCAPAR', 'RETROCEDER', 'GIRAR')),
+    ('distancia', 'f'),
+    ('borde_izq', 'b'),
+    ('borde_der', 'b'),
+    ('velocidad', 'f'),          # Acercamiento del oponente (cm/s) en ATACAR
+]))
+
+
+# ===== CODIFICACIÓN =====
+def codificar_cabecera(ancla_pared_ns, ancla_monotonica_ns):
+    """Cabecera de archivo con el ancla de tiempo de la sesión"""
+    return MAGIA + CABECERA.pack(ancla_pared_ns, ancla_monotonica_ns)
+
+
+def codificar_evento(tipo, datos, t_ns):
+    """
+    Empaqueta un evento usando su esquema o, si no lo hay, como JSON
+
+    Args:
+        tipo (str): Tipo de evento
+        datos (dict): Datos del evento
+        t_ns (int): Timestamp monotónico en nanosegundos
+
+    Returns:
+        bytes: Registro binario
+    """
+    esquema = ESQUEMAS_POR_TIPO.get(tipo)
+    if esquema is not None:
+        registro = esquema.codificar(datos, t_ns)
+        if registro is not None:
+            return registro
+
+    carga = json.dumps({'tipo': tipo, 'datos': datos}, ensure_ascii=False,
+                       separators=(',', ':')).encode('utf-8')
+    return _GENERICO.pack(ID_GENERICO, t_ns, len(carga)) + carga
+
+
+# ===== DECODIFICACIÓN =====
+def decodificar_evento(buffer, offset=0):
+    """
+    Desempaqueta un registro
+
+    Returns:
+        tuple: (tipo, t_ns, datos, tamaño_registro)
+
+    Raises:
+        ValueError: Si el id de tipo no corresponde a ningún esquema
+    """
+    id_tipo = buffer[offset]
+    if id_tipo == ID_GENERICO:
+        _, t_ns, longitud = _GENERICO.unpack_from(buffer, offset)
+        inicio = offset + _GENERICO.size
+        carga = json.loads(bytes(buffer[inicio:inicio + longitud]).decode('utf-8'))
+        return carga['tipo'], t_ns, carga['datos'], _GENERICO.size + longitud
+
+    esquema = ESQUEMAS_POR_ID.get(id_tipo)
+    if esquema is None:
+        raise ValueError(f"id de tipo desconocido {id_tipo} en el offset {offset}")
+    t_ns, datos = esquema.decodificar(buffer, offset)
+    return esquema.tipo, t_ns, datos, esquema.tam
+
+
+def claves_registro(registro):
+    """
+    Nombres de los campos de datos de un registro
+
+    Los registros con esquema no se decodifican: sus campos son los del
+    esquema. Solo los genéricos requieren leer el JSON.
+
+    Returns:
+        tuple: Nombres de los campos
+    """
+    id_tipo = registro[0]
+    if id_tipo == ID_GENERICO:
+        _, _, longitud = _GENERICO.unpack_from(registro)
+        carga = bytes(registro[_GENERICO.size:_GENERICO.size + longitud])
+        return tuple(json.loads(carga.decode('utf-8'))['datos'])
+    return ESQUEMAS_POR_ID[id_tipo].nombres
+
+
+def materializar(tipo, t_ns, datos, ancla_pared_ns, ancla_monotonica_ns):
+    """
+    Convierte un registro en el evento dict del formato JSON
+
+    Returns:
+        dict: Evento con timestamp ISO y tiempo transcurrido
+    """
+    relativo_ns = t_ns - ancla_monotonica_ns
+    instante = datetime.datetime.fromtimestamp((ancla_pared_ns + relativo_ns) / 1e9)
+    return {
+        'timestamp': instante.isoformat(),
+        'tiempo_transcurrido': relativo_ns / 1e9,
+        'tipo': tipo,
+        'datos': datos
+    }
+
+
+def abrir_archivo(archivo, modo='rb'):
+    """Abre un log, descomprimiendo al vuelo si es un segmento .gz"""
+    if str(archivo).endswith('.gz'):
+        return gzip.open(archivo, modo, encoding='utf-8' if 't' in modo else None)
+    return open(archivo, modo, encoding='utf-8' if 't' in modo else None)
+
+
+def es_archivo_binario(archivo):
+    """Indica si un archivo empieza con la cabecera del formato binario"""
+    with abrir_archivo(archivo) as f:
+        return f.read(len(MAGIA)) == MAGIA
+
+
+def leer_eventos(archivo, tam_bloque=64 * 1024):
+    """
+    Lee por bloques los eventos de un archivo binario
+
+    Args:
+        archivo (str|Path): Archivo binario de telemetría
+        tam_bloque (int): Bytes leídos por bloque
+
+    Yields:
+        dict: Cada evento, ya materializado
+    """
+    with abrir_archivo(archivo) as f:
+        cabecera = f.read(TAM_CABECERA)
+        if cabecera[:len(MAGIA)] != MAGIA:
+            raise ValueError(f"{archivo} no es un archivo de telemetría binaria")
+        ancla_pared, ancla_mono = CABECERA.unpack_from(cabecera, len(MAGIA))
+
+        buffer = b''
+        posicion = TAM_CABECERA  # Offset en el archivo del inicio del buffer
+        while True:
+            bloque = f.read(tam_bloque)
+            buffer += bloque
+            offset = 0
+            while offset < len(buffer):
+                try:
+                    tipo, t_ns, datos, tam = decodificar_evento(buffer, offset)
+                except (struct.error, IndexError, json.JSONDecodeError, UnicodeDecodeError):
+                    break  # Registro incompleto: falta el siguiente bloque
+                except ValueError:
+                    # Sin esquema no se conoce el tamaño: el resto es ilegible
+                    print(f"[Telemetría] id de tipo desconocido {buffer[offset]} en el offset "
+                          f"{posicion + offset} de {archivo}, se descarta el resto")
+                    return
+                if offset + tam > len(buffer):
+                    break
+                yield materializar(tipo, t_ns, datos, ancla_pared, ancla_mono)
+                offset += tam
+            buffer = buffer[offset:]
+            posicion += offset
+
+            if not bloque:
+                if buffer:
+                    print(f"[Telemetría] Registro truncado al final de {archivo} ({len(buffer)} bytes)")
+                return
+
+
+# ===== CLI DECODIFICADOR =====
+def main(argv=None):
+    """Convierte una sesión binaria a JSON o CSV"""
+    parser = argparse.ArgumentParser(description="Decodificador de telemetría binaria")
+    parser.add_argument('archivo', help="Sesión binaria (.bin)")
+    parser.add_argument('--formato', choices=('json', 'csv'), default='json')
+    parser.add_argument('-o', '--salida', help="Archivo de salida (opcional)")
+    parser.add_argument('--por-tipo', action='store_true',
+                        help="CSV: un archivo por tipo de evento")
+    args = parser.parse_args(argv)
+
+    # Importación diferida: telemetria.py depende de este módulo
+    from telemetria import convertir_a_json, convertir_a_csv
+
+    if args.formato == 'json':
+        destino = convertir_a_json(args.archivo, args.salida)
+    else:
+        destino = convertir_a_csv(args.archivo, args.salida, por_tipo=args.por_tipo)
+    print(f"Decodificado a: {destino}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
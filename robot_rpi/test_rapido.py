@@ -12,41 +12,10 @@ print("="*60)
 print("TEST RÁPIDO DE VALIDACIÓN - ROBOT ASTI v2.0")
 print("="*60)
 
-# Mock de RPi.GPIO para testing sin hardware
-class MockGPIO:
-    BCM = 'BCM'
-    OUT = 'OUT'
-    IN = 'IN'
-    HIGH = 1
-    LOW = 0
-    PUD_UP = 'PUD_UP'
-    
-    @staticmethod
-    def setmode(mode): pass
-    
-    @staticmethod
-    def setwarnings(flag): pass
-    
-    @staticmethod
-    def setup(pin, mode, **kwargs): pass
-    
-    @staticmethod
-    def output(pin, value): pass
-    
-    @staticmethod
-    def input(pin): return 0
-    
-    @staticmethod
-    def cleanup(): pass
-    
-    class PWM:
-        def __init__(self, pin, freq): pass
-        def start(self, duty): pass
-        def ChangeDutyCycle(self, duty): pass
-        def stop(self): pass
-
-sys.modules['RPi'] = type(sys)('RPi')
-sys.modules['RPi.GPIO'] = MockGPIO()
+# Simulador del GPIO para testing sin hardware (ver hal_gpio.py)
+sys.path.insert(0, str(Path(__file__).parent))
+import hal_gpio
+hal_gpio.seleccionar_backend('simulado')
 
 # Cambiar al directorio robot_rpi
 import os
@@ -76,28 +45,28 @@ def test_import_telemetria():
 
 def test_import_calibrador():
     from calibrador import CalibradorSensores
-    import RPi.GPIO as GPIO
+    from hal_gpio import GPIO
     GPIO.setmode(GPIO.BCM)
     cal = CalibradorSensores(5, 6, 13)
     assert cal is not None
 
 def test_import_sensor_color():
     from sensor_color import SensorColor
-    import RPi.GPIO as GPIO
+    from hal_gpio import GPIO
     GPIO.setmode(GPIO.BCM)
     sensor = SensorColor(17, 27, 22, 23, 24)
     assert sensor is not None
 
 def test_import_pinza():
     from pinza import ControlPinza
-    import RPi.GPIO as GPIO
+    from hal_gpio import GPIO
     GPIO.setmode(GPIO.BCM)
     pinza = ControlPinza(18)
     assert pinza is not None
 
 def test_import_indicadores():
     from indicadores import SistemaIndicadores
-    import RPi.GPIO as GPIO
+    from hal_gpio import GPIO
     GPIO.setmode(GPIO.BCM)
     leds = SistemaIndicadores(26, 19, 13)
     assert leds is not None
@@ -111,7 +80,7 @@ def test_telemetria_funcional():
 
 def test_sensor_color_lectura():
     from sensor_color import SensorColor
-    import RPi.GPIO as GPIO
+    from hal_gpio import GPIO
     GPIO.setmode(GPIO.BCM)
     sensor = SensorColor(17, 27, 22, 23, 24)
     r, g, b = sensor.leer_rgb()
@@ -119,7 +88,7 @@ def test_sensor_color_lectura():
 
 def test_pinza_movimiento():
     from pinza import ControlPinza
-    import RPi.GPIO as GPIO
+    from hal_gpio import GPIO
     GPIO.setmode(GPIO.BCM)
     pinza = ControlPinza(18)
     pinza.abrir()
@@ -128,7 +97,7 @@ def test_pinza_movimiento():
 
 def test_leds_estados():
     from indicadores import SistemaIndicadores
-    import RPi.GPIO as GPIO
+    from hal_gpio import GPIO
     GPIO.setmode(GPIO.BCM)
     leds = SistemaIndicadores(26, 19, 13)
     leds.indicar_estado('IDLE')
@@ -141,7 +110,7 @@ def test_integracion_completa():
     from sensor_color import SensorColor
     from pinza import ControlPinza
     from indicadores import SistemaIndicadores
-    import RPi.GPIO as GPIO
+    from hal_gpio import GPIO
     
     GPIO.setmode(GPIO.BCM)
     
@@ -14,60 +14,15 @@ sys.path.insert(0, str(Path(__file__).parent))
 # Modo de testing (cambiar a False para testing con hardware real)
 MODO_SIMULACION = True
 
+import hal_gpio
+
 if MODO_SIMULACION:
     print("[TEST] Modo SIMULACIÓN activado (sin hardware)")
-    # Mock de RPi.GPIO para testing sin hardware
-    class MockGPIO:
-        BCM = 'BCM'
-        OUT = 'OUT'
-        IN = 'IN'
-        HIGH = 1
-        LOW = 0
-        PUD_UP = 'PUD_UP'
-        
-        @staticmethod
-        def setmode(mode):
-            pass
-        
-        @staticmethod
-        def setwarnings(flag):
-            pass
-        
-        @staticmethod
-        def setup(pin, mode, **kwargs):
-            pass
-        
-        @staticmethod
-        def output(pin, value):
-            pass
-        
-        @staticmethod
-        def input(pin):
-            return 0
-        
-        @staticmethod
-        def cleanup():
-            pass
-        
-        class PWM:
-            def __init__(self, pin, freq):
-                self.pin = pin
-                self.freq = freq
-            
-            def start(self, duty):
-                pass
-            
-            def ChangeDutyCycle(self, duty):
-                pass
-            
-            def stop(self):
-                pass
-    
-    sys.modules['RPi'] = type(sys)('RPi')
-    sys.modules['RPi.GPIO'] = MockGPIO()
+    # Simulador determinista del GPIO (ver hal_gpio.py)
+    hal_gpio.seleccionar_backend('simulado')
 else:
     print("[TEST] Modo HARDWARE activado")
-    import RPi.GPIO as GPIO
+    hal_gpio.seleccionar_backend()
 
 # Importar módulos a testear
 try:
@@ -76,6 +31,9 @@ try:
     from sensor_color import SensorColor
     from pinza import ControlPinza
     from indicadores import SistemaIndicadores
+    from planificador import PlanificadorPeriodico
+    from metricas import HistogramaLatencia, MetricasLazo, RegistroMetricas
+    from motores import Motor, TraccionDiferencial
     MODULOS_DISPONIBLES = True
 except ImportError as e:
     print(f"[ERROR] No se pudieron importar módulos: {e}")
@@ -173,10 +131,464 @@ def test_telemetria_exportar_csv():
     assert resultado == True
     print("  - Exportación a CSV exitosa")
 
+def test_telemetria_jsonl():
+    """Test: Log JSON Lines incremental y conversión al formato antiguo"""
+    import json
+    tel = SistemaTelemetria(archivo_log="test_jsonl.json")
+    
+    for i in range(25):
+        tel.registrar_evento('SENSORES_IR', {'izq': i % 2, 'cen': 0, 'der': 1})
+    tel.guardar()
+    tel.guardar()  # Sin pendientes: no debe duplicar eventos
+    
+    with open(tel.archivo, encoding='utf-8') as f:
+        lineas = f.readlines()
+    assert len(lineas) == 25
+    assert json.loads(lineas[-1])['datos']['izq'] == 0
+    
+    archivo_json = tel.exportar_json("test_jsonl_legacy.json")
+    with open(archivo_json, encoding='utf-8') as f:
+        eventos = json.load(f)
+    assert eventos == list(tel.leer_eventos())
+    print(f"  - {len(lineas)} eventos añadidos y convertidos a JSON")
+
+def test_telemetria_asincrona():
+    """Test: Escritor en segundo plano con cola acotada"""
+    import json
+    import threading
+    
+    for politica in ('descartar_antiguo', 'descartar_nuevo'):
+        tel = SistemaTelemetria(archivo_log="test_asincrona.json", asincrono=True,
+                                tam_cola=5, politica_desborde=politica)
+        
+        # Bloquear el escritor con el primer lote para llenar la cola
+        escribiendo = threading.Event()
+        continuar = threading.Event()
+        escribir_original = tel._escribir_lote
+        
+        def escribir_lento(eventos):
+            escribiendo.set()
+            continuar.wait(timeout=5)
+            return escribir_original(eventos)
+        
+        tel._escribir_lote = escribir_lento
+        tel.registrar_evento('TEST', {'i': 0})
+        assert escribiendo.wait(timeout=5)
+        
+        for i in range(1, 21):
+            tel.registrar_evento('TEST', {'i': i})
+        assert tel.eventos_descartados == 15
+        
+        continuar.set()
+        tel.cerrar()
+        
+        with open(tel.archivo, encoding='utf-8') as f:
+            indices = [json.loads(linea)['datos']['i'] for linea in f]
+        esperados = [0, 16, 17, 18, 19, 20] if politica == 'descartar_antiguo' else [0, 1, 2, 3, 4, 5]
+        assert indices == esperados, indices
+        print(f"  - {politica}: {tel.eventos_descartados} descartados, guardados {indices}")
+
+def test_telemetria_buffer_circular():
+    """Test: Historial en memoria acotado con log en disco completo"""
+    tel = SistemaTelemetria(archivo_log="test_buffer.json", capacidad_memoria=50)
+    
+    for i in range(120):
+        tipo = 'SENSORES_IR' if i % 2 == 0 else 'MOVIMIENTO'
+        tel.registrar_evento(tipo, {'i': i})
+    
+    assert len(tel.datos) == 50
+    assert [e['datos']['i'] for e in tel.obtener_ultimos_eventos(3)] == [117, 118, 119]
+    assert len(tel.obtener_eventos_por_tipo('SENSORES_IR')) == 25
+    
+    tel.guardar()
+    assert len(list(tel.leer_eventos())) == 120
+    assert tel.obtener_estadisticas()['total_eventos'] == 120
+    
+    # Varios hilos añadiendo a la vez no pierden elementos ni descuadran el buffer
+    import threading
+    from telemetria import BufferCircular
+    buffer = BufferCircular(8000)
+    intervalo = sys.getswitchinterval()
+    sys.setswitchinterval(1e-6)  # Fuerza cambios de hilo frecuentes
+    try:
+        hilos = [threading.Thread(target=lambda h=h: [buffer.append((h, i)) for i in range(2000)])
+                 for h in range(4)]
+        for hilo in hilos:
+            hilo.start()
+        for hilo in hilos:
+            hilo.join()
+    finally:
+        sys.setswitchinterval(intervalo)
+    assert buffer.total_agregados == len(buffer) == 8000
+    assert len(set(buffer)) == 8000
+    print(f"  - {len(tel.datos)} eventos en memoria, 120 en disco")
+
+def test_telemetria_binaria():
+    """Test: Formato binario compacto (>=10x menos disco y memoria)"""
+    import os
+    import telemetria_binaria
+    
+    tel_json = SistemaTelemetria(archivo_log="test_formato_json.json")
+    tel_bin = SistemaTelemetria(archivo_log="test_formato_bin.json", formato='binario')
+    
+    for tel in (tel_json, tel_bin):
+        for i in range(500):
+            tel.registrar_evento('SENSORES_IR', {'izq': i % 2, 'cen': 0, 'der': 1})
+        tel.guardar()
+    
+    tam_json = os.path.getsize(tel_json.archivo)
+    tam_bin = os.path.getsize(tel_bin.archivo) - telemetria_binaria.TAM_CABECERA
+    assert tam_json / tam_bin >= 10, (tam_json, tam_bin)
+    
+    def tam_memoria(obj):
+        if isinstance(obj, dict):
+            return sys.getsizeof(obj) + sum(tam_memoria(k) + tam_memoria(v) for k, v in obj.items())
+        if isinstance(obj, tuple):
+            return sys.getsizeof(obj) + sum(tam_memoria(v) for v in obj)
+        return sys.getsizeof(obj)
+    mem_json = sum(tam_memoria(e) for e in tel_json.datos)
+    mem_bin = sum(tam_memoria(e) for e in tel_bin.datos)
+    assert mem_json / mem_bin >= 10, (mem_json, mem_bin)
+    
+    # Ida y vuelta: tipos con esquema, con campos opcionales y sin esquema
+    tel_bin.registrar_evento('MOVIMIENTO', {'accion': 'detener'})
+    tel_bin.registrar_evento('SUMO', {'estado': 'ATACAR', 'distancia': 12.5})
+    tel_bin.registrar_evento('MODO', {'modo': 'linea_pid', 'iniciado': True})
+    tel_bin.guardar()
+    eventos = list(tel_bin.leer_eventos())
+    assert len(eventos) == 503
+    assert eventos[0]['datos'] == {'izq': 0, 'cen': 0, 'der': 1}
+    assert [e['datos'] for e in eventos[-3:]] == [
+        {'accion': 'detener'},
+        {'estado': 'ATACAR', 'distancia': 12.5},
+        {'modo': 'linea_pid', 'iniciado': True},
+    ]
+    assert tel_bin.obtener_ultimos_eventos(1)[0]['tipo'] == 'MODO'
+    
+    # Los ticks de ataque del sumo (los SUMO más frecuentes) usan el esquema
+    ataque = {'estado': 'ATACAR', 'distancia': 30.0, 'velocidad': 45.5}
+    registro = telemetria_binaria.codificar_evento('SUMO', ataque, 1000)
+    esquema = telemetria_binaria.ESQUEMAS_POR_TIPO['SUMO']
+    assert registro[0] == esquema.id_tipo != telemetria_binaria.ID_GENERICO
+    assert len(registro) == esquema.tam
+    assert telemetria_binaria.decodificar_evento(registro)[2] == ataque
+    
+    # Un id de tipo desconocido es un error de formato, no un registro incompleto
+    try:
+        telemetria_binaria.decodificar_evento(b'\xfe' + registro[1:])
+        assert False, "Debería rechazar un id de tipo desconocido"
+    except ValueError as e:
+        assert 'offset 0' in str(e)
+    corrupto = tel_bin.archivo.with_name(tel_bin.archivo.stem + '_corrupto.bin')
+    corrupto.write_bytes(tel_bin.archivo.read_bytes() + b'\xfe' + registro[1:] + registro)
+    assert len(list(telemetria_binaria.leer_eventos(corrupto))) == 503
+    corrupto.unlink()
+    
+    # Decodificador CLI
+    assert telemetria_binaria.main([str(tel_bin.archivo), '--formato', 'csv']) == 0
+    assert tel_bin.archivo.with_suffix('.csv').exists()
+    print(f"  - Disco: {tam_json} B JSONL vs {tam_bin} B binario ({tam_json / tam_bin:.1f}x)")
+    print(f"  - Memoria: {mem_json} B vs {mem_bin} B ({mem_json / mem_bin:.1f}x)")
+
+def test_telemetria_estadisticas_incrementales():
+    """Test: Estadísticas en tiempo constante independiente del historial"""
+    tel = SistemaTelemetria(archivo_log="test_stats.json", capacidad_memoria=100)
+    
+    for i in range(5000):
+        tel.registrar_evento('SENSORES_IR' if i % 4 else 'MOVIMIENTO', {'i': i})
+    
+    stats = tel.obtener_estadisticas()
+    assert stats['total_eventos'] == 5000
+    assert stats['eventos_por_tipo'] == {'MOVIMIENTO': 1250, 'SENSORES_IR': 3750}
+    ir = stats['tipos']['SENSORES_IR']
+    assert ir['primer_evento'] <= ir['ultimo_evento']
+    assert stats['tasa_eventos'] * stats['ventana_tasa'] == 5000
+    
+    # El coste de la consulta no crece con el número de eventos
+    inicio = time.perf_counter()
+    for _ in range(200):
+        tel.obtener_estadisticas()
+    duracion_corta = time.perf_counter() - inicio
+    for i in range(20000):
+        tel.registrar_evento('SENSORES_IR', {'i': i})
+    inicio = time.perf_counter()
+    for _ in range(200):
+        tel.obtener_estadisticas()
+    duracion_larga = time.perf_counter() - inicio
+    assert duracion_larga < duracion_corta * 3 + 0.01
+    # Varios hilos registrando (y dando de alta tipos) mientras otro consulta:
+    # los totales son exactos
+    import threading
+    tel = SistemaTelemetria(archivo_log="test_stats_hilos.json", asincrono=True,
+                            formato='binario', capacidad_memoria=100)
+    fin = threading.Event()
+    def consultar():
+        while not fin.is_set():
+            tel.obtener_estadisticas()
+    def registrar(h):
+        for i in range(2000):
+            tel.registrar_evento(f'TIPO_{i % 20}', {'h': h})
+    intervalo = sys.getswitchinterval()
+    sys.setswitchinterval(1e-6)
+    try:
+        lector = threading.Thread(target=consultar)
+        lector.start()
+        hilos = [threading.Thread(target=registrar, args=(h,)) for h in range(4)]
+        for hilo in hilos:
+            hilo.start()
+        for hilo in hilos:
+            hilo.join()
+        fin.set()
+        lector.join()
+    finally:
+        sys.setswitchinterval(intervalo)
+    stats = tel.obtener_estadisticas()
+    assert stats['total_eventos'] == 8000
+    assert stats['eventos_por_tipo'] == {f'TIPO_{t}': 400 for t in range(20)}
+    tel.cerrar()
+    
+    print(f"  - 200 consultas: {duracion_corta*1000:.1f} ms (5k eventos) vs "
+          f"{duracion_larga*1000:.1f} ms (25k eventos)")
+
+def test_telemetria_indice():
+    """Test: Consultas por tipo y rango de tiempo con índice persistido"""
+    from telemetria import IndiceTelemetria, consultar_archivo, ruta_indice
+    
+    for formato in ('jsonl', 'binario'):
+        tel = SistemaTelemetria(archivo_log="test_indice.json", formato=formato)
+        for i in range(300):
+            if i % 3 == 0:
+                tel.registrar_evento('SUMO', {'estado': 'BUSCAR', 'distancia': float(i)})
+            else:
+                tel.registrar_evento('SENSORES_IR', {'izq': 0, 'cen': 1, 'der': 0})
+        
+        # Paginación por tipo
+        resultado = tel.consultar(tipo='SUMO', pagina=1, tam_pagina=30)
+        assert resultado['total'] == 100
+        assert resultado['paginas'] == 4
+        assert [e['datos']['distancia'] for e in resultado['eventos'][:2]] == [90, 93]
+        
+        # Rango de tiempo: entre el evento 50 y el 60 (incluidos)
+        t_50 = tel.indice.tiempos[50] / 1e9
+        t_60 = tel.indice.tiempos[60] / 1e9
+        resultado = tel.consultar(desde=t_50, hasta=t_60, tam_pagina=1000)
+        assert resultado['total'] >= 11  # Más si hay timestamps iguales en el borde
+        assert all(t_50 <= e['tiempo_transcurrido'] + 1e-3 for e in resultado['eventos'])
+        
+        # Índice persistido: consulta de otra sesión sin cargarla entera
+        indice = IndiceTelemetria.cargar(ruta_indice(tel.archivo))
+        assert len(indice) == 300
+        resultado = consultar_archivo(tel.archivo, tipo='SENSORES_IR', tam_pagina=5)
+        assert resultado['total'] == 200
+        assert resultado['eventos'][0]['datos'] == {'izq': 0, 'cen': 1, 'der': 0}
+        
+        # Índice mantenido por un lector: solo incorpora lo escrito después
+        for i in range(20):
+            tel.registrar_evento('MODO', {'modo': 'sumo', 'i': i})
+        tel.guardar()
+        with open(ruta_indice(tel.archivo), 'ab') as f:
+            f.write(b'E\x00')  # Entrada a medio escribir
+        assert indice.actualizar() == 20 and len(indice) == 320
+        assert indice.actualizar() == 0
+        resultado = consultar_archivo(tel.archivo, indice, tipo='MODO')
+        assert resultado['total'] == 20 and resultado['eventos'][-1]['datos']['i'] == 19
+        print(f"  - {formato}: índice de {len(indice)} eventos, tipos {sorted(indice.tipos())}")
+
+def test_telemetria_csv_streaming():
+    """Test: Exportación CSV en una pasada, conjunta y por tipo"""
+    import csv
+    from telemetria import convertir_a_csv
+    
+    tel = SistemaTelemetria(archivo_log="test_csv.json", formato='binario')
+    for i in range(200):
+        tel.registrar_evento('SENSORES_IR', {'izq': i % 2, 'cen': 1, 'der': 0})
+        if i % 50 == 0:
+            tel.registrar_evento('MODO', {'modo': 'linea_pid', 'iteracion': i})
+    
+    assert tel.exportar_csv("test_export.csv")
+    with open("test_export.csv", newline='', encoding='utf-8') as f:
+        filas = list(csv.DictReader(f))
+    assert len(filas) == 204
+    assert 'datos_iteracion' in filas[0] and 'datos_izq' in filas[0]
+    assert filas[-1]['datos_izq'] == '1'
+    
+    assert tel.exportar_csv("test_export.csv", por_tipo=True)
+    with open("test_export_MODO.csv", newline='', encoding='utf-8') as f:
+        filas_modo = list(csv.reader(f))
+    assert filas_modo[0] == ['timestamp', 'tiempo_transcurrido', 'datos_modo', 'datos_iteracion']
+    assert [fila[3] for fila in filas_modo[1:]] == ['0', '50', '100', '150']
+    
+    # Logs antiguos sin índice: columnas descubiertas en una primera pasada
+    legado = Path(__file__).parent / 'logs' / '20251124_154658_telemetria.json'
+    if legado.exists():
+        assert convertir_a_csv(legado, "test_export_legado.csv") is not None
+    print(f"  - {len(filas)} filas conjuntas y {len(filas_modo) - 1} filas MODO")
+
+def test_telemetria_rotacion():
+    """Test: Rotación por tamaño, compresión gzip y retención de logs"""
+    import os
+    import shutil
+    import time
+    from telemetria import aplicar_retencion, leer_eventos
+    
+    directorio = Path("logs_test_rotacion")
+    shutil.rmtree(directorio, ignore_errors=True)
+    directorio.mkdir()
+    try:
+        # Log antiguo que debe caer por retención
+        antiguo = directorio / "20200101_000000_telemetria.jsonl"
+        antiguo.write_text('{}\n')
+        os.utime(antiguo, (time.time() - 40 * 86400,) * 2)
+        
+        tel = SistemaTelemetria(archivo_log="test_rot.json", directorio_logs=str(directorio),
+                                formato='binario', tam_lote=20, tam_max_segmento=2000,
+                                retencion_dias=30)
+        for i in range(500):
+            tel.registrar_evento('SENSORES_IR', {'izq': i % 2, 'cen': 1, 'der': 0})
+        tel.registrar_evento('MODO', {'modo': 'sumo'})
+        tel.cerrar()
+        
+        assert len(tel.segmentos) > 1
+        assert not antiguo.exists()
+        comprimidos = [s for s in tel.segmentos[:-1] if Path(f"{s}.gz").exists()]
+        assert len(comprimidos) == len(tel.segmentos) - 1
+        assert all(not s.exists() for s in tel.segmentos[:-1])
+        
+        # Lectura y consultas a través de segmentos comprimidos
+        eventos = list(tel.leer_eventos())
+        assert len(eventos) == 501
+        assert eventos[-1]['tipo'] == 'MODO'
+        pagina = tel.consultar(tipo='SENSORES_IR', pagina=3, tam_pagina=100)
+        assert pagina['total'] == 500
+        assert [e['datos']['izq'] for e in pagina['eventos'][:2]] == [0, 1]
+        
+        # Archivo único con la sesión completa (una sola cabecera)
+        completo = tel.exportar_sesion()
+        assert len(list(leer_eventos(completo))) == 501
+        
+        # Retención por tamaño: se conservan siempre los archivos excluidos
+        borrados = aplicar_retencion(directorio, max_bytes=1, excluir=[tel.archivo])
+        assert tel.archivo.exists() and len(borrados) > 0
+        print(f"  - {len(tel.segmentos)} segmentos, {len(comprimidos)} comprimidos")
+    finally:
+        shutil.rmtree(directorio, ignore_errors=True)
+
+def test_telemetria_muestreo():
+    """Test: Políticas de muestreo por tipo y contadores de suprimidos"""
+    from telemetria import SoloCambios, CadaN, TasaMaxima, Reservorio, PorCambioDe
+    
+    # Políticas aisladas con tiempos sintéticos
+    cambios = SoloCambios(refresco=1.0)
+    lecturas = [{'izq': 1}, {'izq': 1}, {'izq': 0}, {'izq': 0}, {'izq': 0}]
+    admitidos = [cambios.admitir(d, i * 100_000_000) for i, d in enumerate(lecturas)]
+    assert admitidos == [True, False, True, False, False]
+    assert cambios.admitir({'izq': 0}, 2_000_000_000)  # Refresco tras 1 s
+    assert (cambios.observados, cambios.suprimidos) == (6, 3)
+    
+    cada = CadaN(10)
+    assert sum(cada.admitir({}, i) for i in range(100)) == 10
+    
+    tasa = TasaMaxima(5)  # 1000 eventos en 2 s -> 10 registrados
+    assert sum(tasa.admitir({}, i * 2_000_000) for i in range(1000)) == 10
+    
+    # Sumo: los ticks de ATACAR se limitan, los cambios de estado nunca
+    sumo = PorCambioDe('estado', TasaMaxima(5))
+    estados = ['ATACAR'] * 3 + ['RETROCEDER', 'GIRAR', 'ATACAR', 'ATACAR']
+    admitidos = [sumo.admitir({'estado': e}, i * 50_000_000) for i, e in enumerate(estados)]
+    assert admitidos == [True, False, False, True, True, True, False]
+    assert sumo.suprimidos == 3 and sumo.politica.observados == 7
+    
+    reservorio = Reservorio(3, ventana=1.0, semilla=1)
+    por_ventana = [0] * 5
+    for i in range(500):  # 100 eventos por ventana de 1 s
+        if reservorio.admitir({}, i * 10_000_000):
+            por_ventana[i // 100] += 1
+    assert por_ventana[1:] == [3, 3, 3, 3]
+    assert reservorio.suprimidos == 500 - sum(por_ventana)
+    
+    # Integración: estadísticas y registro en el log de lo suprimido
+    tel = SistemaTelemetria(archivo_log="test_muestreo.json",
+                            muestreo={'SENSORES_IR': SoloCambios()})
+    for i in range(300):
+        tel.registrar_evento('SENSORES_IR', {'izq': int(i >= 150), 'cen': 1, 'der': 0})
+    tel.configurar_muestreo('MOVIMIENTO', CadaN(3))
+    for _ in range(9):
+        tel.registrar_evento('MOVIMIENTO', {'accion': 'avanzar', 'velocidad': 50})
+    
+    stats = tel.obtener_estadisticas()
+    assert stats['eventos_por_tipo'] == {'SENSORES_IR': 2, 'MOVIMIENTO': 3}
+    assert stats['tipos']['SENSORES_IR']['suprimidos'] == 298
+    assert stats['eventos_suprimidos'] == 298 + 6
+    assert 'suprimidos por muestreo' in tel.generar_reporte()
+    
+    tel.cerrar()
+    resumen = [e for e in tel.leer_eventos() if e['tipo'] == 'MUESTREO']
+    assert resumen[0]['datos']['SENSORES_IR']['observados'] == 300
+    print(f"  - {stats['eventos_suprimidos']} eventos suprimidos de {stats['eventos_suprimidos'] + 5}")
+
+def test_telemetria_timestamps():
+    """Test: Timestamps monotónicos con ISO diferido (micro-benchmark)"""
+    import datetime
+    import time
+    
+    n = 20000
+    inicio_sesion = datetime.datetime.now()
+    datos = {'izq': 0, 'cen': 1, 'der': 0}
+    
+    # Antes: dos llamadas a now(), cadena ISO y timedelta por evento
+    t0 = time.perf_counter()
+    for _ in range(n):
+        evento = {
+            'timestamp': datetime.datetime.now().isoformat(),
+            'tiempo_transcurrido': (datetime.datetime.now() - inicio_sesion).total_seconds(),
+            'tipo': 'SENSORES_IR',
+            'datos': datos
+        }
+    antes_us = (time.perf_counter() - t0) / n * 1e6
+    
+    # Ahora: un entero monotónico por evento
+    t0 = time.perf_counter()
+    for _ in range(n):
+        evento = ('SENSORES_IR', time.monotonic_ns(), datos)
+    ahora_us = (time.perf_counter() - t0) / n * 1e6
+    assert ahora_us < antes_us, (ahora_us, antes_us)
+    
+    tel = SistemaTelemetria(archivo_log="test_timestamps.json", capacidad_memoria=n)
+    t0 = time.perf_counter()
+    for _ in range(n):
+        tel.registrar_evento('SENSORES_IR', datos)
+    registro_us = (time.perf_counter() - t0) / n * 1e6
+    
+    # La materialización diferida conserva el formato del log
+    tel.guardar()
+    eventos = list(tel.leer_eventos())
+    assert len(eventos) == n
+    instante = datetime.datetime.fromisoformat(eventos[-1]['timestamp'])
+    assert abs((instante - datetime.datetime.now()).total_seconds()) < 60
+    assert 0 <= eventos[0]['tiempo_transcurrido'] <= eventos[-1]['tiempo_transcurrido']
+    assert tel.obtener_ultimos_eventos(1)[0] == eventos[-1]
+    
+    # limpiar() reinicia los tiempos en memoria, no el ancla del log e índice
+    tel = SistemaTelemetria(archivo_log="test_limpiar.json", formato='binario')
+    for _ in range(5):
+        tel.registrar_evento('SENSORES_IR', datos)
+    time.sleep(0.3)
+    tel.limpiar()
+    for _ in range(5):
+        tel.registrar_evento('SENSORES_IR', datos)
+    assert tel.obtener_ultimos_eventos(1)[0]['tiempo_transcurrido'] < 0.25
+    assert tel.obtener_estadisticas()['tipos']['SENSORES_IR']['primer_evento'] < 0.25
+    assert tel.consultar(desde=0, hasta=0.1)['total'] == 5
+    despues = tel.consultar(desde=0.25, hasta=10.0)
+    assert despues['total'] == 5
+    assert all(e['tiempo_transcurrido'] >= 0.25 for e in despues['eventos'])
+    print(f"  - Timestamp por evento: {antes_us:.2f} us antes, {ahora_us:.2f} us ahora")
+    print(f"  - registrar_evento completo (síncrono, JSONL): {registro_us:.2f} us")
+
 def test_calibrador_creacion():
     """Test: Crear calibrador de sensores"""
     if MODO_SIMULACION:
-        import RPi.GPIO as GPIO
+        from hal_gpio import GPIO
         GPIO.setmode(GPIO.BCM)
     
     cal = CalibradorSensores(5, 6, 13)
@@ -186,7 +598,7 @@ def test_calibrador_creacion():
 def test_sensor_color_creacion():
     """Test: Crear sensor de color"""
     if MODO_SIMULACION:
-        import RPi.GPIO as GPIO
+        from hal_gpio import GPIO
         GPIO.setmode(GPIO.BCM)
     
     sensor = SensorColor(17, 27, 22, 23, 24)
@@ -196,7 +608,7 @@ def test_sensor_color_creacion():
 def test_sensor_color_lectura():
     """Test: Leer valores RGB del sensor"""
     if MODO_SIMULACION:
-        import RPi.GPIO as GPIO
+        from hal_gpio import GPIO
         GPIO.setmode(GPIO.BCM)
     
     sensor = SensorColor(17, 27, 22, 23, 24)
@@ -210,7 +622,7 @@ def test_sensor_color_lectura():
 def test_pinza_creacion():
     """Test: Crear control de pinza"""
     if MODO_SIMULACION:
-        import RPi.GPIO as GPIO
+        from hal_gpio import GPIO
         GPIO.setmode(GPIO.BCM)
     
     pinza = ControlPinza(18)
@@ -220,7 +632,7 @@ def test_pinza_creacion():
 def test_pinza_movimiento():
     """Test: Mover pinza a diferentes ángulos"""
     if MODO_SIMULACION:
-        import RPi.GPIO as GPIO
+        from hal_gpio import GPIO
         GPIO.setmode(GPIO.BCM)
     
     pinza = ControlPinza(18, angulo_abierto=90, angulo_cerrado=0)
@@ -236,7 +648,7 @@ def test_pinza_movimiento():
 def test_indicadores_creacion():
     """Test: Crear sistema de indicadores LED"""
     if MODO_SIMULACION:
-        import RPi.GPIO as GPIO
+        from hal_gpio import GPIO
         GPIO.setmode(GPIO.BCM)
     
     leds = SistemaIndicadores(26, 19, 13)
@@ -246,7 +658,7 @@ def test_indicadores_creacion():
 def test_indicadores_estados():
     """Test: Cambiar estados de LEDs"""
     if MODO_SIMULACION:
-        import RPi.GPIO as GPIO
+        from hal_gpio import GPIO
         GPIO.setmode(GPIO.BCM)
     
     leds = SistemaIndicadores(26, 19, 13)
@@ -258,6 +670,1032 @@ def test_indicadores_estados():
     
     print(f"  - {len(estados)} estados probados correctamente")
 
+class RelojSimulado:
+    """Reloj monotónico manual para probar el planificador sin esperas"""
+    
+    def __init__(self):
+        self.ahora = 100.0
+    
+    def __call__(self):
+        return self.ahora
+    
+    def dormir(self, segundos):
+        assert segundos >= 0
+        self.ahora += segundos
+
+def test_planificador_sin_deriva():
+    """Test: Instantes límite absolutos sin deriva con trabajo variable"""
+    reloj = RelojSimulado()
+    plan = PlanificadorPeriodico(frecuencia=200, reloj=reloj, dormir=reloj.dormir)
+    
+    for i in range(1000):
+        reloj.ahora += 0.001 * (i % 4)  # Trabajo de 0 a 3 ms
+        assert plan.esperar()
+    
+    # 1000 ciclos de 5 ms = 5 s exactos, sin acumular el tiempo de trabajo
+    assert abs(reloj.ahora - 105.0) < 1e-6
+    assert plan.retrasos == 0
+    assert abs(plan.frecuencia_real() - 200) < 1e-6
+    print(f"  - {plan.ciclos} ciclos a {plan.frecuencia_real():.1f} Hz")
+
+def test_planificador_retrasos():
+    """Test: Políticas saltar y recuperar ante ciclos retrasados"""
+    # Saltar: se descartan los ciclos perdidos y se conserva la fase
+    reloj = RelojSimulado()
+    plan = PlanificadorPeriodico(periodo=0.01, reloj=reloj, dormir=reloj.dormir)
+    reloj.ahora += 0.035  # Retraso de 2.5 periodos
+    assert not plan.esperar()
+    assert plan.ciclos_saltados == 2
+    assert abs(reloj.ahora - 100.04) < 1e-9
+    assert plan.esperar() and abs(reloj.ahora - 100.05) < 1e-9
+    
+    # Recuperar: los ciclos siguientes no esperan hasta alcanzar la rejilla
+    reloj = RelojSimulado()
+    plan = PlanificadorPeriodico(periodo=0.01, politica='recuperar',
+                                 reloj=reloj, dormir=reloj.dormir)
+    reloj.ahora += 0.025
+    assert not plan.esperar() and abs(reloj.ahora - 100.025) < 1e-9
+    assert not plan.esperar()  # Límite 100.02 ya pasado
+    assert plan.esperar() and abs(reloj.ahora - 100.03) < 1e-9
+    assert plan.retrasos == 2 and plan.ciclos_saltados == 0
+    
+    # Más retraso que max_recuperar: se salta en lugar de recuperar
+    reloj.ahora += 0.105
+    assert not plan.esperar()
+    assert plan.ciclos_saltados == 9
+    assert abs(plan.retraso_max - 0.095) < 1e-9
+    
+    # Maniobra bloqueante deliberada: resincronizar no cuenta como retraso
+    reloj.ahora += 1.0
+    plan.resincronizar()
+    assert plan.esperar()
+    print(f"  - {plan.retrasos} retrasos, {plan.ciclos_saltados} ciclos saltados")
+
+def test_metricas_histograma():
+    """Test: Histograma logarítmico de latencias y percentiles"""
+    hist = HistogramaLatencia()
+    assert hist.a_dict()['p50_us'] is None
+    
+    for _ in range(90):
+        hist.registrar_ns(1_500_000)   # 1.5 ms
+    for _ in range(10):
+        hist.registrar_ns(30_000_000)  # 30 ms
+    
+    resumen = hist.a_dict()
+    assert resumen['muestras'] == 100
+    assert resumen['min_us'] == 1500 and resumen['max_us'] == 30000
+    assert resumen['p50_us'] == 2048   # Límite de la cubeta [1024, 2048) µs
+    assert resumen['p99_us'] == 30000  # Acotado por el máximo observado
+    assert sum(c['conteo'] for c in resumen['cubetas']) == 100
+    
+    hist.registrar_ns(10**12)  # Fuera de rango: última cubeta
+    assert hist.conteos[-1] == 1
+    hist.reiniciar()
+    assert hist.total == 0 and sum(hist.conteos) == 0
+    print(f"  - p50 {resumen['p50_us']} µs, p99 {resumen['p99_us']} µs")
+
+def test_metricas_lazo():
+    """Test: Duración, jitter y latencia medidos por el planificador"""
+    reloj = RelojSimulado()
+    registro = RegistroMetricas()
+    metricas = registro.lazo('linea_pid', 0.01)
+    metricas._reloj_ns = lambda: int(round(reloj.ahora * 1e9))
+    plan = PlanificadorPeriodico(periodo=0.01, reloj=reloj, dormir=reloj.dormir,
+                                 metricas=metricas)
+    
+    for i in range(100):
+        reloj.ahora += 0.001  # Lectura de sensores
+        metricas.marcar_lectura()
+        reloj.ahora += 0.002  # Cálculo y actuación
+        metricas.marcar_actuacion()
+        if i == 50:
+            reloj.ahora += 0.02  # Ciclo retrasado
+        plan.esperar()
+    
+    resumen = registro.a_dict()['linea_pid']
+    assert resumen['periodo_us'] == 10000
+    assert resumen['duracion']['muestras'] == 100
+    assert resumen['duracion']['min_us'] == 3000
+    assert resumen['latencia']['p50_us'] == 2000 and resumen['latencia']['muestras'] == 100
+    assert resumen['jitter']['p50_us'] <= 1  # Ciclos a tiempo: sin desviación
+    assert resumen['jitter']['max_us'] >= 10000  # El ciclo retrasado
+    
+    registro.reiniciar()
+    assert registro.a_dict()['linea_pid']['duracion']['muestras'] == 0
+    print(f"  - duración p99 {resumen['duracion']['p99_us']} µs, jitter máx {resumen['jitter']['max_us']} µs")
+
+def test_motores_escrituras_evitadas():
+    """Test: Los motores solo escriben en el GPIO cuando algo cambia"""
+    from hal_gpio import GPIO
+    anterior = hal_gpio.backend_actual()
+    sim = hal_gpio.seleccionar_backend(hal_gpio.BackendSimulado())
+    GPIO.setmode(GPIO.BCM)
+    
+    def llamadas():
+        return [(op, pin, valor) for _, op, pin, valor in sim.historial]
+    
+    try:
+        traccion = TraccionDiferencial(Motor(17, 27, 22), Motor(23, 24, 25, cuantizacion=5))
+        sim.historial.clear()
+        
+        traccion.mover(80, 80)
+        assert len(llamadas()) == 6  # Primera orden: 4 pines + 2 duty
+        
+        sim.historial.clear()
+        for _ in range(100):
+            traccion.mover(80, 80)
+        assert llamadas() == []  # Orden repetida: ninguna llamada al GPIO
+        
+        # Solo cambia el duty del motor izquierdo
+        traccion.mover(60, 81)  # 81 se cuantiza a 80 en el derecho
+        assert llamadas() == [('pwm', 22, 60)]
+        
+        # Cambio de sentido del derecho: sus dos pines, mismo duty
+        sim.historial.clear()
+        traccion.mover(60, -80)
+        assert llamadas() == [('output', 23, GPIO.LOW), ('output', 24, GPIO.HIGH)]
+        
+        sim.historial.clear()
+        traccion.detener()
+        traccion.detener()
+        assert len(llamadas()) == 4  # A/B a LOW donde hacía falta y duty 0
+        
+        stats = traccion.estadisticas()
+        assert stats['escrituras'] == 13
+        assert stats['escrituras_evitadas'] == 6 * 105 - 13  # 105 órdenes de 6 escrituras
+        print(f"  - {stats['escrituras']} escrituras, {stats['escrituras_evitadas']} evitadas "
+              f"({stats['porcentaje_evitadas']:.1f}%)")
+    finally:
+        hal_gpio.seleccionar_backend(anterior)
+
+def test_hal_gpio_simulado():
+    """Test: Backend simulado (pull-ups, flancos con marca de tiempo, dispositivos)"""
+    sim = hal_gpio.BackendSimulado()
+    sim.setmode(hal_gpio.BCM)
+    sim.setup(5, hal_gpio.IN, pull_up_down=hal_gpio.PUD_UP)
+    sim.setup(6, hal_gpio.IN)
+    sim.setup(20, hal_gpio.OUT)
+    assert sim.input(5) == hal_gpio.HIGH and sim.input(6) == hal_gpio.LOW
+    
+    try:
+        sim.output(6, 1)
+        assert False, "Escribir en una entrada debería fallar"
+    except RuntimeError:
+        pass
+    
+    flancos = []
+    manejador = sim.agregar_callback_flanco(6, hal_gpio.RISING, lambda p, n, t: flancos.append((p, n, t)))
+    sim.simular_entrada(6, 1, retardo=0.001)
+    sim.simular_entrada(6, 1, retardo=0.001)  # Sin cambio: no hay flanco
+    sim.simular_entrada(6, 0, retardo=0.001)  # Bajada: no coincide
+    sim.simular_entrada(6, 1, retardo=0.001)
+    assert flancos == [(6, 1, 1_000_000), (6, 1, 4_000_000)]
+    manejador.cancelar()
+    sim.simular_entrada(6, 0)
+    sim.simular_entrada(6, 1)
+    assert len(flancos) == 2
+    
+    # Antirrebote de add_event_detect (ms)
+    pulsos = []
+    sim.add_event_detect(5, hal_gpio.FALLING, callback=pulsos.append, bouncetime=10)
+    for _ in range(5):
+        sim.simular_entrada(5, 0, retardo=0.002)
+        sim.simular_entrada(5, 1, retardo=0.002)
+    assert pulsos == [5, 5]  # Bajadas en 2, 6, 10, 14 y 18 ms: aceptadas 2 y 14
+    sim.remove_event_detect(5)
+    
+    # Dispositivo que responde a una salida (eco de un pulso)
+    sim.conectar(20, lambda s, pin, nivel: s.simular_entrada(21, nivel, retardo=0.0005))
+    sim.output(20, 1)
+    assert sim.input(21) == hal_gpio.HIGH
+    assert sim.escrituras['output'] == 1
+    print(f"  - {len(flancos)} flancos con marca de tiempo, reloj virtual en {sim.tiempo_ns()} ns")
+
+class PigpiodSimulado:
+    """Servidor mínimo del protocolo de socket de pigpiod (para tests)"""
+    
+    def __init__(self):
+        import socket
+        import struct
+        self.struct = struct
+        self.servidor = socket.socket()
+        self.servidor.bind(('127.0.0.1', 0))
+        self.servidor.listen(4)
+        self.puerto = self.servidor.getsockname()[1]
+        self.modos = {}
+        self.pulls = {}
+        self.niveles = 0
+        self.pwm = {}
+        self.tick = 0xFFFFFF00  # Cerca de la vuelta de los 32 bits
+        self.bits = 0
+        self.notificaciones = None
+        self.secuencia = 0
+        import threading
+        threading.Thread(target=self._aceptar, daemon=True).start()
+    
+    def _aceptar(self):
+        import threading
+        while True:
+            try:
+                conexion, _ = self.servidor.accept()
+            except OSError:
+                return
+            threading.Thread(target=self._atender, args=(conexion,), daemon=True).start()
+    
+    def _atender(self, conexion):
+        while True:
+            datos = b''
+            while len(datos) < 16:
+                bloque = conexion.recv(16 - len(datos))
+                if not bloque:
+                    return
+                datos += bloque
+            cmd, p1, p2, p3 = self.struct.unpack('<IIII', datos)
+            resultado = 0
+            if cmd == 0:
+                self.modos[p1] = p2
+            elif cmd == 2:
+                self.pulls[p1] = p2
+            elif cmd == 3:
+                resultado = (self.niveles >> p1) & 1
+            elif cmd == 4:
+                self.niveles = (self.niveles & ~(1 << p1)) | (p2 << p1)
+            elif cmd == 5:
+                self.pwm[p1] = p2
+            elif cmd == 10:
+                resultado = self.niveles
+            elif cmd == 16:
+                resultado = self.tick
+            elif cmd == 19:
+                self.bits = p2
+            elif cmd == 99:
+                self.notificaciones = conexion
+            elif cmd not in (6, 7, 21):
+                resultado = -1
+            conexion.sendall(self.struct.pack('<IIII', cmd, p1, p2, resultado & 0xFFFFFFFF))
+    
+    def cambiar_entrada(self, pin, nivel, avance_us):
+        """Cambia un nivel y envía el informe de notificación"""
+        self.tick = (self.tick + avance_us) & 0xFFFFFFFF
+        self.niveles = (self.niveles & ~(1 << pin)) | (nivel << pin)
+        self.secuencia += 1
+        self.notificaciones.sendall(self.struct.pack('<HHII', self.secuencia, 0, self.tick, self.niveles))
+    
+    def cerrar(self):
+        self.servidor.close()
+
+def test_hal_gpio_pigpio():
+    """Test: Backend pigpio contra un pigpiod simulado (comandos, PWM, flancos)"""
+    import threading
+    demonio = PigpiodSimulado()
+    backend = hal_gpio.BackendPigpio('127.0.0.1', demonio.puerto)
+    try:
+        backend.setmode(hal_gpio.BCM)
+        backend.setup(17, hal_gpio.OUT)
+        backend.setup(4, hal_gpio.IN, pull_up_down=hal_gpio.PUD_UP)
+        assert demonio.modos == {17: 1, 4: 0} and demonio.pulls == {4: 2}
+        
+        backend.output(17, hal_gpio.HIGH)
+        assert backend.input(17) == 1
+        
+        pwm = backend.PWM(18, 500)
+        pwm.start(37.5)
+        assert demonio.pwm[18] == 375  # Rango 1000: resolución de 0.1 %
+        
+        # Flancos con el tick del demonio, incluida la vuelta de los 32 bits
+        flancos = []
+        recibidos = threading.Event()
+        def al_flanco(pin, nivel, t_ns):
+            flancos.append((pin, nivel, t_ns))
+            if len(flancos) == 2:
+                recibidos.set()
+        backend.agregar_callback_flanco(4, hal_gpio.BOTH, al_flanco)
+        t0 = backend.tiempo_ns()
+        demonio.cambiar_entrada(4, 1, 100)
+        demonio.cambiar_entrada(17, 0, 50)   # Pin no vigilado: se ignora
+        demonio.cambiar_entrada(4, 0, 300)   # Tras la vuelta del contador
+        assert recibidos.wait(2)
+        assert [(p, n) for p, n, _ in flancos] == [(4, 1), (4, 0)]
+        assert flancos[0][2] - t0 == 100_000
+        assert flancos[1][2] - flancos[0][2] == 350_000
+        print(f"  - Pulso medido con ticks de pigpiod: {(flancos[1][2] - flancos[0][2]) // 1000} µs")
+    finally:
+        backend.cleanup()
+        demonio.cerrar()
+
+def test_hal_gpio_banco():
+    """Test: Lectura del banco de entradas en una operación (gpiomem, simulado, pigpio)"""
+    import struct
+    import tempfile
+    import os
+    
+    # Registros de /dev/gpiomem sustituidos por un archivo de 4 KB
+    with tempfile.NamedTemporaryFile(delete=False) as archivo:
+        archivo.write(bytes(hal_gpio.BancoGPIO.TAMANO))
+        ruta = archivo.name
+    try:
+        banco = hal_gpio.BancoGPIO(ruta)
+        assert banco.leer() == 0
+        with open(ruta, 'r+b') as archivo:
+            archivo.seek(hal_gpio.BancoGPIO.GPLEV0)
+            archivo.write(struct.pack('<I', (1 << 5) | (1 << 16) | (1 << 21)))
+            archivo.flush()
+        niveles = banco.leer()
+        assert hal_gpio.extraer_bits(niveles, (5, 6, 13, 16, 19, 21)) == (1, 0, 0, 1, 0, 1)
+        
+        inicio = time.perf_counter()
+        for _ in range(10000):
+            banco.leer()
+        lectura_us = (time.perf_counter() - inicio) / 10000 * 1e6
+        banco.cerrar()
+    finally:
+        os.remove(ruta)
+    
+    # Simulador: banco completo; respaldo genérico: pin a pin
+    sim = hal_gpio.BackendSimulado()
+    for pin in (5, 6, 13, 16, 19, 21):
+        sim.setup(pin, hal_gpio.IN)
+    sim.simular_entrada(6, 1)
+    sim.simular_entrada(19, 1)
+    assert sim.leer_banco() == (1 << 6) | (1 << 19)
+    assert hal_gpio.BackendGPIO.leer_banco(sim, (5, 6)) == 1 << 6
+    
+    # pigpio: un único comando BR1
+    demonio = PigpiodSimulado()
+    backend = hal_gpio.BackendPigpio('127.0.0.1', demonio.puerto)
+    try:
+        demonio.niveles = (1 << 13) | (1 << 31)
+        assert backend.leer_banco() == (1 << 13) | (1 << 31)
+    finally:
+        backend.cleanup()
+        demonio.cerrar()
+    print(f"  - Banco mapeado: {lectura_us:.2f} us por lectura de los 32 pines")
+
+def test_ultrasonico_flancos():
+    """Test: Sensor ultrasónico por flancos (medida, sin eco, obsoleta, coste de leer)"""
+    from ultrasonico import SensorUltrasonico, ESTADO_OK, ESTADO_SIN_ECO, ESTADO_OBSOLETA, ESTADO_SIN_DATOS
+    anterior = hal_gpio.backend_actual()
+    sim = hal_gpio.seleccionar_backend(hal_gpio.BackendSimulado())
+    try:
+        sensor = SensorUltrasonico(20, 21, frecuencia=16, reloj_ns=sim.tiempo_ns)
+        assert sensor.leer().estado == ESTADO_SIN_DATOS
+        
+        # HC-SR04 simulado: al bajar el trigger, eco de ida y vuelta a `distancia` cm
+        distancia = [30.0]
+        def hc_sr04(simulador, pin, nivel):
+            if nivel == 0 and distancia[0] is not None:
+                simulador.simular_entrada(21, 1, retardo=0.0005)
+                simulador.simular_entrada(21, 0, retardo=2 * distancia[0] / 34300)
+        sim.conectar(20, hc_sr04)
+        
+        sensor.disparar()
+        medicion = sensor.leer()
+        assert medicion.estado == ESTADO_OK and medicion.valida
+        assert abs(medicion.distancia - 30.0) < 0.01
+        
+        # Sin eco: se publica en el siguiente disparo, sin bloquear
+        distancia[0] = None
+        sensor.disparar()
+        assert sensor.leer().valida  # Aún vale la medida anterior
+        sim.avanzar(0.0625)
+        sensor.disparar()
+        assert sensor.leer().estado == ESTADO_SIN_ECO and sensor.leer().distancia is None
+        
+        # Eco fuera de alcance (pulso de 38 ms del HC-SR04 sin obstáculo)
+        distancia[0] = 38e-3 * 34300 / 2
+        sensor.disparar()
+        assert sensor.leer().estado == ESTADO_SIN_ECO
+        
+        # Medida antigua: obsoleta tras tres periodos
+        distancia[0] = 45.0
+        sensor.disparar()
+        sim.avanzar(0.2)
+        medicion = sensor.leer()
+        assert medicion.estado == ESTADO_OBSOLETA and not medicion.valida
+        assert abs(medicion.distancia - 45.0) < 0.01
+        assert sensor.estadisticas()['mediciones'] == 2
+        
+        # Eco corto con RPi.GPIO: los dos callbacks leen el pin ya a LOW
+        distancia[0] = None  # El HC-SR04 simulado no responde: flancos a mano
+        sensor.disparar()
+        t_ns = sim.tiempo_ns()
+        sensor._al_flanco(21, 0, t_ns + 500000)
+        sensor._al_flanco(21, 0, t_ns + 500000 + int(2 * 8.0 / 34300 * 1e9))
+        medicion = sensor.leer()
+        assert medicion.valida and abs(medicion.distancia - 8.0) < 0.01, medicion
+        
+        inicio = time.perf_counter()
+        for _ in range(10000):
+            sensor.leer()
+        leer_us = (time.perf_counter() - inicio) / 10000 * 1e6
+        assert leer_us < 50
+        sensor.detener()
+        print(f"  - leer(): {leer_us:.2f} us, {sensor.sin_eco} disparos sin eco")
+    finally:
+        hal_gpio.seleccionar_backend(anterior)
+
+def test_ultrasonico_filtro():
+    """Test: Mediana con ecos espurios, velocidad de acercamiento y edad"""
+    from ultrasonico import SensorUltrasonico, FiltroDistancia, ESTADO_OK, ESTADO_SIN_ECO, ESTADO_OBSOLETA
+    
+    # Sin objetivo: un eco espurio aislado no crea uno
+    filtro = FiltroDistancia(ventana=5)
+    for i, d in enumerate([None, None, 25.0, None, None]):
+        estimacion = filtro.agregar(i * 62_500_000, d)
+    assert estimacion.estado == ESTADO_SIN_ECO and estimacion.distancia is None
+    
+    # Objetivo acercándose a 50 cm/s con un eco atípico en medio
+    filtro = FiltroDistancia(ventana=5)
+    for i, d in enumerate([80.0, 76.875, 5.0, 70.625, 67.5]):
+        estimacion = filtro.agregar(i * 62_500_000, d)
+    assert estimacion.estado == ESTADO_OK
+    assert estimacion.distancia == 70.625
+    assert abs(estimacion.velocidad - 50.0) < 0.5
+    assert filtro.atipicas == 1
+    
+    # Sensor: estimación publicada por el hilo de disparo, con edad al leer
+    anterior = hal_gpio.backend_actual()
+    sim = hal_gpio.seleccionar_backend(hal_gpio.BackendSimulado())
+    try:
+        sensor = SensorUltrasonico(20, 21, frecuencia=16, reloj_ns=sim.tiempo_ns)
+        distancias = iter([40.0, 40.0, 3.0, 40.0, 40.0])
+        def hc_sr04(simulador, pin, nivel):
+            if nivel == 0:
+                simulador.simular_entrada(21, 1, retardo=0.0005)
+                simulador.simular_entrada(21, 0, retardo=2 * next(distancias) / 34300)
+        sim.conectar(20, hc_sr04)
+        for _ in range(5):
+            sensor.disparar()
+            sim.avanzar(0.0625)
+        estimacion = sensor.distancia_actual()
+        assert estimacion.valida and estimacion.distancia == sensor.leer().distancia
+        assert abs(estimacion.distancia - 40.0) < 0.01 and estimacion.muestras == 5
+        assert 0.06 < estimacion.edad < 0.07
+        sim.avanzar(0.2)
+        assert sensor.distancia_actual().estado == ESTADO_OBSOLETA
+        
+        inicio = time.perf_counter()
+        for _ in range(10000):
+            sensor.distancia_actual()
+        lectura_us = (time.perf_counter() - inicio) / 10000 * 1e6
+        sensor.detener()
+        print(f"  - distancia_actual(): {lectura_us:.2f} us, atípicas {sensor.estadisticas()['atipicas']}")
+    finally:
+        hal_gpio.seleccionar_backend(anterior)
+
+def test_sensores_linea_flancos():
+    """Test: Sensores IR por flancos y despertar anticipado del lazo"""
+    import threading
+    from sensores_linea import SensoresLinea
+    
+    # Planificador: el ciclo extra no desplaza la rejilla
+    reloj = RelojSimulado()
+    eventos = [True]
+    def despertar(timeout):
+        if eventos:
+            reloj.ahora += timeout / 2
+            return eventos.pop()
+        reloj.dormir(timeout)
+        return False
+    plan = PlanificadorPeriodico(periodo=0.1, reloj=reloj, dormir=reloj.dormir, despertar=despertar)
+    assert plan.esperar() and abs(reloj.ahora - 100.05) < 1e-9  # Despertado a mitad
+    eventos.append(True)
+    assert plan.esperar() and abs(reloj.ahora - 100.1) < 1e-9   # Máximo uno por periodo
+    assert plan.esperar() and abs(reloj.ahora - 100.15) < 1e-9
+    assert plan.esperar() and abs(reloj.ahora - 100.2) < 1e-9
+    assert plan.despertares == 2 and plan.retrasos == 0
+    
+    anterior = hal_gpio.backend_actual()
+    sim = hal_gpio.seleccionar_backend(hal_gpio.BackendSimulado())
+    try:
+        sensores = SensoresLinea(5, 6, 13)
+        for pin in (5, 6, 13):
+            sim.simular_entrada(pin, 1)
+        assert sensores.leer() == (1, 1, 1)
+        
+        sim.simular_entrada(6, 0, retardo=0.010)
+        assert sensores.leer() == (1, 0, 1)
+        assert sensores.ultimo_flanco_ns() == sim.tiempo_ns()
+        assert not sensores.esperar_cambio(0.001)  # Nada nuevo desde la lectura
+        
+        # Lazo real a 10 Hz: cada transición se atiende antes del siguiente tick
+        planificador = PlanificadorPeriodico(frecuencia=10, despertar=sensores.esperar_cambio)
+        vistos = []
+        fin = threading.Event()
+        def lazo():
+            ultimo = sensores.leer()
+            while not fin.is_set():
+                planificador.esperar()
+                actual = sensores.leer()
+                if actual != ultimo:
+                    vistos.append(time.perf_counter())
+                    ultimo = actual
+        hilo = threading.Thread(target=lazo)
+        hilo.start()
+        
+        latencias = []
+        for nivel in (1, 0, 1):
+            time.sleep(0.13)
+            inyectado = time.perf_counter()
+            sim.simular_entrada(6, nivel)
+            limite = time.perf_counter() + 1
+            while len(vistos) < len(latencias) + 1 and time.perf_counter() < limite:
+                time.sleep(0.0005)
+            latencias.append((vistos[-1] - inyectado) * 1000)
+        fin.set()
+        hilo.join()
+        sensores.detener()
+        
+        assert max(latencias) < 30, latencias  # Frente a hasta 100 ms por sondeo
+        assert planificador.despertares >= 3
+        print(f"  - Reacción a transiciones: máx {max(latencias):.1f} ms (periodo 100 ms)")
+    finally:
+        hal_gpio.seleccionar_backend(anterior)
+
+def test_estado_compartido():
+    """Test: Bloque de estado en memoria compartida con seqlock"""
+    import multiprocessing
+    import os
+    from estado_compartido import BloqueEstado, BIT_IR_CEN, BIT_BORDE_DER
+    
+    nombre = f'robot_asti_test_{os.getpid()}'
+    bloque = BloqueEstado(nombre, crear=True)
+    lector = BloqueEstado(nombre)
+    try:
+        inicial = lector.leer()
+        assert inicial.modo == 'manual' and inicial.ciclos == 0 and inicial.edad is None
+        
+        bloque.escribir(modo='sumo', activo=True, velocidad=70)
+        bloque.escribir(ciclo=True, sensores=(1 << BIT_IR_CEN) | (1 << BIT_BORDE_DER),
+                        distancia=None, estado_distancia='sin_eco', duty_izq=-40, duty_der=40)
+        instantanea = lector.leer()
+        assert instantanea.resumen() == {'modo': 'sumo', 'velocidad': 70, 'activo': True}
+        assert instantanea.sensor(BIT_IR_CEN) == 1 and instantanea.sensor(BIT_BORDE_DER) == 1
+        assert instantanea.ciclos == 1 and instantanea.t_ciclo_ns == instantanea.t_ns
+        assert (instantanea.duty_izq, instantanea.duty_der) == (-40, 40)
+        assert instantanea.a_dict()['distancia'] is None
+        assert instantanea.estado_distancia == 'sin_eco'
+        assert instantanea.secuencia == 4
+        
+        # Escritor en otro proceso: ninguna lectura debe ver una escritura a medias
+        bloque.escribir(duty_izq=0, duty_der=0, distancia=0)
+        def escritor(n):
+            for i in range(n):
+                bloque.escribir(ciclo=True, duty_izq=i, duty_der=i, distancia=i)
+        proceso = multiprocessing.get_context('fork').Process(target=escritor, args=(20000,))
+        proceso.start()
+        lecturas = 0
+        while proceso.is_alive() or lecturas == 0:
+            leida = lector.leer()
+            assert leida.duty_izq == leida.duty_der == leida.distancia, leida
+            lecturas += 1
+        proceso.join()
+        final = lector.leer()
+        assert final.ciclos == 20001 and final.duty_izq == 19999
+        
+        # Escritor muerto a mitad de escritura: el lector no se queda colgado
+        bloque._secuencia[0] += 1
+        try:
+            lector.leer()
+            assert False, "Debería detectar el bloque inconsistente"
+        except RuntimeError:
+            pass
+        bloque._secuencia[0] += 1
+        print(f"  - {lecturas} lecturas consistentes durante 20000 escrituras concurrentes")
+    finally:
+        lector.cerrar()
+        bloque.cerrar()
+    
+    try:
+        BloqueEstado(nombre)
+        assert False, "El dueño debería eliminar el bloque al cerrarlo"
+    except FileNotFoundError:
+        pass
+
+def test_buzon_comandos():
+    """Test: Buzón de comandos (el último gana, descarte por secuencia)"""
+    import threading
+    from buzon_comandos import BuzonComandos
+    
+    buzon = BuzonComandos()
+    assert buzon.depositar('F', 1)
+    assert buzon.depositar('S', 2)          # Sustituye a F sin ejecutarlo
+    assert not buzon.depositar('L', 1)      # Llega tarde: obsoleto
+    orden = buzon.tomar(timeout=0)
+    assert (orden.secuencia, orden.cmd) == (2, 'S') and buzon.vigente(orden)
+    assert buzon.tomar(timeout=0) is None
+    
+    buzon.depositar('R', 3)
+    buzon.invalidar(4)                      # Un cambio de modo aplicado después
+    assert buzon.tomar(timeout=0) is None
+    assert not buzon.vigente(orden)         # Retirada antes, ya superada
+    assert (buzon.sustituidos, buzon.obsoletos) == (1, 3)
+    
+    # Actuación lenta (20 ms) frente a una ráfaga de 200 comandos: sin cola
+    ejecutados = []
+    def actuar():
+        while True:
+            orden = buzon.tomar()
+            if orden is None:
+                return
+            if buzon.vigente(orden):
+                time.sleep(0.02)
+                ejecutados.append(orden.cmd)
+                buzon.registrar_actuacion(orden)
+    hilo = threading.Thread(target=actuar)
+    hilo.start()
+    for i in range(200):
+        buzon.depositar(f'V{i}', 10 + i)
+        time.sleep(0.001)
+    limite = time.monotonic() + 2
+    while (not ejecutados or ejecutados[-1] != 'V199') and time.monotonic() < limite:
+        time.sleep(0.01)
+    buzon.cerrar()
+    hilo.join(timeout=1)
+    assert not hilo.is_alive()
+    
+    assert ejecutados[-1] == 'V199'
+    assert len(ejecutados) < 200 / 4
+    latencia = buzon.estadisticas()['latencia']
+    assert latencia['max_us'] < 200000  # Acotada por un comando, no por la ráfaga
+    print(f"  - {len(ejecutados)} de 200 comandos ejecutados, latencia máx. "
+          f"{latencia['max_us'] / 1000:.1f} ms")
+
+def test_supervisor_modos():
+    """Test: Supervisor de modos (un solo hilo, cancelación y latencia de cambio)"""
+    import threading
+    from supervisor_modos import SupervisorModos
+    from planificador import PlanificadorPeriodico
+    
+    cambios = []
+    paradas = []
+    en_marcha = []
+    maximo_simultaneos = [0]
+    
+    def modo_lazo(token):
+        en_marcha.append(1)
+        maximo_simultaneos[0] = max(maximo_simultaneos[0], len(en_marcha))
+        planificador = PlanificadorPeriodico(frecuencia=2, cancelacion=token)  # Periodo de 500 ms
+        while not token.cancelado:
+            planificador.esperar()
+        en_marcha.pop()
+    
+    def modo_esperas(token):
+        for _ in range(3):
+            if token.esperar(5):
+                return
+    
+    def modo_sordo(token):
+        time.sleep(0.3)  # No comprueba el token
+    
+    def modo_roto(token):
+        raise ValueError("fallo simulado")
+    
+    iniciados = []
+    supervisor = SupervisorModos(0.02, al_parar=lambda: paradas.append(1),
+                                 al_cambiar=cambios.append,
+                                 al_iniciar=lambda: iniciados.append(threading.current_thread().name))
+    latencias = []
+    for _ in range(5):  # Reelegir el mismo modo no deja dos lazos
+        latencias.append(supervisor.activar('linea', modo_lazo))
+        time.sleep(0.05)
+    latencias.append(supervisor.activar('logistica', modo_esperas))
+    time.sleep(0.05)
+    latencias.append(supervisor.activar('sumo', modo_lazo))
+    time.sleep(0.05)
+    latencias.append(supervisor.detener())
+    
+    assert maximo_simultaneos[0] == 1 and not en_marcha
+    assert not supervisor.activo and supervisor.modo is None
+    assert len(paradas) == len(cambios) == 8
+    assert iniciados == ['modo_linea'] * 5 + ['modo_logistica', 'modo_sumo']  # En su hilo
+    assert cambios[5] == dict(cambios[5], de='linea', a='logistica')
+    assert max(latencias) < 0.1, latencias
+    assert supervisor.rezagados == 0
+    
+    # Un modo que no comprueba el token no retrasa el cambio más del límite
+    supervisor.activar('sordo', modo_sordo)
+    latencia = supervisor.activar('sumo', modo_lazo)
+    assert latencia < 0.1 and supervisor.rezagados == 1 and cambios[-1]['rezagado']
+    supervisor.activar('roto', modo_roto)
+    time.sleep(0.05)
+    supervisor.detener()
+    assert supervisor.errores == 1
+    
+    # Un modo lento que rebasa el límite entre su comprobación del token y
+    # su orden a los motores no los vuelve a mover tras la parada
+    from motores import Motor, TraccionDiferencial
+    from supervisor_modos import token_actual
+    traccion = TraccionDiferencial(Motor(17, 27, 22), Motor(23, 24, 25), token_actual=token_actual)
+    supervisor_motores = SupervisorModos(0.02, al_parar=traccion.detener)
+    comprobado = threading.Event()
+    def modo_lento(token):
+        traccion.mover(60, 60)
+        while not token.cancelado:
+            comprobado.set()
+            time.sleep(0.2)  # Cálculo lento: rebasa el límite de cambio
+            traccion.mover(60, 60)
+    supervisor_motores.activar('lento', modo_lento)
+    assert comprobado.wait(1)
+    hilo_lento = supervisor_motores._hilo
+    supervisor_motores.detener()
+    assert supervisor_motores.rezagados == 1 and traccion.duties() == (0, 0)
+    hilo_lento.join(1)
+    assert traccion.duties() == (0, 0) and traccion.ordenes_obsoletas == 1
+    traccion.mover(40, 40)  # Fuera de un modo (manual) se obedece
+    assert traccion.duties() == (40, 40)
+    
+    estadisticas = supervisor.estadisticas()
+    assert estadisticas['cambios'] == 12
+    print(f"  - Cambio de modo: p50 {estadisticas['latencia']['p50_us']} µs, "
+          f"máx. {estadisticas['latencia']['max_us']} µs (límite 20 ms)")
+
+def test_estrategia_sumo():
+    """Test: Máquina de estados del sumo (maniobras por ticks, interrumpibles)"""
+    from estrategia_sumo import MaquinaSumo, BUSCAR, ATACAR, RETROCEDER, GIRAR
+    from ultrasonico import EstimacionDistancia
+    
+    nada = EstimacionDistancia(None, None, 'sin_eco', 0, 0, 0.0)
+    def oponente(distancia):
+        return EstimacionDistancia(distancia, 0.0, 'ok', 5, 0, 0.0)
+    
+    maquina = MaquinaSumo()
+    maquina.reiniciar(0.0)
+    
+    # Escape completo sin interrupciones a 20 Hz: 0,4 s atrás y 0,3 s de giro
+    estados = []
+    for tick in range(20):
+        t = tick * 0.05
+        accion = maquina.paso(t, 1 if tick == 0 else 0, 0, nada, 80)
+        estados.append(accion.estado)
+        if tick == 0:
+            assert accion.cambio and (accion.vel_izq, accion.vel_der) == (-80, -80)
+        if accion.estado == GIRAR:
+            assert accion.vel_izq > 0 > accion.vel_der  # Borde izquierdo: gira a la derecha
+    assert estados.count(RETROCEDER) == 8 and estados.count(GIRAR) == 6
+    assert estados[-1] == BUSCAR and maquina.interrupciones == 0
+    
+    # Un borde nuevo durante el giro reinicia el escape hacia el otro lado
+    maquina.reiniciar(0.0)
+    maquina.paso(0.0, 1, 0, nada, 80)
+    maquina.paso(0.45, 0, 0, nada, 80)
+    assert maquina.estado == GIRAR
+    accion = maquina.paso(0.5, 0, 1, nada, 80)
+    assert accion.estado == RETROCEDER and maquina.interrupciones == 1
+    accion = maquina.paso(0.95, 0, 0, nada, 80)
+    assert accion.estado == GIRAR and accion.vel_izq < 0 < accion.vel_der
+    
+    # El oponente interrumpe el escape (tras la marcha atrás mínima)
+    assert maquina.paso(1.0, 0, 0, oponente(40), 80).estado == ATACAR
+    assert maquina.interrupciones == 2
+    maquina.paso(1.05, 1, 0, nada, 80)
+    assert maquina.paso(1.1, 0, 0, oponente(40), 80).estado == RETROCEDER
+    assert maquina.paso(1.25, 0, 0, oponente(40), 80).estado == ATACAR
+    
+    # Ataque: embestida a máxima potencia de cerca; si lo pierde, vuelve a buscar
+    accion = maquina.paso(1.3, 0, 0, oponente(10), 80)
+    assert (accion.vel_izq, accion.vel_der) == (100, 100)
+    assert maquina.paso(1.35, 0, 0, oponente(40), 80)[1:3] == (80, 80)
+    assert maquina.paso(1.4, 0, 0, nada, 80).estado == BUSCAR
+    
+    # Espiral de búsqueda: un segundo a cada lado
+    derecha = maquina.paso(1.9, 0, 0, nada, 50)
+    izquierda = maquina.paso(2.5, 0, 0, nada, 50)
+    assert derecha.vel_izq > 0 > derecha.vel_der and izquierda.vel_izq < 0 < izquierda.vel_der
+    print(f"  - {maquina.transiciones} transiciones, {maquina.interrupciones} maniobras interrumpidas")
+
+def test_seguidor_oponente():
+    """Test: Seguimiento del oponente (Kalman) y ataque por tiempo hasta el contacto"""
+    from seguidor_oponente import (SeguidorOponente, EstimacionOponente, simular_aproximacion,
+                                   ESTADO_PREDICCION, ESTADO_TENTATIVO)
+    from ultrasonico import Medicion, ESTADO_OK, ESTADO_SIN_ECO
+    from estrategia_sumo import MaquinaSumo, ATACAR
+    
+    periodo_ns = 62500000  # 16 Hz
+    def eco(i):
+        return Medicion(100 - 50 * i * periodo_ns / 1e9, ESTADO_OK, i * periodo_ns)
+    
+    seguidor = SeguidorOponente()
+    assert seguidor.actualizar(eco(0), 0).estado == ESTADO_TENTATIVO  # Un eco no basta
+    for i in range(1, 17):
+        estimacion = seguidor.actualizar(eco(i), i * periodo_ns)
+    assert estimacion.valida and abs(estimacion.distancia - 50) < 1, estimacion
+    assert abs(estimacion.velocidad - 50) < 5 and abs(estimacion.ttc - 1.0) < 0.1
+    
+    # Un eco espurio se rechaza sin mover la pista
+    estimacion = seguidor.actualizar(Medicion(250, ESTADO_OK, 17 * periodo_ns), 17 * periodo_ns)
+    assert seguidor.rechazadas == 1 and abs(estimacion.distancia - 100 + 50 * 17 / 16) < 1
+    
+    # Pérdida breve: predicción válida y recuperación con el primer eco
+    for i in range(18, 21):
+        estimacion = seguidor.actualizar(Medicion(None, ESTADO_SIN_ECO, i * periodo_ns),
+                                         i * periodo_ns)
+    assert estimacion.estado == ESTADO_PREDICCION and estimacion.valida
+    assert abs(estimacion.distancia - (100 - 50 * 20 / 16)) < 2
+    assert seguidor.actualizar(eco(21), 21 * periodo_ns).estado == ESTADO_OK
+    assert seguidor.recuperaciones == 1
+    
+    # Sin eco más de t_perdida: oponente perdido
+    estimacion = seguidor.actualizar(Medicion(None, ESTADO_SIN_ECO, 30 * periodo_ns),
+                                     30 * periodo_ns)
+    assert not estimacion.valida and seguidor.perdidas == 1
+    
+    # Potencia de ataque: base lejos del contacto, rampa y embestida
+    maquina = MaquinaSumo()
+    assert maquina.potencia_ataque(float('inf'), 60) == 60
+    assert maquina.potencia_ataque(0.95, 60) == 80
+    assert maquina.potencia_ataque(0.3, 60) == 100
+    maquina.reiniciar(0.0)
+    accion = maquina.paso(0.0, 0, 0, EstimacionOponente(50, 200, ESTADO_OK, 1.0, 0), 60)
+    assert accion.estado == ATACAR and accion.vel_izq == accion.vel_der == 100
+    
+    # Aproximación simulada: Kalman frente a la mediana
+    resultados = [simular_aproximacion(semilla=semilla) for semilla in range(10)]
+    medias = {filtro: {clave: sum(r[filtro][clave] for r in resultados) / len(resultados)
+                       for clave in ('rmse_distancia', 'rmse_velocidad', 'cobertura')}
+              for filtro in ('kalman', 'mediana')}
+    kalman, mediana = medias['kalman'], medias['mediana']
+    assert kalman['rmse_distancia'] < mediana['rmse_distancia'], medias
+    assert kalman['cobertura'] > mediana['cobertura'], medias
+    print(f"  - RMSE distancia: Kalman {kalman['rmse_distancia']:.2f} cm, "
+          f"mediana {mediana['rmse_distancia']:.2f} cm")
+    print(f"  - RMSE acercamiento: Kalman {kalman['rmse_velocidad']:.2f} cm/s, "
+          f"mediana {mediana['rmse_velocidad']:.2f} cm/s")
+    print(f"  - Cobertura: Kalman {kalman['cobertura']:.1f}%, mediana {mediana['cobertura']:.1f}%")
+
+def test_guardia_borde():
+    """Test: Guardia de borde por flancos (anula los motores sin pasar por el lazo)"""
+    import threading
+    from motores import Motor, TraccionDiferencial
+    from guardia_borde import GuardiaBorde
+    
+    anterior = hal_gpio.backend_actual()
+    # Reloj real: la latencia medida es la del código, no la de un reloj virtual
+    sim = hal_gpio.seleccionar_backend(hal_gpio.BackendSimulado(reloj_real=True))
+    try:
+        traccion = TraccionDiferencial(Motor(17, 27, 22), Motor(23, 24, 25))
+        activaciones = []
+        guardia = GuardiaBorde(16, 19, traccion, velocidad=90, t_escape=0.1,
+                               presupuesto=0.005, al_activar=activaciones.append)
+        
+        # Desarmada no hace nada
+        traccion.mover(50, 50)
+        sim.simular_entrada(16, 1)
+        sim.simular_entrada(16, 0)
+        assert traccion.duties() == (50, 50) and guardia.activaciones == 0
+        
+        # Armada, con un lazo que insiste en avanzar
+        guardia.armar()
+        fin = threading.Event()
+        def lazo():
+            while not fin.is_set():
+                traccion.mover(60, 60)
+                time.sleep(0.001)
+        hilo = threading.Thread(target=lazo)
+        hilo.start()
+        try:
+            time.sleep(0.02)
+            assert traccion.duties() == (60, 60)
+            
+            sim.simular_entrada(19, 1)
+            assert traccion.duties() == (-90, -90)  # En el propio callback
+            time.sleep(0.15)
+            assert traccion.duties() == (-90, -90)  # Borde aún visible: sigue
+            assert traccion.ordenes_ignoradas > 0
+            
+            sim.simular_entrada(19, 0)
+            time.sleep(0.2)
+            assert not traccion.anulada and traccion.duties() == (60, 60)
+        finally:
+            fin.set()
+            hilo.join()
+        
+        # Armar sobre el borde actúa sin esperar un flanco
+        guardia.desarmar()
+        sim.simular_entrada(16, 1)
+        guardia.armar()
+        assert traccion.anulada and traccion.duties() == (-90, -90)
+        guardia.desarmar()
+        # Sin órdenes durante la anulación (lazo atascado): para, no vuelve
+        # a la orden previa, que llevaba hacia el borde
+        assert not traccion.anulada and traccion.duties() == (0, 0)
+        
+        # Un fin de escape con la guardia ya desarmada nunca deja la anulación
+        traccion.anular(-90, -90)
+        guardia._fin_escape()
+        assert not traccion.anulada
+        
+        stats = guardia.estadisticas()
+        assert stats['activaciones'] == 2 and len(activaciones) == 2
+        assert [a['pin'] for a in activaciones] == [19, 16]
+        assert stats['excedidos'] == 0, stats
+        print(f"  - Latencia flanco -> motores: {stats['latencia']['max_us']} us "
+              f"(presupuesto {stats['presupuesto_us']} us)")
+        guardia.detener()
+    finally:
+        hal_gpio.seleccionar_backend(anterior)
+
+def test_proceso_control():
+    """Test: Proceso de control separado (comandos, estado compartido, peticiones)"""
+    import threading
+    from control_robot import ProcesoControl
+    
+    # Espera de respuestas que retiene las del hilo 'peticion_lenta'
+    soltar_lenta = threading.Event()
+    lenta_esperando = threading.Event()
+    def esperar(evento, timeout):
+        if threading.current_thread().name == 'peticion_lenta':
+            lenta_esperando.set()
+            soltar_lenta.wait(5)
+        return evento.wait(timeout)
+    
+    control = ProcesoControl(tiempo_real=False, esperar=esperar)
+    info = control.iniciar()
+    assert info['backend'] == hal_gpio.backend_actual().nombre
+    try:
+        assert control.estado.leer().resumen() == {'modo': 'manual', 'velocidad': 80, 'activo': False}
+        assert control.comando('V55')['velocidad'] == 55
+        assert control.estado.leer().velocidad == 55  # Sin pasar por la tubería
+        
+        # Lazo PID en el proceso de control mientras este proceso está ocupado
+        ocupado = threading.Event()
+        def carga_web():
+            while not ocupado.is_set():
+                sum(range(10000))
+        hilo = threading.Thread(target=carga_web)
+        hilo.start()
+        estado = control.comando('M1')
+        assert estado == {'modo': 'linea', 'velocidad': 55, 'activo': True}
+        time.sleep(0.5)
+        control.comando('M3')
+        ocupado.set()
+        hilo.join()
+        
+        instantanea = control.estado.leer()
+        assert instantanea.modo == 'manual' and instantanea.ciclos >= 5, instantanea
+        assert instantanea.comandos == 3
+        
+        lazo = control.llamar('metricas')['lazos']['linea_pid']
+        assert lazo['duracion']['muestras'] >= 5, lazo['duracion']
+        assert control.llamar('estadisticas')['modo'] == 'manual'
+        
+        segmentos = control.llamar('archivos_telemetria', timeout=10)
+        assert segmentos and Path(segmentos[0]).exists()
+        
+        # Ráfaga de la interfaz sin esperar respuesta: solo cuenta la última
+        for i in range(50):
+            control.enviar('S' if i % 2 else 'F')
+        control.enviar('F')
+        control.llamar('estadisticas')  # La tubería ya ha entregado las órdenes
+        limite = time.monotonic() + 2
+        while control.estado.leer().duty_izq != 55 and time.monotonic() < limite:
+            time.sleep(0.01)
+        assert control.estado.leer().duty_izq == 55, control.estado.leer()
+        buzon = control.llamar('metricas')['comandos']
+        assert buzon['recibidos'] == 51
+        assert buzon['ejecutados'] + buzon['sustituidos'] + buzon['obsoletos'] == 51
+        control.comando('M3')
+        assert control.estado.leer().duty_izq == 0
+        
+        # Una petición esperando su respuesta no bloquea órdenes ni peticiones
+        respuestas = []
+        lenta = threading.Thread(target=lambda: respuestas.append(control.llamar('metricas')),
+                                 name='peticion_lenta')
+        lenta.start()
+        assert lenta_esperando.wait(2)
+        inicio = time.perf_counter()
+        control.enviar('S')
+        assert control.comando('V55')['velocidad'] == 55
+        rapida = time.perf_counter() - inicio
+        soltar_lenta.set()
+        lenta.join()
+        assert respuestas and 'lazos' in respuestas[0]
+        assert rapida < 1.0, rapida
+        
+        # Cambio desde logística (esperas de segundos) a línea y a manual
+        control.comando('M4')
+        time.sleep(0.2)
+        control.comando('M1')
+        control.comando('M3')
+        control.comando('M2')
+        time.sleep(0.3)
+        control.comando('M3')
+        metricas_control = control.llamar('metricas')
+        assert metricas_control['lazos']['sumo_mejorado']['duracion']['muestras'] >= 3
+        cambios = metricas_control['cambios_modo']
+        assert cambios['cambios'] == 7 and cambios['rezagados'] == 0, cambios
+        assert cambios['latencia']['max_us'] < 100000, cambios['latencia']
+        
+        try:
+            control.llamar('inexistente')
+            assert False, "Una petición desconocida debería fallar"
+        except RuntimeError:
+            pass
+        print(f"  - {lazo['duracion']['muestras']} ciclos PID en el proceso de control, "
+              f"jitter p99 {lazo['jitter']['p99_us']} µs con carga en el servidor")
+    finally:
+        control.detener()
+    assert not control._proceso.is_alive()
 
 # ===== TESTS DE INTEGRACIÓN =====
 
@@ -278,7 +1716,7 @@ def test_integracion_telemetria_movimiento():
 def test_integracion_sensor_color_pinza():
     """Test: Integración sensor color + pinza"""
     if MODO_SIMULACION:
-        import RPi.GPIO as GPIO
+        from hal_gpio import GPIO
         GPIO.setmode(GPIO.BCM)
     
     sensor = SensorColor(17, 27, 22, 23, 24)
@@ -299,7 +1737,7 @@ def test_integracion_sensor_color_pinza():
 def test_integracion_leds_telemetria():
     """Test: Integración LEDs + telemetría"""
     if MODO_SIMULACION:
-        import RPi.GPIO as GPIO
+        from hal_gpio import GPIO
         GPIO.setmode(GPIO.BCM)
     
     leds = SistemaIndicadores(26, 19, 13)
@@ -320,7 +1758,7 @@ def test_integracion_leds_telemetria():
 def test_simulacion_modo_logistica():
     """Test: Simulación completa del modo logística"""
     if MODO_SIMULACION:
-        import RPi.GPIO as GPIO
+        from hal_gpio import GPIO
         GPIO.setmode(GPIO.BCM)
     
     tel = SistemaTelemetria(archivo_log="test_logistica.json")
@@ -367,7 +1805,7 @@ def test_simulacion_modo_logistica():
 def test_simulacion_calibracion():
     """Test: Simulación de calibración de sensores"""
     if MODO_SIMULACION:
-        import RPi.GPIO as GPIO
+        from hal_gpio import GPIO
         GPIO.setmode(GPIO.BCM)
     
     cal = CalibradorSensores(5, 6, 13)
@@ -435,6 +1873,16 @@ def main():
     runner.ejecutar_test("Telemetría - Registro de eventos", test_telemetria_registro)
     runner.ejecutar_test("Telemetría - Estadísticas", test_telemetria_estadisticas)
     runner.ejecutar_test("Telemetría - Exportar CSV", test_telemetria_exportar_csv)
+    runner.ejecutar_test("Telemetría - Log JSON Lines", test_telemetria_jsonl)
+    runner.ejecutar_test("Telemetría - Escritor asíncrono", test_telemetria_asincrona)
+    runner.ejecutar_test("Telemetría - Buffer circular", test_telemetria_buffer_circular)
+    runner.ejecutar_test("Telemetría - Formato binario", test_telemetria_binaria)
+    runner.ejecutar_test("Telemetría - Estadísticas incrementales", test_telemetria_estadisticas_incrementales)
+    runner.ejecutar_test("Telemetría - Índice de consultas", test_telemetria_indice)
+    runner.ejecutar_test("Telemetría - CSV en streaming", test_telemetria_csv_streaming)
+    runner.ejecutar_test("Telemetría - Rotación de logs", test_telemetria_rotacion)
+    runner.ejecutar_test("Telemetría - Muestreo por tipo", test_telemetria_muestreo)
+    runner.ejecutar_test("Telemetría - Timestamps diferidos", test_telemetria_timestamps)
     runner.ejecutar_test("Calibrador - Creación", test_calibrador_creacion)
     runner.ejecutar_test("Sensor Color - Creación", test_sensor_color_creacion)
     runner.ejecutar_test("Sensor Color - Lectura RGB", test_sensor_color_lectura)
@@ -442,6 +1890,24 @@ def main():
     runner.ejecutar_test("Pinza - Movimiento", test_pinza_movimiento)
     runner.ejecutar_test("Indicadores - Creación", test_indicadores_creacion)
     runner.ejecutar_test("Indicadores - Estados", test_indicadores_estados)
+    runner.ejecutar_test("Planificador - Sin deriva", test_planificador_sin_deriva)
+    runner.ejecutar_test("Planificador - Retrasos", test_planificador_retrasos)
+    runner.ejecutar_test("Métricas - Histograma", test_metricas_histograma)
+    runner.ejecutar_test("Métricas - Lazo", test_metricas_lazo)
+    runner.ejecutar_test("Motores - Escrituras evitadas", test_motores_escrituras_evitadas)
+    runner.ejecutar_test("HAL GPIO - Simulador", test_hal_gpio_simulado)
+    runner.ejecutar_test("HAL GPIO - pigpio", test_hal_gpio_pigpio)
+    runner.ejecutar_test("HAL GPIO - Lectura del banco", test_hal_gpio_banco)
+    runner.ejecutar_test("Ultrasonidos - Eco por flancos", test_ultrasonico_flancos)
+    runner.ejecutar_test("Ultrasonidos - Filtro de mediana", test_ultrasonico_filtro)
+    runner.ejecutar_test("Sensores IR - Flancos y despertar", test_sensores_linea_flancos)
+    runner.ejecutar_test("Estado compartido - Seqlock", test_estado_compartido)
+    runner.ejecutar_test("Buzón de comandos - El último gana", test_buzon_comandos)
+    runner.ejecutar_test("Supervisor de modos - Cancelación", test_supervisor_modos)
+    runner.ejecutar_test("Sumo - Máquina de estados", test_estrategia_sumo)
+    runner.ejecutar_test("Sumo - Seguimiento del oponente", test_seguidor_oponente)
+    runner.ejecutar_test("Guardia de borde - Anulación", test_guardia_borde)
+    runner.ejecutar_test("Proceso de control separado", test_proceso_control)
     
     # Tests de Integración
     print("\n### TESTS DE INTEGRACIÓN ###")
@@ -465,6 +1931,8 @@ def main():
     import os
     archivos_test = [
         'test_telemetria.json', 'test_export.csv', 'test_integracion.json',
+        'test_jsonl_legacy.json', 'test_export_MODO.csv', 'test_export_SENSORES_IR.csv',
+        'test_export_legado.csv',
         'test_color_pinza.json', 'test_leds.json', 'test_logistica.json',
         'test_calibracion.json', 'test_rendimiento.json', 'calibracion.json'
     ]
@@ -0,0 +1,322 @@
+#!/usr/bin/env python3
+"""
+Sensor Ultrasónico HC-SR04 por Interrupciones
+Robot ASTI Challenge
+
+En lugar de esperar el eco en un bucle activo (hasta 200 ms de CPU por
+medida sin eco), un hilo dispara el sensor a ritmo fijo y los flancos del
+pin ECHO llegan como callbacks con marca de tiempo (hal_gpio): la duración
+del pulso es la diferencia entre la bajada y la subida. leer() devuelve al
+instante la última medida completa con su estado:
+
+    - ok:        medida válida
+    - sin_eco:   el último disparo no obtuvo eco (o fuera de alcance)
+    - obsoleta:  la última medida es más antigua que edad_max
+    - sin_datos: aún no hay ninguna medida
+
+Cada medida alimenta además, en el mismo hilo, un filtro de mediana sobre
+las últimas muestras (un eco espurio aislado no cambia la estimación) que
+calcula la velocidad de acercamiento. distancia_actual() devuelve esa
+estimación con su edad, también sin bloquear ni añadir latencia al lazo.
+
+Uso:
+    sensor = SensorUltrasonico(20, 21)
+    sensor.iniciar()
+    estimacion = sensor.distancia_actual()
+    if estimacion.valida and estimacion.distancia < 60:
+        ...
+"""
+
+import math
+import threading
+import time
+from collections import deque, namedtuple
+
+from hal_gpio import GPIO
+from planificador import PlanificadorPeriodico
+
+
+VELOCIDAD_SONIDO_CM_S = 34300
+
+ESTADO_OK = 'ok'
+ESTADO_SIN_ECO = 'sin_eco'
+ESTADO_OBSOLETA = 'obsoleta'
+ESTADO_SIN_DATOS = 'sin_datos'
+
+
+class Medicion(namedtuple('Medicion', 'distancia estado t_ns')):
+    """
+    Medida publicada por el sensor
+
+    Attributes:
+        distancia (float): Distancia en cm (None si no hubo eco; en una
+            medida obsoleta, la última distancia conocida)
+        estado (str): ok, sin_eco, obsoleta o sin_datos
+        t_ns (int): Instante de publicación en el reloj del sensor
+    """
+
+    __slots__ = ()
+
+    @property
+    def valida(self):
+        return self.estado == ESTADO_OK
+
+
+class EstimacionDistancia(namedtuple('EstimacionDistancia',
+                                     'distancia velocidad estado muestras t_ns edad')):
+    """
+    Distancia filtrada publicada por el sensor
+
+    Attributes:
+        distancia (float): Mediana de la ventana en cm (None si no hay objetivo)
+        velocidad (float): Velocidad de acercamiento en cm/s (positiva si el
+            objeto se acerca; None con menos de dos muestras coherentes)
+        estado (str): ok, sin_eco, obsoleta o sin_datos
+        muestras (int): Muestras con eco en la ventana
+        t_ns (int): Instante de la muestra más reciente
+        edad (float): Segundos desde la muestra más reciente (al leer)
+    """
+
+    __slots__ = ()
+
+    @property
+    def valida(self):
+        return self.estado == ESTADO_OK
+
+
+class FiltroDistancia:
+    """
+    Mediana de las últimas muestras y velocidad por mínimos cuadrados
+
+    Las muestras sin eco cuentan como distancia infinita: si son mayoría en
+    la ventana no hay objetivo, y un eco suelto entre ellas no lo crea. Las
+    muestras con eco a más de umbral_atipico de la mediana se consideran
+    atípicas y no entran en la velocidad.
+    """
+
+    def __init__(self, ventana=5, umbral_atipico=15.0):
+        """
+        Args:
+            ventana (int): Muestras recientes consideradas
+            umbral_atipico (float): Distancia a la mediana (cm) a partir de
+                la cual una muestra es atípica
+        """
+        self.umbral_atipico = umbral_atipico
+        self._muestras = deque(maxlen=ventana)  # (t_ns, distancia o None)
+        self.atipicas = 0
+
+    def agregar(self, t_ns, distancia):
+        """
+        Añade una muestra y calcula la nueva estimación
+
+        Args:
+            t_ns (int): Instante de la muestra
+            distancia (float): Distancia en cm, o None si no hubo eco
+
+        Returns:
+            EstimacionDistancia: Estimación con la muestra incluida
+        """
+        self._muestras.append((t_ns, distancia))
+        valores = sorted(math.inf if d is None else d for _, d in self._muestras)
+        mediana = valores[len(valores) // 2]
+        con_eco = [(t, d) for t, d in self._muestras if d is not None]
+
+        if mediana == math.inf:
+            return EstimacionDistancia(None, None, ESTADO_SIN_ECO, len(con_eco), t_ns, 0.0)
+
+        coherentes = [(t, d) for t, d in con_eco if abs(d - mediana) <= self.umbral_atipico]
+        if distancia is not None and abs(distancia - mediana) > self.umbral_atipico:
+            self.atipicas += 1
+        return EstimacionDistancia(mediana, self._velocidad(coherentes), ESTADO_OK,
+                                   len(con_eco), t_ns, 0.0)
+
+    @staticmethod
+    def _velocidad(muestras):
+        """Pendiente (cm/s) por mínimos cuadrados, con signo de acercamiento"""
+        if len(muestras) < 2:
+            return None
+        t0 = muestras[0][0]
+        n = len(muestras)
+        media_t = sum((t - t0) / 1e9 for t, _ in muestras) / n
+        media_d = sum(d for _, d in muestras) / n
+        var_t = sum(((t - t0) / 1e9 - media_t) ** 2 for t, _ in muestras)
+        if var_t == 0:
+            return None
+        cov = sum(((t - t0) / 1e9 - media_t) * (d - media_d) for t, d in muestras)
+        return -cov / var_t
+
+    def reiniciar(self):
+        """Vacía la ventana"""
+        self._muestras.clear()
+
+
+class SensorUltrasonico:
+    """HC-SR04 con disparo periódico y eco medido por flancos"""
+
+    def __init__(self, pin_trigger, pin_echo, frecuencia=16, alcance_max=400,
+                 edad_max=None, ventana=5, umbral_atipico=15.0,
+                 reloj_ns=time.monotonic_ns):
+        """
+        Inicializa el sensor
+
+        Args:
+            pin_trigger (int): Pin TRIGGER (salida)
+            pin_echo (int): Pin ECHO (entrada)
+            frecuencia (float): Disparos por segundo (el HC-SR04 necesita
+                ~60 ms entre disparos para que se apaguen los ecos)
+            alcance_max (float): Distancia máxima en cm; más lejos es sin_eco
+            edad_max (float): Segundos tras los que una medida es obsoleta
+                (por defecto, tres periodos de disparo)
+            ventana (int): Muestras del filtro de mediana
+            umbral_atipico (float): cm a la mediana para considerar atípica
+                una muestra (ver FiltroDistancia)
+            reloj_ns (callable): Reloj para la edad de las medidas
+        """
+        self.pin_trigger = pin_trigger
+        self.pin_echo = pin_echo
+        self.periodo = 1.0 / frecuencia
+        self.alcance_max = alcance_max
+        self._edad_max_ns = int((edad_max if edad_max is not None else 3 * self.periodo) * 1e9)
+        self._reloj_ns = reloj_ns
+
+        GPIO.setup(pin_trigger, GPIO.OUT)
+        GPIO.setup(pin_echo, GPIO.IN)
+        GPIO.output(pin_trigger, GPIO.LOW)
+
+        self._lock = threading.Lock()
+        self._armado = False      # Disparo enviado, esperando el eco
+        self._t_subida = None     # Marca de tiempo del flanco de subida del eco
+        self._ultima = Medicion(None, ESTADO_SIN_DATOS, None)
+        self._filtro = FiltroDistancia(ventana, umbral_atipico)
+        self._estimacion = EstimacionDistancia(None, None, ESTADO_SIN_DATOS, 0, None, None)
+
+        self.mediciones = 0
+        self.sin_eco = 0
+
+        self._activo = False
+        self._hilo = None
+        self._manejador = GPIO.agregar_callback_flanco(pin_echo, GPIO.BOTH, self._al_flanco)
+
+    def _publicar(self, distancia, estado):
+        # Publican el hilo de disparo (sin eco) y el de flancos (eco): el lock
+        # serializa el filtro y los contadores. Las lecturas son asignaciones
+        # de tuplas inmutables: leer() y distancia_actual() no lo necesitan
+        with self._lock:
+            t_ns = self._reloj_ns()
+            self._ultima = Medicion(distancia, estado, t_ns)
+            self._estimacion = self._filtro.agregar(t_ns, distancia)
+            if estado == ESTADO_OK:
+                self.mediciones += 1
+            else:
+                self.sin_eco += 1
+
+    def _al_flanco(self, pin, nivel, t_ns):
+        """Callback de los flancos del eco"""
+        with self._lock:
+            if not self._armado:
+                return  # Fuera de un disparo (ruido o eco tardío)
+            if self._t_subida is None:
+                # Primer flanco tras el disparo: la subida. La polaridad sale
+                # del estado y no de `nivel`: con RPi.GPIO el nivel se lee ya
+                # dentro del callback y, en un eco corto (oponente muy cerca),
+                # los dos flancos llegan con el pin otra vez a LOW
+                self._t_subida = t_ns
+                return
+            duracion_ns = t_ns - self._t_subida
+            self._t_subida = None
+            self._armado = False
+
+        distancia = duracion_ns * VELOCIDAD_SONIDO_CM_S / 2e9
+        if 0 < distancia <= self.alcance_max:
+            self._publicar(distancia, ESTADO_OK)
+        else:
+            self._publicar(None, ESTADO_SIN_ECO)
+
+    def disparar(self):
+        """
+        Envía un pulso de disparo de 10 µs
+
+        Si el disparo anterior sigue sin eco completo, se publica sin_eco.
+        """
+        with self._lock:
+            pendiente = self._armado
+            self._armado = True
+            self._t_subida = None
+        if pendiente:
+            self._publicar(None, ESTADO_SIN_ECO)
+
+        GPIO.output(self.pin_trigger, GPIO.HIGH)
+        time.sleep(0.00001)
+        GPIO.output(self.pin_trigger, GPIO.LOW)
+
+    def leer(self):
+        """
+        Última medida completa (no bloquea)
+
+        Returns:
+            Medicion: Distancia y estado; obsoleta si es demasiado antigua
+        """
+        medicion = self._ultima
+        if medicion.t_ns is not None and self._reloj_ns() - medicion.t_ns > self._edad_max_ns:
+            return Medicion(medicion.distancia if medicion.valida else None,
+                            ESTADO_OBSOLETA, medicion.t_ns)
+        return medicion
+
+    def distancia_actual(self):
+        """
+        Estimación filtrada más reciente (no bloquea)
+
+        Returns:
+            EstimacionDistancia: Mediana, velocidad de acercamiento, edad y
+                estado; obsoleta si la última muestra es demasiado antigua
+        """
+        estimacion = self._estimacion
+        if estimacion.t_ns is None:
+            return estimacion
+        edad_ns = self._reloj_ns() - estimacion.t_ns
+        if edad_ns > self._edad_max_ns:
+            return estimacion._replace(estado=ESTADO_OBSOLETA, edad=edad_ns / 1e9)
+        return estimacion._replace(edad=edad_ns / 1e9)
+
+    # --- Hilo de disparo ---
+    def iniciar(self):
+        """Arranca el hilo que dispara el sensor a ritmo fijo"""
+        if self._activo:
+            return
+        self._activo = True
+        self._hilo = threading.Thread(target=self._bucle_disparo, name='ultrasonico',
+                                      daemon=True)
+        self._hilo.start()
+
+    def _bucle_disparo(self):
+        planificador = PlanificadorPeriodico(periodo=self.periodo)
+        while self._activo:
+            self.disparar()
+            planificador.esperar()
+
+    def detener(self):
+        """Detiene el hilo de disparo y deja de escuchar el eco"""
+        self._activo = False
+        if self._hilo is not None:
+            self._hilo.join(timeout=2 * self.periodo + 0.1)
+            self._hilo = None
+        self._manejador.cancelar()
+
+    def estadisticas(self):
+        """
+        Estado del sensor
+
+        Returns:
+            dict: Estimación filtrada y contadores de medidas válidas, sin
+                eco y atípicas
+        """
+        estimacion = self.distancia_actual()
+        return {
+            'distancia': estimacion.distancia,
+            'velocidad': estimacion.velocidad,
+            'edad': estimacion.edad,
+            'estado': estimacion.estado,
+            'mediciones': self.mediciones,
+            'sin_eco': self.sin_eco,
+            'atipicas': self._filtro.atipicas
+        }
@@ -201,6 +201,60 @@ document.addEventListener('keyup', (e) => {
     }
 });
 
+// ===== MÉTRICAS DE LOS LAZOS =====
+const metricsBody = document.getElementById('metricsBody');
+const metricsSamples = document.getElementById('metricsSamples');
+const METRICS_INTERVAL_MS = 2000;
+
+function formatMs(us) {
+    return us === null || us === undefined ? '-' : (us / 1000).toFixed(1);
+}
+
+function renderMetrics(data) {
+    const lazos = Object.entries(data.lazos || {});
+    if (lazos.length === 0) {
+        metricsBody.innerHTML = '<tr><td colspan="4">Sin datos</td></tr>';
+        metricsSamples.textContent = '0';
+        return;
+    }
+    
+    let ciclos = 0;
+    metricsBody.innerHTML = '';
+    lazos.forEach(([nombre, m]) => {
+        ciclos += m.duracion.muestras;
+        const fila = document.createElement('tr');
+        const celdas = [
+            nombre,
+            formatMs(m.duracion.p50_us) + ' / ' + formatMs(m.duracion.p99_us),
+            formatMs(m.jitter.p99_us),
+            formatMs(m.latencia.p99_us)
+        ];
+        celdas.forEach(texto => {
+            const celda = document.createElement('td');
+            celda.textContent = texto;
+            fila.appendChild(celda);
+        });
+        // Resaltar lazos cuyo ciclo se acerca al periodo nominal
+        if (m.periodo_us && m.duracion.p99_us > 0.8 * m.periodo_us) {
+            fila.classList.add('metrics-warning');
+        }
+        metricsBody.appendChild(fila);
+    });
+    metricsSamples.textContent = ciclos;
+}
+
+function pollMetrics() {
+    // Sin peticiones con la pestaña oculta: no cargar el robot en competición
+    if (document.hidden) return;
+    fetch('/api/metrics')
+        .then(res => res.json())
+        .then(renderMetrics)
+        .catch(err => console.log('Métricas no disponibles:', err));
+}
+
+setInterval(pollMetrics, METRICS_INTERVAL_MS);
+pollMetrics();
+
 // ===== PREVENIR SCROLL EN MÓVIL =====
 document.body.addEventListener('touchmove', (e) => {
     if (e.target.closest('.control-btn')) {